@@ -15,7 +15,7 @@ import os
 import base64
 import logging
 
-import database_pg as database
+import database
 
 
 def validate_environment():
@@ -24,15 +24,22 @@ import base64
 import json
 import concurrent.futures
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-import database_pg as database
+import database
+import enrollment_cache
 import file_storage
 from dashboard_sync import push_to_dashboard_single_request, clear_enrollment_cache
 from notifications import send_hr_policy_notification
 
+# Track read-your-writes per browser session rather than per script thread
+database.set_session_resolver(
+    lambda: getattr(get_script_run_ctx(), "session_id", None))
+
 # Default notification settings structure
 DEFAULT_NOTIFICATION_SETTINGS = {
     "approval": {
@@ -91,6 +98,13 @@ ENROLLMENT_FIELDS = [
     ("submission_date", "Submission Date"),
 ]
 
+# Number of enrollment cards rendered per page, and the sizes offered
+ADMIN_PAGE_SIZE = 25
+ADMIN_PAGE_SIZES = [10, 25, 50, 100]
+
+# Segno sync states offered in the listing filter
+SEGNO_SYNC_STATUSES = ["pending", "synced", "failed"]
+
 # Workflow checklist task definitions
 CHECKLIST_TASKS = {
     'approved_synced': 'Vehicle Submission Approved & Sent to Dashboard',
@@ -511,70 +525,173 @@ def _send_approval_notification(
     return {"success": True}
 
 
-def get_admin_records() -> List[Dict[str, Any]]:
-    """Fetch records for the admin dashboard from the real database."""
-    enrollments = database.get_all_enrollments()
-    records: List[Dict[str, Any]] = []
+def _to_admin_record(e: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape an enrollment (with aggregated documents/checklist) for a card."""
+    enrollment_id = e.get("id")
+    docs = e.get("documents") or []
+
+    # Presence comes from the documents catalog; the storage backend is not probed
+    signature_exists = any(
+        d.get("file_path") and not database.document_missing(d)
+        for d in docs if d.get("doc_type") == "signature")
+
+    photos_count = sum(1 for d in docs
+                       if d.get("doc_type") in ("vehicle", "registration",
+                                                "insurance"))
+
+    vin = e.get("vin", "") or ""
+    # Show full VIN
+    vin_display = vin if vin else "-"
+
+    vehicle = f"{e.get('year', '')} {e.get('make', '')} {e.get('model', '')}".strip(
+    )
+
+    return {
+        "id":
+        enrollment_id,
+        "tech_name":
+        e.get("full_name", "Unknown"),
+        "vehicle":
+        vehicle or "N/A",
+        "tech_id":
+        e.get("tech_id", ""),
+        "district":
+        e.get("district", ""),
+        "state":
+        e.get("state", ""),
+        "status":
+        "validated" if e.get("approved") == 1 else "in_review",
+        "submitted_date":
+        _format_date(e.get("submission_date")),
+        "vin":
+        vin_display,
+        "insurance_exp":
+        _format_date(e.get("insurance_exp")),
+        "registration_exp":
+        _format_date(e.get("registration_exp")),
+        "photos_count":
+        photos_count,
+        "signature":
+        signature_exists,
+        "_raw":
+        e,
+        "_docs":
+        docs,
+        "_checklist":
+        e.get("checklist") or [],
+    }
+
+
+def get_admin_records(
+        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Fetch records for the admin dashboard from the real database.
+
+    Enrollments, documents and checklist rows come back from a single
+    aggregated query instead of one documents query per enrollment.
+    """
+    return list(iter_admin_records(filters))
+
+
+def iter_admin_records(
+        filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Stream admin records in batches through a server-side cursor."""
+    for e in database.iter_enrollments(filters=filters,
+                                       with_details=True,
+                                       projection="summary"):
+        if e.get("id") is not None:
+            yield _to_admin_record(e)
+
+
+def get_admin_records_page(filters: Optional[Dict[str, Any]],
+                           cursor_key: Optional[Tuple[str, int]],
+                           page_size: int = ADMIN_PAGE_SIZE) -> Dict[str, Any]:
+    """Fetch one keyset-paginated page of admin records.
+
+    Returns {'records': [...], 'next_cursor': ...} where next_cursor is None
+    on the last page. Pages are served from enrollment_cache.
+    """
+
+    def load() -> Dict[str, Any]:
+        page = database.get_enrollments_page(filters,
+                                             cursor_key=cursor_key,
+                                             limit=page_size,
+                                             projection="summary",
+                                             primary=True)
+        return {
+            "records": [
+                _to_admin_record(e) for e in page["records"]
+                if e.get("id") is not None
+            ],
+            "next_cursor":
+            page["next_cursor"],
+        }
+
+    return enrollment_cache.get_list(
+        ("page", _filters_key(filters), cursor_key, page_size), load)
+
 
-    for e in enrollments:
-        enrollment_id = e.get("id")
-        if enrollment_id is None:
-            continue
-        docs = database.get_documents_for_enrollment(enrollment_id)
+def _filters_key(filters: Optional[Dict[str, Any]]) -> str:
+    return json.dumps(filters or {}, sort_keys=True, default=str)
 
-        signature_docs = [d for d in docs if d.get("doc_type") == "signature"]
-        signature_exists = False
-        for sig_doc in signature_docs:
-            path = sig_doc.get("file_path")
-            if path and file_storage.file_exists(path):
-                signature_exists = True
-                break
 
-        photos_count = sum(1 for d in docs
-                           if d.get("doc_type") in ("vehicle", "registration",
-                                                    "insurance"))
+def _count_admin_records(filters: Optional[Dict[str, Any]]) -> int:
+    return enrollment_cache.get_list(
+        ("count", _filters_key(filters)),
+        lambda: database.count_enrollments(filters, primary=True))
 
-        vin = e.get("vin", "") or ""
-        # Show full VIN
-        vin_display = vin if vin else "-"
 
-        vehicle = f"{e.get('year', '')} {e.get('make', '')} {e.get('model', '')}".strip(
-        )
+def _load_full_record(enrollment_id: int,
+                      fallback: Dict[str, Any],
+                      fresh: bool = False) -> Dict[str, Any]:
+    """Fetch every enrollment column; listings only carry the summary projection.
 
-        records.append({
-            "id":
+    fresh bypasses enrollment_cache, for decisions that must see the latest row.
+    """
+    try:
+        if fresh:
+            return database.get_enrollment_by_id(enrollment_id) or fallback
+        return enrollment_cache.get_record(
             enrollment_id,
-            "tech_name":
-            e.get("full_name", "Unknown"),
-            "vehicle":
-            vehicle or "N/A",
-            "tech_id":
-            e.get("tech_id", ""),
-            "district":
-            e.get("district", ""),
-            "state":
-            e.get("state", ""),
-            "status":
-            "validated" if e.get("approved") == 1 else "in_review",
-            "submitted_date":
-            _format_date(e.get("submission_date")),
-            "vin":
-            vin_display,
-            "insurance_exp":
-            _format_date(e.get("insurance_exp")),
-            "registration_exp":
-            _format_date(e.get("registration_exp")),
-            "photos_count":
-            photos_count,
-            "signature":
-            signature_exists,
-            "_raw":
-            e,
-            "_docs":
-            docs,
-        })
-
-    return records
+            lambda: database.get_enrollment_by_id(enrollment_id)) or fallback
+    except Exception:
+        return fallback
+
+
+def _mark_card_changed(enrollment_id: int) -> None:
+    """Record a change made from a card's fragment.
+
+    Cached data for the enrollment is dropped, and the fragment re-reads the
+    card until the next full run reloads the list.
+    """
+    clear_enrollment_cache(enrollment_id)
+    st.session_state[f"card_changed_{enrollment_id}"] = st.session_state.get(
+        "admin_run", 0)
+
+
+def _card_changed(enrollment_id: int) -> bool:
+    return st.session_state.get(
+        f"card_changed_{enrollment_id}") == st.session_state.get(
+            "admin_run", 0)
+
+
+def _rerun_card() -> None:
+    """Rerun the calling card fragment; falls back to a full rerun when the
+    click is being handled by a full run."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def _refresh_admin_record(enrollment_id: int,
+                          record: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-read one card's record (with its checklist) after it changed."""
+    full = _load_full_record(enrollment_id, record.get("_raw") or {})
+    try:
+        checklist = database.get_checklist_for_enrollment(enrollment_id)
+    except Exception:
+        checklist = record.get("_checklist")
+    return _to_admin_record(dict(full, checklist=checklist))
 
 
 def render_header(pending_count: int) -> None:
@@ -612,13 +729,17 @@ def _get_docs_for_type(docs: List[Dict[str, Any]],
     return [d for d in docs if d.get("doc_type") == doc_type]
 
 
-def _read_file_safe(path: str) -> bytes | None:
+def _read_file_safe(enrollment_id: int, path: str) -> bytes | None:
+    """Read a stored document, or None if it is missing or unreadable.
+
+    Bytes are cached per enrollment in enrollment_cache instead of probing
+    file_exists before every read.
+    """
     if not path:
         return None
     try:
-        if not file_storage.file_exists(path):
-            return None
-        return file_storage.read_file(path)
+        return enrollment_cache.get_document(
+            enrollment_id, path, lambda: file_storage.read_file(path))
     except Exception:
         return None
 
@@ -642,32 +763,101 @@ def _render_pdf_preview(file_bytes: bytes) -> None:
 def delete_enrollment(enrollment_id: int) -> bool:
     """Delete an enrollment and all associated documents."""
     try:
-        # Get documents first to delete files
-        docs = database.get_documents_for_enrollment(enrollment_id)
-        for doc in docs:
-            path = doc.get("file_path")
-            if path:
-                try:
-                    file_storage.delete_file(path)
-                except Exception:
-                    pass
-
-        # Delete from database
-        database.delete_enrollment(enrollment_id)
-        clear_enrollment_cache()
+        with database.enrollment_lock(enrollment_id, "delete"):
+            # Get documents first to delete files
+            docs = database.get_documents_for_enrollment(enrollment_id)
+            for doc in docs:
+                for path in (doc.get("file_path"), doc.get("thumbnail_path")):
+                    if path:
+                        try:
+                            file_storage.delete_file(path)
+                        except Exception:
+                            pass
+
+            # Delete from database
+            database.delete_enrollment(enrollment_id)
+        clear_enrollment_cache(enrollment_id)
         return True
+    except database.EnrollmentLocked:
+        st.warning(
+            "This enrollment is being synced; try deleting it again shortly.")
+        return False
     except Exception as e:
         st.error(f"Error deleting enrollment: {e}")
         return False
 
 
-def render_workflow_checklist(enrollment_id: int, raw_data: Dict[str,
-                                                                 Any]) -> None:
-    """Render the workflow checklist for an enrollment."""
-    # Get checklist items from database
+def _approve_and_sync(enrollment_id: int, raw: Dict[str, Any]) -> None:
+    """Push an enrollment to the dashboard and mark it approved.
+
+    Callers hold the enrollment's 'dashboard' lock, so the approved flag is
+    re-read first in case another admin finished the same approval.
+    """
+    raw = _load_full_record(enrollment_id, raw, fresh=True)
+    if raw.get("approved") == 1:
+        st.info("This enrollment has already been approved.")
+        return
+    result = push_to_dashboard_single_request(
+        raw, enrollment_id=enrollment_id)
+
+    status_code = result.get("status_code", 0)
+    if result.get("error"):
+        st.error(f"Error: {result.get('error')}")
+    elif status_code in (200, 201) or (200 <= status_code < 300
+                                       and status_code != 207):
+        try:
+            database.approve_enrollment(enrollment_id)
+            if hasattr(database, 'mark_checklist_task_by_key'):
+                database.mark_checklist_task_by_key(
+                    enrollment_id,
+                    "approved_synced",
+                    True,
+                    "System - Dashboard Sync",
+                )
+            clear_enrollment_cache(enrollment_id)
+        except Exception:
+            pass
+
+        settings = _get_notification_settings()
+        if settings.get("approval", {}).get("enabled"):
+            _send_approval_notification(raw, enrollment_id)
+
+        st.success(
+            "✅ Enrollment approved and synced to dashboard!")
+        st.rerun()
+    elif status_code == 207:
+        try:
+            database.approve_enrollment(enrollment_id)
+            if hasattr(database, 'mark_checklist_task_by_key'):
+                database.mark_checklist_task_by_key(
+                    enrollment_id,
+                    "approved_synced",
+                    True,
+                    "System - Dashboard Sync",
+                )
+            clear_enrollment_cache(enrollment_id)
+        except Exception:
+            pass
+        st.warning(
+            "Approved with warnings (some photos may have failed)")
+        st.rerun()
+    else:
+        st.error(f"Dashboard error: status {status_code}")
+
+
+def render_workflow_checklist(
+        enrollment_id: int,
+        raw_data: Dict[str, Any],
+        checklist_items: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Render the workflow checklist for an enrollment.
+
+    Uses the preloaded checklist rows when given, otherwise queries them.
+    """
     checklist_dict: Dict[str, Any] = {}
     try:
-        checklist_items = database.get_checklist_for_enrollment(enrollment_id)
+        if checklist_items is None:
+            checklist_items = database.get_checklist_for_enrollment(
+                enrollment_id)
         checklist_dict = {
             item['task_key']: item
             for item in checklist_items
@@ -712,7 +902,7 @@ def render_workflow_checklist(enrollment_id: int, raw_data: Dict[str,
 
     for idx, step in enumerate(steps):
         task = checklist_dict.get(step['key'], {})
-        is_completed = task.get('is_completed', False)
+        is_completed = bool(task.get('completed', False))
         completed_by = task.get('completed_by', '')
         completed_at = task.get('completed_at', '')
 
@@ -766,8 +956,8 @@ def render_workflow_checklist(enrollment_id: int, raw_data: Dict[str,
                             database.mark_checklist_task_by_key(
                                 enrollment_id, step['key'], True,
                                 "Admin - Manual Completion")
-                            clear_enrollment_cache()
-                            st.rerun()
+                            _mark_card_changed(enrollment_id)
+                            _rerun_card()
                         else:
                             st.warning(
                                 "Checklist marking not available - database function missing"
@@ -789,8 +979,8 @@ def render_workflow_checklist(enrollment_id: int, raw_data: Dict[str,
                                 database.mark_checklist_task_by_key(
                                     enrollment_id, step['key'], True,
                                     "Admin - Manual Completion")
-                                clear_enrollment_cache()
-                                st.rerun()
+                                _mark_card_changed(enrollment_id)
+                                _rerun_card()
                             else:
                                 st.warning(
                                     "Checklist marking not available - database function missing"
@@ -806,75 +996,141 @@ def render_workflow_checklist(enrollment_id: int, raw_data: Dict[str,
         st.markdown('</div>', unsafe_allow_html=True)  # Close item container
 
 
-def render_record_card(record: Dict[str, Any]) -> None:
-    """Render a single record card with nested expander structure."""
-    status = record.get("status", "in_review")
-    is_validated = status == "validated"
-    enrollment_id_raw = record.get("id")
-    if enrollment_id_raw is None:
+def _show_original(enrollment_id: int, doc: Dict[str, Any], label: str) -> bool:
+    """Show the document's thumbnail and return whether to load the original.
+
+    Documents saved before thumbnails existed have none and load directly.
+    """
+    thumb_path = doc.get("thumbnail_path")
+    if not thumb_path:
+        return True
+    thumb_bytes = _read_file_safe(enrollment_id, thumb_path)
+    if not thumb_bytes:
+        return True
+    show = st.toggle(label, key=f"doc_original_{doc.get('id')}")
+    if not show:
+        st.image(thumb_bytes, use_column_width=True)
+    return show
+
+
+def _render_document_tile(enrollment_id: int, doc: Dict[str, Any],
+                          caption: str) -> None:
+    """Render one document as a thumbnail, with the original on request."""
+    path = doc.get("file_path") or ""
+    is_pdf = path.lower().endswith(".pdf")
+    if _show_original(enrollment_id, doc, "Open PDF" if is_pdf else "Full size"):
+        file_bytes = _read_file_safe(enrollment_id, path)
+        if not file_bytes:
+            return
+        if is_pdf:
+            _render_pdf_preview(file_bytes)
+        else:
+            st.image(file_bytes, use_column_width=True)
+    st.caption(caption)
+
+
+def render_document_review(enrollment_id: int,
+                           docs: List[Dict[str, Any]]) -> None:
+    """Render the Document Review tabs once the admin asks for them.
+
+    Streamlit runs collapsed expanders too, so document bytes are only
+    fetched after the card's "Load documents" toggle is switched on, and
+    then only thumbnails until an original is opened.
+    """
+    if not st.toggle(f"Load documents ({len(docs)})",
+                     key=f"load_docs_{enrollment_id}"):
         return
-    enrollment_id: int = int(enrollment_id_raw)
 
-    status_label = "✓ Validated" if is_validated else "⚠ In Review"
-    status_class = "validated" if is_validated else "review"
+    tabs = st.tabs([
+        "🚗 Vehicle Photos", "📋 Registration", "🛡️ Insurance",
+        "📄 Signed Form"
+    ])
+
+    vehicle_docs = _get_docs_for_type(docs, "vehicle")
+    reg_docs = _get_docs_for_type(docs, "registration")
+    ins_docs = _get_docs_for_type(docs, "insurance")
+    sig_docs = _get_docs_for_type(docs, "signature")
+
+    with tabs[0]:
+        if vehicle_docs:
+            cols = st.columns(4)
+            for idx, doc in enumerate(vehicle_docs):
+                path = doc.get("file_path")
+                if not path:
+                    continue
+                with cols[idx % 4]:
+                    _render_document_tile(
+                        enrollment_id, doc,
+                        f"#{idx + 1} - {os.path.basename(path)}")
+        else:
+            st.info("No vehicle photos uploaded.")
+
+    with tabs[1]:
+        if reg_docs:
+            cols = st.columns(3)
+            for idx, doc in enumerate(reg_docs):
+                path = doc.get("file_path")
+                if not path:
+                    continue
+                with cols[idx % 3]:
+                    _render_document_tile(enrollment_id, doc,
+                                          os.path.basename(path))
+        else:
+            st.info("No registration documents uploaded.")
+
+    with tabs[2]:
+        if ins_docs:
+            cols = st.columns(3)
+            for idx, doc in enumerate(ins_docs):
+                path = doc.get("file_path")
+                if not path:
+                    continue
+                with cols[idx % 3]:
+                    _render_document_tile(enrollment_id, doc,
+                                          os.path.basename(path))
+        else:
+            st.info("No insurance documents uploaded.")
+
+    with tabs[3]:
+        if sig_docs:
+            path = sig_docs[0].get("file_path")
+            if not path:
+                st.info("Signed form file path not found.")
+            elif _show_original(enrollment_id, sig_docs[0],
+                                "Open signed form"):
+                file_bytes = _read_file_safe(enrollment_id, path)
+                if file_bytes:
+                    _render_pdf_preview(file_bytes)
+                    st.download_button(
+                        label="⬇️ Download Signed Form",
+                        data=file_bytes,
+                        file_name=os.path.basename(
+                            path or "signed_enrollment.pdf"),
+                        mime="application/pdf",
+                        key=f"dl_pdf_{enrollment_id}",
+                    )
+                else:
+                    st.info("Signed form file not found.")
+        else:
+            st.info("No signed enrollment form available.")
 
-    signature_ok = record.get("signature", False)
-    sig_color = "#16a34a" if signature_ok else "#ef4444"
-    sig_text = "✓ Yes" if signature_ok else "✗ Missing"
 
+@st.fragment
+def render_record_details(record: Dict[str, Any]) -> None:
+    """Render a card's expandable sections as a fragment.
+
+    Checklist ticks and card actions rerun only this fragment, so a change
+    to one enrollment does not re-query and re-render every card. After such
+    a change the fragment re-reads this card's record on its own.
+    """
+    enrollment_id = int(record["id"])
+    if _card_changed(enrollment_id):
+        record = _refresh_admin_record(enrollment_id, record)
+    is_validated = record.get("status") == "validated"
     docs = record.get("_docs", [])
+    checklist_items = record.get("_checklist")
     raw = record.get("_raw", {}) or {}
 
-    # Open card container
-    st.markdown('<div class="record-card-container">', unsafe_allow_html=True)
-
-    # Render Blue Header + Stats (always visible)
-    st.markdown(
-        f"""
-        <div class="card-header">
-          <div class="card-header-top">
-            <div>
-              <h2>{record.get("tech_name", "Unknown Tech")}</h2>
-              <div class="card-meta">
-                <span>🚗 {record.get("vehicle", "")}</span>
-                <span>Tech #{record.get("tech_id", "")}</span>
-                <span>District {record.get("district", "")}</span>
-                <span>{record.get("state", "")}</span>
-              </div>
-            </div>
-            <div class="status-area">
-              <div class="status-badge {status_class}">{status_label}</div>
-              <div class="submitted-date">Submitted {record.get("submitted_date", "")}</div>
-              <span class="expand-icon">▼</span>
-            </div>
-          </div>
-        </div>
-        <div class="stats-bar">
-          <div class="stat-item">
-            <div class="stat-label">VIN</div>
-            <div class="stat-value mono">{record.get("vin", "-")}</div>
-          </div>
-          <div class="stat-item">
-            <div class="stat-label">Ins Exp</div>
-            <div class="stat-value green">{record.get("insurance_exp", "-")}</div>
-          </div>
-          <div class="stat-item">
-            <div class="stat-label">Reg Exp</div>
-            <div class="stat-value green">{record.get("registration_exp", "-")}</div>
-          </div>
-          <div class="stat-item">
-            <div class="stat-label">Photos</div>
-            <div class="stat-value">{record.get("photos_count", 0)}</div>
-          </div>
-          <div class="stat-item">
-            <div class="stat-label">Sig</div>
-            <div class="stat-value" style="color:{sig_color}">{sig_text}</div>
-          </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
-
     # Master expander for the 4 sub-sections (collapsed by default)
     with st.expander("Expand Details", expanded=False):
 
@@ -910,101 +1166,30 @@ def render_record_card(record: Dict[str, Any]) -> None:
                     f"**Submitted:** {_format_date(raw.get('submission_date'))}"
                 )
 
+            # Detail-only columns are not in the listing projection
+            if st.toggle("Show full record",
+                         key=f"full_record_{enrollment_id}"):
+                full = _load_full_record(enrollment_id, raw)
+                st.write(f"**Truck #:** {full.get('truck_number') or '-'}")
+                st.write(
+                    f"**New Hire:** {'Yes' if full.get('is_new_hire') else 'No'}"
+                )
+                st.write(f"**Comment:** {full.get('comment') or '-'}")
+                if full.get("approved_by"):
+                    st.write(
+                        f"**Approved:** {_format_date(full.get('approved_at'))} by {full.get('approved_by')}"
+                    )
+
         # Sub-expander 2: Workflow Checklist
         with st.expander("📋 Workflow Checklist – Track enrollment progress",
                          expanded=False):
-            render_workflow_checklist(enrollment_id, raw)
+            render_workflow_checklist(enrollment_id, raw, checklist_items)
 
         # Sub-expander 3: Document Review
         with st.expander(
                 "📁 Document Review – Photos, registration, insurance, signed form",
                 expanded=False):
-            tabs = st.tabs([
-                "🚗 Vehicle Photos", "📋 Registration", "🛡️ Insurance",
-                "📄 Signed Form"
-            ])
-
-            vehicle_docs = _get_docs_for_type(docs, "vehicle")
-            reg_docs = _get_docs_for_type(docs, "registration")
-            ins_docs = _get_docs_for_type(docs, "insurance")
-            sig_docs = _get_docs_for_type(docs, "signature")
-
-            with tabs[0]:
-                if vehicle_docs:
-                    cols = st.columns(4)
-                    for idx, doc in enumerate(vehicle_docs):
-                        path = doc.get("file_path")
-                        if not path:
-                            continue
-                        img_bytes = _read_file_safe(path)
-                        if not img_bytes:
-                            continue
-                        with cols[idx % 4]:
-                            st.image(img_bytes, use_column_width=True)
-                            st.caption(
-                                f"#{idx + 1} - {os.path.basename(path)}")
-                else:
-                    st.info("No vehicle photos uploaded.")
-
-            with tabs[1]:
-                if reg_docs:
-                    cols = st.columns(3)
-                    for idx, doc in enumerate(reg_docs):
-                        path = doc.get("file_path")
-                        if not path:
-                            continue
-                        file_bytes = _read_file_safe(path)
-                        if not file_bytes:
-                            continue
-                        with cols[idx % 3]:
-                            if path.lower().endswith(".pdf"):
-                                _render_pdf_preview(file_bytes)
-                            else:
-                                st.image(file_bytes, use_column_width=True)
-                            st.caption(os.path.basename(path))
-                else:
-                    st.info("No registration documents uploaded.")
-
-            with tabs[2]:
-                if ins_docs:
-                    cols = st.columns(3)
-                    for idx, doc in enumerate(ins_docs):
-                        path = doc.get("file_path")
-                        if not path:
-                            continue
-                        file_bytes = _read_file_safe(path)
-                        if not file_bytes:
-                            continue
-                        with cols[idx % 3]:
-                            if path.lower().endswith(".pdf"):
-                                _render_pdf_preview(file_bytes)
-                            else:
-                                st.image(file_bytes, use_column_width=True)
-                            st.caption(os.path.basename(path))
-                else:
-                    st.info("No insurance documents uploaded.")
-
-            with tabs[3]:
-                if sig_docs:
-                    path = sig_docs[0].get("file_path")
-                    if not path:
-                        st.info("Signed form file path not found.")
-                    else:
-                        file_bytes = _read_file_safe(path)
-                        if file_bytes:
-                            _render_pdf_preview(file_bytes)
-                            st.download_button(
-                                label="⬇️ Download Signed Form",
-                                data=file_bytes,
-                                file_name=os.path.basename(
-                                    path or "signed_enrollment.pdf"),
-                                mime="application/pdf",
-                                key=f"dl_pdf_{enrollment_id}",
-                            )
-                        else:
-                            st.info("Signed form file not found.")
-                else:
-                    st.info("No signed enrollment form available.")
+            render_document_review(enrollment_id, docs)
 
         # Sub-expander 4: Actions (with Segno Sync button)
         with st.expander(
@@ -1053,14 +1238,16 @@ def render_record_card(record: Dict[str, Any]) -> None:
             segno_synced = False
             if enrollment_id is not None:
                 try:
-                    checklist_items = database.get_checklist_for_enrollment(
-                        enrollment_id)
+                    if checklist_items is None:
+                        checklist_items = database.get_checklist_for_enrollment(
+                            enrollment_id)
                     checklist_dict = {
                         item['task_key']: item
                         for item in checklist_items
                     }
-                    segno_synced = checklist_dict.get('segno_synced', {}).get(
-                        'is_completed', False)
+                    segno_synced = bool(
+                        checklist_dict.get('segno_synced', {}).get(
+                            'completed', False))
                 except Exception:
                     pass
 
@@ -1084,52 +1271,12 @@ def render_record_card(record: Dict[str, Any]) -> None:
 
             # Handle Approve
             if approve and not is_validated:
-                result = push_to_dashboard_single_request(
-                    raw, enrollment_id=enrollment_id)
-
-                status_code = result.get("status_code", 0)
-                if result.get("error"):
-                    st.error(f"Error: {result.get('error')}")
-                elif status_code in (200, 201) or (200 <= status_code < 300
-                                                   and status_code != 207):
-                    try:
-                        database.approve_enrollment(enrollment_id)
-                        if hasattr(database, 'mark_checklist_task_by_key'):
-                            database.mark_checklist_task_by_key(
-                                enrollment_id,
-                                "approved_synced",
-                                True,
-                                "System - Dashboard Sync",
-                            )
-                        clear_enrollment_cache()
-                    except Exception:
-                        pass
-
-                    settings = _get_notification_settings()
-                    if settings.get("approval", {}).get("enabled"):
-                        _send_approval_notification(raw, enrollment_id)
-
-                    st.success(
-                        "✅ Enrollment approved and synced to dashboard!")
-                    st.rerun()
-                elif status_code == 207:
-                    try:
-                        database.approve_enrollment(enrollment_id)
-                        if hasattr(database, 'mark_checklist_task_by_key'):
-                            database.mark_checklist_task_by_key(
-                                enrollment_id,
-                                "approved_synced",
-                                True,
-                                "System - Dashboard Sync",
-                            )
-                        clear_enrollment_cache()
-                    except Exception:
-                        pass
+                try:
+                    with database.enrollment_lock(enrollment_id, "dashboard"):
+                        _approve_and_sync(enrollment_id, raw)
+                except database.EnrollmentLocked:
                     st.warning(
-                        "Approved with warnings (some photos may have failed)")
-                    st.rerun()
-                else:
-                    st.error(f"Dashboard error: status {status_code}")
+                        "Another admin is already approving this enrollment.")
 
             # Handle PDF to HR
             if send_pdf:
@@ -1138,13 +1285,14 @@ def render_record_card(record: Dict[str, Any]) -> None:
                     None)
                 if sig_doc:
                     path = sig_doc.get("file_path")
-                    file_bytes = _read_file_safe(path)
+                    file_bytes = _read_file_safe(enrollment_id, path)
                     if file_bytes:
                         settings = _get_notification_settings()
                         hr_email = settings.get("hr_pdf", {}).get(
                             "recipients", "tyler.morgan@transformco.com")
                         result = send_hr_policy_notification(
-                            raw, path, hr_email)
+                            _load_full_record(enrollment_id, raw), path,
+                            hr_email)
                         if result.get("success"):
                             if hasattr(database, 'mark_checklist_task_by_key'):
                                 database.mark_checklist_task_by_key(
@@ -1153,9 +1301,10 @@ def render_record_card(record: Dict[str, Any]) -> None:
                                     True,
                                     "System - HR Email Sent",
                                 )
+                            _mark_card_changed(enrollment_id)
                             st.success(
                                 f"✅ Signed policy form sent to {hr_email}!")
-                            st.rerun()
+                            _rerun_card()
                         else:
                             st.error(
                                 f"❌ Error: {result.get('error', 'Unknown error')}"
@@ -1167,7 +1316,8 @@ def render_record_card(record: Dict[str, Any]) -> None:
 
             # Handle Notify
             if notify:
-                result = _send_approval_notification(raw, enrollment_id)
+                result = _send_approval_notification(
+                    _load_full_record(enrollment_id, raw), enrollment_id)
                 if result is True or (result and result.get("success")):
                     st.success("✅ Notification sent!")
                 elif result and result.get("error"):
@@ -1209,12 +1359,12 @@ def render_record_card(record: Dict[str, Any]) -> None:
                                     True,
                                     f"System - Segno Sync (ID: {segno_id})",
                                 )
-                            clear_enrollment_cache()
+                            _mark_card_changed(enrollment_id)
                             st.success(
                                 "✅ Segno enrollment created successfully!")
                             if segno_id and segno_id != "Unknown":
                                 st.info(f"📋 Segno Record ID: `{segno_id}`")
-                            st.rerun()
+                            _rerun_card()
                         elif result:
                             error_msg = result.get('error', 'Unknown error')
                             error_details = result.get('details', '')
@@ -1257,7 +1407,74 @@ def render_record_card(record: Dict[str, Any]) -> None:
                     if st.button("Cancel",
                                  key=f"cancel_delete_{enrollment_id}"):
                         st.session_state[delete_key] = False
-                        st.rerun()
+                        _rerun_card()
+
+
+def render_record_card(record: Dict[str, Any]) -> None:
+    """Render a single record card with nested expander structure."""
+    status = record.get("status", "in_review")
+    is_validated = status == "validated"
+    if record.get("id") is None:
+        return
+
+    status_label = "✓ Validated" if is_validated else "⚠ In Review"
+    status_class = "validated" if is_validated else "review"
+
+    signature_ok = record.get("signature", False)
+    sig_color = "#16a34a" if signature_ok else "#ef4444"
+    sig_text = "✓ Yes" if signature_ok else "✗ Missing"
+
+    # Open card container
+    st.markdown('<div class="record-card-container">', unsafe_allow_html=True)
+
+    # Render Blue Header + Stats (always visible)
+    st.markdown(
+        f"""
+        <div class="card-header">
+          <div class="card-header-top">
+            <div>
+              <h2>{record.get("tech_name", "Unknown Tech")}</h2>
+              <div class="card-meta">
+                <span>🚗 {record.get("vehicle", "")}</span>
+                <span>Tech #{record.get("tech_id", "")}</span>
+                <span>District {record.get("district", "")}</span>
+                <span>{record.get("state", "")}</span>
+              </div>
+            </div>
+            <div class="status-area">
+              <div class="status-badge {status_class}">{status_label}</div>
+              <div class="submitted-date">Submitted {record.get("submitted_date", "")}</div>
+              <span class="expand-icon">▼</span>
+            </div>
+          </div>
+        </div>
+        <div class="stats-bar">
+          <div class="stat-item">
+            <div class="stat-label">VIN</div>
+            <div class="stat-value mono">{record.get("vin", "-")}</div>
+          </div>
+          <div class="stat-item">
+            <div class="stat-label">Ins Exp</div>
+            <div class="stat-value green">{record.get("insurance_exp", "-")}</div>
+          </div>
+          <div class="stat-item">
+            <div class="stat-label">Reg Exp</div>
+            <div class="stat-value green">{record.get("registration_exp", "-")}</div>
+          </div>
+          <div class="stat-item">
+            <div class="stat-label">Photos</div>
+            <div class="stat-value">{record.get("photos_count", 0)}</div>
+          </div>
+          <div class="stat-item">
+            <div class="stat-label">Sig</div>
+            <div class="stat-value" style="color:{sig_color}">{sig_text}</div>
+          </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    render_record_details(record)
 
     # Close card container
     st.markdown('</div>', unsafe_allow_html=True)
@@ -1439,29 +1656,239 @@ def render_notification_settings_tab() -> None:
             st.rerun()
 
 
+def render_query_stats_tab() -> None:
+    """Render database query latency collected with DB_QUERY_STATS=1."""
+    st.markdown("## 📈 Database Performance")
+    stats = database.get_query_stats()
+    pool_stats = stats.get("pool") or {}
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pool checkouts", pool_stats.get("checkouts", 0))
+    col2.metric("Avg pool wait", f"{pool_stats.get('avg_wait_ms', 0.0):.1f} ms")
+    col3.metric("Max pool wait", f"{pool_stats.get('wait_time_max_ms', 0.0):.1f} ms")
+    col4.metric("Wait timeouts", pool_stats.get("wait_timeouts", 0))
+
+    st.caption(f"Collected since {stats.get('since')} · slow-query threshold "
+               f"{stats.get('slow_query_ms'):.0f} ms")
+
+    bounds = stats.get("buckets_ms", [])
+    labels = [f"≤{b}ms" for b in bounds] + [f">{bounds[-1]}ms" if bounds else "all"]
+
+    def table(entries: Dict[str, Dict[str, Any]], key_name: str) -> List[Dict[str, Any]]:
+        rows = []
+        for key, entry in entries.items():
+            row = {
+                key_name: key,
+                "calls": entry["calls"],
+                "rows": entry["rows"],
+                "total ms": round(entry["total_ms"], 1),
+                "avg ms": round(entry["avg_ms"], 2),
+                "max ms": round(entry["max_ms"], 1),
+            }
+            if "pool_wait_ms" in entry:
+                row["pool wait ms"] = round(entry["pool_wait_ms"], 1)
+            row.update(zip(labels, entry["histogram"]))
+            rows.append(row)
+        return rows
+
+    st.markdown("### By function")
+    st.dataframe(table(stats.get("functions", {}), "function"),
+                 use_container_width=True)
+    st.markdown("### By statement")
+    st.dataframe(table(stats.get("statements", {}), "statement"),
+                 use_container_width=True)
+
+    if st.button("Reset statistics", key="reset_query_stats"):
+        database.reset_query_stats()
+        st.rerun()
+
+
+def render_enrollment_filters() -> Dict[str, Any]:
+    """Render the listing filters and return them as database filters."""
+    filters: Dict[str, Any] = {}
+    with st.expander("🔎 Filter Enrollments", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            status = st.selectbox("Status",
+                                  ["All", "In Review", "Validated"],
+                                  key="filter_status")
+        with col2:
+            state = st.text_input("State", key="filter_state")
+        with col3:
+            district = st.text_input("District", key="filter_district")
+        with col4:
+            segno_status = st.selectbox("Segno Sync",
+                                        ["All"] + SEGNO_SYNC_STATUSES,
+                                        key="filter_segno_status")
+        date_range = st.date_input("Submitted between",
+                                   value=(),
+                                   key="filter_submitted")
+
+    if status != "All":
+        filters["approved"] = status == "Validated"
+    if state.strip():
+        filters["state"] = state.strip()
+    if district.strip():
+        filters["district"] = district.strip()
+    if segno_status != "All":
+        filters["segno_sync_status"] = segno_status
+    if isinstance(date_range, (list, tuple)) and date_range:
+        filters["submitted_from"] = date_range[0]
+        if len(date_range) > 1:
+            filters["submitted_to"] = date_range[1]
+    return filters
+
+
+def _get_list_state(filters: Dict[str, Any], page_size: int) -> Dict[str, Any]:
+    """Return the listing position, reset when filters or page size change.
+
+    'page' is the 1-based page shown, 'cursors' maps page numbers to their
+    keyset cursors (None for page 1) and 'loaded' counts the pages shown in
+    load-more mode.
+    """
+    signature = json.dumps([filters, page_size], sort_keys=True, default=str)
+    if st.session_state.get("admin_filter_signature") != signature:
+        st.session_state.admin_filter_signature = signature
+        st.session_state.admin_list = {
+            "page": 1,
+            "cursors": {
+                1: None
+            },
+            "loaded": 1
+        }
+    return st.session_state.admin_list
+
+
+def _page_cursor(filters: Dict[str, Any], state: Dict[str, Any], page: int,
+                 page_size: int) -> Optional[Tuple[str, int]]:
+    """Cursor for a page, seeking by offset only when it was never visited."""
+    cursors = state["cursors"]
+    if page not in cursors:
+        cursors[page] = database.get_enrollment_page_cursor(
+            filters, page, page_size)
+    return cursors[page]
+
+
+def render_list_controls(state: Dict[str, Any], total: int,
+                         page_size: int) -> str:
+    """Render the list mode toggle and jump-to-page input; return the mode."""
+    total_pages = max(1, -(-total // page_size))
+    col_mode, col_jump, col_count = st.columns([2, 1, 1])
+    with col_mode:
+        mode = st.radio("View",
+                        ["Pages", "Load more"],
+                        horizontal=True,
+                        key="admin_list_mode",
+                        label_visibility="collapsed")
+    if mode == "Pages":
+        state["page"] = min(state["page"], total_pages)
+        with col_jump:
+            jump = st.number_input("Jump to page",
+                                   min_value=1,
+                                   max_value=total_pages,
+                                   value=state["page"],
+                                   key=f"admin_jump_{state['page']}",
+                                   label_visibility="collapsed")
+            if jump != state["page"]:
+                state["page"] = int(jump)
+                st.rerun()
+        with col_count:
+            st.markdown(
+                f"<div style='padding-top: 0.5rem; color: #6b7280;'>of {total_pages} ({total} enrollments)</div>",
+                unsafe_allow_html=True)
+    else:
+        with col_count:
+            st.markdown(
+                f"<div style='padding-top: 0.5rem; color: #6b7280;'>{total} enrollments</div>",
+                unsafe_allow_html=True)
+    return mode
+
+
+def render_pagination_controls(state: Dict[str, Any],
+                               next_cursor: Optional[Tuple[str, int]]) -> None:
+    """Render Newer/Older buttons that step through pages."""
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("← Newer",
+                     key="page_newer",
+                     disabled=state["page"] <= 1,
+                     use_container_width=True):
+            state["page"] -= 1
+            st.rerun()
+    with col_page:
+        st.markdown(
+            f"<div style='text-align: center; padding-top: 0.5rem; color: #6b7280;'>Page {state['page']}</div>",
+            unsafe_allow_html=True)
+    with col_next:
+        if st.button("Older →",
+                     key="page_older",
+                     disabled=next_cursor is None,
+                     use_container_width=True):
+            state["page"] += 1
+            state["cursors"][state["page"]] = next_cursor
+            st.rerun()
+
+
+def render_load_more(state: Dict[str, Any],
+                     next_cursor: Optional[Tuple[str, int]]) -> None:
+    """Render the button that appends the next page in load-more mode."""
+    if next_cursor is not None and st.button(
+            "Load more", key="load_more", use_container_width=True):
+        state["loaded"] += 1
+        st.rerun()
+
+
 def main() -> None:
     """Main entry point for the admin dashboard."""
+    # Full runs only; card fragments compare against it (see _card_changed)
+    st.session_state.admin_run = st.session_state.get("admin_run", 0) + 1
     try:
         inject_admin_theme_css()
 
         try:
-            records = get_admin_records()
-        except Exception as e:
-            st.error(f"Error loading enrollments: {e}")
-            import traceback
-            st.code(traceback.format_exc())
-            records = []
-
-        pending_count = sum(1 for r in records if r.get("status") == "in_review")
+            pending_count = enrollment_cache.get_list(
+                ("stats", ),
+                lambda: database.get_enrollment_stats(primary=True))["pending"]
+        except Exception:
+            pending_count = 0
 
         # Header
         render_header(pending_count)
 
         # Top-level tabs
-        tab_enroll, tab_settings = st.tabs(
-            ["📋 Enrollments", "🔔 Notification Settings"])
+        tab_names = ["📋 Enrollments", "🔔 Notification Settings"]
+        if database.QUERY_STATS_ENABLED:
+            tab_names.append("📈 Performance")
+        tab_enroll, tab_settings, *tab_perf = st.tabs(tab_names)
 
         with tab_enroll:
+            filters = render_enrollment_filters()
+            page_size = st.session_state.get("admin_page_size",
+                                             ADMIN_PAGE_SIZE)
+            state = _get_list_state(filters, page_size)
+
+            next_cursor = None
+            mode = "Pages"
+            try:
+                total = _count_admin_records(filters)
+                mode = render_list_controls(state, total, page_size)
+                if mode == "Pages":
+                    page = get_admin_records_page(
+                        filters,
+                        _page_cursor(filters, state, state["page"],
+                                     page_size), page_size)
+                else:
+                    # One keyset query for every page loaded so far
+                    page = get_admin_records_page(filters, None,
+                                                  page_size * state["loaded"])
+                records = page["records"]
+                next_cursor = page["next_cursor"]
+            except Exception as e:
+                st.error(f"Error loading enrollments: {e}")
+                import traceback
+                st.code(traceback.format_exc())
+                records = []
+
             if not records:
                 st.info(
                     "No enrollments found. Technicians will appear here after submitting enrollment forms."
@@ -1473,8 +1900,21 @@ def main() -> None:
                     except Exception as e:
                         st.error(f"Error rendering record {rec.get('id', 'unknown')}: {e}")
 
+            if mode == "Load more":
+                render_load_more(state, next_cursor)
+            elif state["page"] > 1 or next_cursor is not None:
+                render_pagination_controls(state, next_cursor)
+            st.selectbox("Cards per page",
+                         ADMIN_PAGE_SIZES,
+                         index=ADMIN_PAGE_SIZES.index(ADMIN_PAGE_SIZE),
+                         key="admin_page_size")
+
         with tab_settings:
             render_notification_settings_tab()
+
+        if tab_perf:
+            with tab_perf[0]:
+                render_query_stats_tab()
     except Exception as e:
         st.error(f"Dashboard error: {e}")
         import traceback
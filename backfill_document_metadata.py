@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Fill in the documents catalog (size, hash, content type, dimensions) for
+rows uploaded before it existed, or re-verify every row.
+
+Usage:
+  python backfill_document_metadata.py               # only never-verified rows
+  python backfill_document_metadata.py --all         # re-check every document
+  python backfill_document_metadata.py --thumbnails  # also create missing thumbnails
+
+Files that cannot be read are recorded as missing, which is what the admin
+dashboard and notifications use instead of probing storage.
+"""
+
+import sys
+import database
+import file_storage
+
+
+def backfill_document_metadata(verify_all=False, thumbnails=False):
+    """Read each document from storage once and record what was found."""
+    # Collected up front so updates do not run while the listing cursor is open
+    pending = [
+        (d['id'], d['file_path'], d.get('thumbnail_path'))
+        for d in database.iter_documents(unverified_only=not verify_all)
+    ]
+    print(f"Checking {len(pending)} documents...")
+
+    described = missing = thumbs = 0
+    for document_id, path, thumbnail_path in pending:
+        try:
+            file_bytes = file_storage.read_file(path) if path else None
+        except Exception as e:
+            print(f"Missing document {document_id} ({path}): {e}")
+            file_bytes = None
+
+        if file_bytes is None:
+            database.set_document_metadata(document_id, None)
+            missing += 1
+            continue
+
+        database.set_document_metadata(document_id, file_storage.describe_file(file_bytes, path))
+        described += 1
+        if thumbnails and not thumbnail_path:
+            thumbnail_path = file_storage.save_thumbnail(path, file_bytes)
+            if thumbnail_path:
+                database.set_document_thumbnail(document_id, thumbnail_path)
+                thumbs += 1
+
+    print("\n=== Backfill Complete ===")
+    print(f"Described: {described}")
+    print(f"Missing: {missing}")
+    if thumbnails:
+        print(f"Thumbnails created: {thumbs}")
+
+    return {'described': described, 'missing': missing, 'thumbnails': thumbs}
+
+if __name__ == "__main__":
+    result = backfill_document_metadata(verify_all="--all" in sys.argv[1:],
+                                        thumbnails="--thumbnails" in sys.argv[1:])
+    print(f"\nBackfill summary: {result}")
@@ -20,12 +20,14 @@ import base64 as _b64
 import mimetypes as _mimetypes
 import hashlib
 from datetime import datetime
+from typing import Optional
 from mimetypes import guess_type
 
 import requests
 import certifi
 
-import database_pg as database
+import database
+import enrollment_cache
 import file_storage
 
 
@@ -75,6 +77,27 @@ def _dashboard_log(message: str):
         pass
 
 
+def _record_sync_attempt(enrollment_id, status: str, started: float, error: str = None,
+                         payload=None, details: dict = None):
+    """Log a dashboard call in sync_attempts; a logging failure never fails the sync."""
+    if not enrollment_id:
+        return
+    try:
+        database.record_sync_attempt(
+            enrollment_id, "dashboard", status,
+            latency_ms=(time.monotonic() - started) * 1000,
+            error=error, payload=payload, details=details,
+        )
+    except Exception as e:
+        _dashboard_log(f"Could not record sync attempt for enrollment {enrollment_id}: {e}")
+
+
+def _upload_status(photo_count: int, failed_uploads: list) -> str:
+    if not failed_uploads:
+        return "success"
+    return "partial" if photo_count else "failed"
+
+
 def _retry_request(func, attempts=3, backoff_base=0.5):
     """Generic retry wrapper for operations that return a requests.Response."""
     last_exc = None
@@ -479,11 +502,19 @@ def push_to_dashboard_single_request(record: dict, enrollment_id: int = None, en
             failed_photos.append({'path': path, 'error': 'missing path'})
             continue
         
-        if not file_storage.file_exists(path):
+        # Known facts come from the documents catalog instead of a storage probe
+        if database.document_missing(d):
             failed_photos.append({'path': path, 'error': 'missing'})
             continue
+        if (d.get('size_bytes') or 0) > MAX_BYTES:
+            failed_photos.append({'path': path, 'error': 'size_exceeded', 'size': d['size_bytes']})
+            continue
         try:
-            b = file_storage.read_file(path)
+            try:
+                b = file_storage.read_file(path)
+            except file_storage.FileStorageError:
+                failed_photos.append({'path': path, 'error': 'missing'})
+                continue
             size = len(b)
             if size > MAX_BYTES:
                 failed_photos.append({'path': path, 'error': 'size_exceeded', 'size': size})
@@ -506,9 +537,12 @@ def push_to_dashboard_single_request(record: dict, enrollment_id: int = None, en
         payload['photos'] = photos
 
     url = dashboard_url.rstrip('/') + endpoint_path
+    started = time.monotonic()
     try:
         resp = session.post(url, json=payload, timeout=30, verify=ca_bundle)
     except Exception as e:
+        _record_sync_attempt(enrollment_id, "failed", started, error=f"request failed: {e}",
+                             payload=payload, details={"photo_count": len(photos)})
         return {"error": f"request failed: {e}", "failed_photos": failed_photos}
 
     result = {"status_code": resp.status_code}
@@ -529,13 +563,18 @@ def push_to_dashboard_single_request(record: dict, enrollment_id: int = None, en
         else:
             tech_id_returned = resp_json.get('id') or resp_json.get('technicianId')
 
+    report = {"photo_count": len(photos), "status_code": resp.status_code}
+    if failed_photos:
+        report['failed_uploads'] = failed_photos
+    if resp.ok:
+        status, error = ("partial" if failed_photos else "success"), None
+    else:
+        status, error = "failed", f"HTTP {resp.status_code}: {resp.text[:200]}"
+    _record_sync_attempt(enrollment_id, status, started, error=error, payload=payload, details=report)
+
     if enrollment_id and tech_id_returned:
         try:
-            report = {"photo_count": len(photos)}
-            if failed_photos:
-                report['failed_uploads'] = failed_photos
-            report['response'] = resp_json
-            database.set_dashboard_sync_info(enrollment_id, dashboard_tech_id=str(tech_id_returned), report=report)
+            database.set_dashboard_sync_info(enrollment_id, dashboard_tech_id=str(tech_id_returned))
         except Exception:
             pass
 
@@ -799,6 +838,7 @@ def upload_photos_for_technician(enrollment_id: int, dashboard_tech_id: str = No
     if not dashboard_tech_id:
         return {"error": "dashboard technician id not provided and lookup failed"}
 
+    started = time.monotonic()
     photo_count = 0
     failed_uploads = []
 
@@ -910,9 +950,12 @@ def upload_photos_for_technician(enrollment_id: int, dashboard_tech_id: str = No
     report = {"photo_count": photo_count}
     if failed_uploads:
         report['failed_uploads'] = failed_uploads
+    _record_sync_attempt(enrollment_id, _upload_status(photo_count, failed_uploads), started,
+                         error=f"{len(failed_uploads)} upload(s) failed" if failed_uploads else None,
+                         details=report)
 
     try:
-        database.set_dashboard_sync_info(enrollment_id, dashboard_tech_id=dashboard_tech_id, report=report)
+        database.set_dashboard_sync_info(enrollment_id, dashboard_tech_id=dashboard_tech_id)
     except Exception:
         pass
 
@@ -923,7 +966,7 @@ def upload_photos_for_technician(enrollment_id: int, dashboard_tech_id: str = No
 
 
 def retry_failed_uploads(enrollment_id: int) -> dict:
-    """Retry previously failed photo uploads recorded in `last_upload_report`.
+    """Retry the failed photo uploads of the latest dashboard sync attempt.
 
     Returns: {retried_count: int, remaining_failed: int, still_failed: [...]} 
     """
@@ -962,16 +1005,18 @@ def retry_failed_uploads(enrollment_id: int) -> dict:
     if not dashboard_id:
         return {"error": "dashboard technician id not found"}
 
-    last_report = record.get('last_upload_report')
-    if not last_report:
-        return {"error": "no last_upload_report available"}
     try:
-        if isinstance(last_report, str):
-            report_obj = json.loads(last_report)
-        else:
-            report_obj = last_report
+        last_attempt = database.get_latest_sync_attempt(enrollment_id, "dashboard")
     except Exception:
-        report_obj = last_report if isinstance(last_report, dict) else {}
+        last_attempt = None
+    if not last_attempt or not last_attempt.get('details'):
+        return {"error": "no dashboard sync attempt recorded"}
+    report_obj = last_attempt['details']
+    if isinstance(report_obj, str):
+        try:
+            report_obj = json.loads(report_obj)
+        except Exception:
+            report_obj = {}
 
     failed = report_obj.get('failed_uploads', []) if isinstance(report_obj, dict) else []
     if not failed:
@@ -983,6 +1028,7 @@ def retry_failed_uploads(enrollment_id: int) -> dict:
     except Exception:
         path_to_category = {}
 
+    started = time.monotonic()
     retried = 0
     still_failed = []
 
@@ -1045,8 +1091,11 @@ def retry_failed_uploads(enrollment_id: int) -> dict:
     if still_failed:
         new_report['failed_uploads'] = still_failed
 
+    _record_sync_attempt(enrollment_id, _upload_status(retried, still_failed), started,
+                         error=f"{len(still_failed)} upload(s) still failing" if still_failed else None,
+                         details=new_report)
     try:
-        database.set_dashboard_sync_info(enrollment_id, dashboard_tech_id=dashboard_id, report=new_report)
+        database.set_dashboard_sync_info(enrollment_id, dashboard_tech_id=dashboard_id)
     except Exception:
         pass
 
@@ -1057,21 +1106,13 @@ def retry_failed_uploads(enrollment_id: int) -> dict:
 post_to_dashboard_single_request = push_to_dashboard_single_request
 
 
-# Cache clearing helper - this clears Streamlit cache when enrollment data changes
-def clear_enrollment_cache():
-    """Clear any cached enrollment data. 
+# Cache clearing helper - drops cached admin data when enrollment data changes
+def clear_enrollment_cache(enrollment_id: Optional[int] = None):
+    """Clear cached data for an enrollment (or all enrollments when None).
     
     This should be called after approving, deleting, or modifying enrollments
-    to ensure the admin dashboard shows fresh data.
+    to ensure the admin dashboard shows fresh data. Other caches, such as the
+    Streamlit resources, are left alone; other processes pick the change up
+    from the database change version (see enrollment_cache).
     """
-    import streamlit as st
-    
-    # Clear all Streamlit caches to ensure fresh data
-    try:
-        st.cache_data.clear()
-    except Exception:
-        pass
-    try:
-        st.cache_resource.clear()
-    except Exception:
-        pass
+    enrollment_cache.invalidate(enrollment_id)
@@ -0,0 +1,28 @@
+"""
+Database backend selector for BYOV Enrollment Engine.
+
+Application modules import this module instead of a concrete backend.
+BYOV_DB_BACKEND picks the implementation: "postgres" (default) loads
+database_pg, "sqlite" loads the embedded database_sqlite backend. Every
+public name is forwarded to the selected module.
+"""
+import os
+import importlib
+
+BACKENDS = {
+    "postgres": "database_pg",
+    "sqlite": "database_sqlite",
+}
+
+DB_BACKEND = os.environ.get("BYOV_DB_BACKEND", "postgres").strip().lower()
+
+if DB_BACKEND not in BACKENDS:
+    raise ImportError(
+        f"Unknown BYOV_DB_BACKEND '{DB_BACKEND}'; expected one of: {', '.join(sorted(BACKENDS))}"
+    )
+
+backend = importlib.import_module(BACKENDS[DB_BACKEND])
+
+
+def __getattr__(name):
+    return getattr(backend, name)
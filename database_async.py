@@ -0,0 +1,590 @@
+"""
+Asynchronous PostgreSQL access for BYOV Enrollment Engine.
+
+An asyncpg counterpart to database_pg for background workers and batch jobs
+that want to overlap database I/O with network I/O on one event loop. The
+schema, SQL fragments, validation and Enrollment record type are shared
+with database_pg (importing it also applies pending migrations).
+
+Usage:
+    import asyncio
+    import database_async as adb
+
+    async def main():
+        records = await adb.get_enrollments_with_details({"approved": False})
+        await asyncio.gather(*(sync_one(r) for r in records))
+        await adb.close_pool()
+"""
+import re
+import json
+import uuid
+import asyncio
+import itertools
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Sequence
+
+import asyncpg
+
+import database_pg as pg
+from database_pg import CHECKLIST_TASKS, Enrollment, EnrollmentLocked
+
+# Seconds to wait for a free pooled connection before raising
+POOL_ACQUIRE_TIMEOUT = pg.POOL_WAIT_TIMEOUT
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+# Types returned as database text so Enrollment decodes them the same way
+# as database_pg's record cursors (timestamps/dates) or leaves them raw (JSON).
+_TEXT_TYPES = ("timestamp", "timestamptz", "date")
+
+_PLACEHOLDER = re.compile(r"%s")
+
+_Column = namedtuple("_Column", "name type_code")
+
+
+def _numbered(query: str) -> str:
+    """Rewrite psycopg2 %s placeholders as asyncpg $1, $2, ..."""
+    counter = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    for type_name in _TEXT_TYPES:
+        await conn.set_type_codec(
+            type_name, schema="pg_catalog", encoder=str, decoder=str, format="text"
+        )
+
+
+async def get_pool() -> asyncpg.Pool:
+    """Get or create the asyncpg pool for the running event loop."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if not pg.DATABASE_URL:
+        raise RuntimeError("DATABASE_URL environment variable not set")
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                pg.DATABASE_URL,
+                min_size=pg.POOL_MIN_CONN,
+                max_size=pg.POOL_MAX_CONN,
+                timeout=pg.CONNECT_KWARGS["connect_timeout"],
+                init=_init_connection,
+            )
+    return _pool
+
+
+async def close_pool():
+    """Close the pool; call before the event loop shuts down."""
+    global _pool, _pool_lock
+    pool_instance, _pool, _pool_lock = _pool, None, None
+    if pool_instance is not None:
+        await pool_instance.close()
+
+
+@asynccontextmanager
+async def get_connection() -> AsyncIterator[asyncpg.Connection]:
+    """Acquire a pooled connection inside a transaction."""
+    pool_instance = await get_pool()
+    async with pool_instance.acquire(timeout=POOL_ACQUIRE_TIMEOUT) as conn:
+        async with conn.transaction():
+            yield conn
+
+
+def with_retry(func):
+    """Decorator to retry async database operations on connection errors."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(pg.MAX_RETRIES):
+            try:
+                return await func(*args, **kwargs)
+            except (asyncpg.PostgresConnectionError, asyncpg.InterfaceError,
+                    ConnectionError, OSError):
+                if attempt == pg.MAX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(pg.RETRY_DELAY * (attempt + 1))
+    return wrapper
+
+
+@asynccontextmanager
+async def enrollment_lock(enrollment_id: int, purpose: str) -> AsyncIterator[None]:
+    """Async database_pg.enrollment_lock; raises EnrollmentLocked when busy.
+
+    Like it, the lock is held on its own connection rather than a pool slot.
+    """
+    classes = pg._enrollment_lock_classes(purpose)
+    if not pg.DATABASE_URL:
+        raise RuntimeError("DATABASE_URL environment variable not set")
+    conn = await asyncpg.connect(pg.DATABASE_URL, timeout=pg.CONNECT_KWARGS["connect_timeout"])
+    try:
+        for lock_class in classes:
+            if not await conn.fetchval(
+                    "SELECT pg_try_advisory_lock($1, $2)", lock_class, enrollment_id):
+                raise EnrollmentLocked(
+                    f"Enrollment {enrollment_id} is busy; cannot start {purpose} now")
+        yield
+    finally:
+        # Unlock before closing: the server ends a closed session asynchronously
+        try:
+            await conn.execute("SELECT pg_advisory_unlock_all()")
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+            # A broken connection drops its session locks with it
+            print(f"Could not release enrollment lock {enrollment_id}/{purpose}: {e}")
+        finally:
+            await conn.close()
+
+
+async def _fetch_enrollments(conn: asyncpg.Connection, query: str, params) -> List[Enrollment]:
+    """Run a query and wrap its rows as database_pg.Enrollment records."""
+    statement = await conn.prepare(_numbered(query))
+    rows = await statement.fetch(*params)
+    if not rows:
+        return []
+    layout = pg._row_layout(
+        [_Column(attr.name, attr.type.oid) for attr in statement.get_attributes()]
+    )
+    return [Enrollment(layout, row) for row in rows]
+
+
+def _timestamps_to_str(row: Dict[str, Any], *keys: str) -> Dict[str, Any]:
+    for key in keys:
+        if row.get(key):
+            row[key] = pg._decode_timestamp(None, row[key])
+    return row
+
+
+@with_retry
+async def get_all_enrollments(projection: str = "full") -> List[Enrollment]:
+    """Return all enrollments ordered by submission date."""
+    async with get_connection() as conn:
+        return await _fetch_enrollments(conn, f"""
+            SELECT {pg._enrollment_columns(projection)} FROM enrollments e
+            ORDER BY e.submission_date DESC
+        """, ())
+
+
+@with_retry
+async def get_enrollments_with_details(filters: Optional[Dict[str, Any]] = None,
+                                       cursor_key: Optional[Tuple[str, int]] = None,
+                                       limit: Optional[int] = None,
+                                       projection: str = "full") -> List[Enrollment]:
+    """Async database_pg.get_enrollments_with_details."""
+    columns = pg._enrollment_columns(projection)
+    conditions, params = pg._enrollment_filter_clause(filters)
+    if cursor_key is not None:
+        conditions.append("(e.submission_date, e.id) < (%s, %s)")
+        params.extend(cursor_key)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(int(limit))
+
+    async with get_connection() as conn:
+        return await _fetch_enrollments(conn, f"""
+            SELECT {columns},
+                   {pg._DOCUMENTS_JSON_SQL} AS documents,
+                   {pg._CHECKLIST_JSON_SQL} AS checklist
+            FROM enrollments e
+            {where}
+            ORDER BY e.submission_date DESC, e.id DESC
+            {limit_sql}
+        """, params)
+
+
+async def get_enrollments_page(filters: Optional[Dict[str, Any]] = None,
+                               cursor_key: Optional[Tuple[str, int]] = None,
+                               limit: int = 25,
+                               projection: str = "full") -> Dict[str, Any]:
+    """Async database_pg.get_enrollments_page."""
+    rows = await get_enrollments_with_details(filters, cursor_key=cursor_key, limit=limit + 1,
+                                              projection=projection)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = (rows[-1]["submission_date"], rows[-1]["id"])
+    return {"records": rows, "next_cursor": next_cursor}
+
+
+async def iter_enrollments(batch_size: int = pg.ITER_BATCH_SIZE,
+                           filters: Optional[Dict[str, Any]] = None,
+                           with_details: bool = False,
+                           projection: str = "full") -> AsyncIterator[Enrollment]:
+    """Stream enrollments (newest first) through a server-side cursor."""
+    columns = pg._enrollment_columns(projection)
+    conditions, params = pg._enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    details = ""
+    if with_details:
+        details = f", {pg._DOCUMENTS_JSON_SQL} AS documents, {pg._CHECKLIST_JSON_SQL} AS checklist"
+    query = _numbered(f"""
+        SELECT {columns}{details}
+        FROM enrollments e
+        {where}
+        ORDER BY e.submission_date DESC, e.id DESC
+    """)
+    async with get_connection() as conn:
+        statement = await conn.prepare(query)
+        layout = pg._row_layout(
+            [_Column(attr.name, attr.type.oid) for attr in statement.get_attributes()]
+        )
+        async for row in statement.cursor(*params, prefetch=batch_size):
+            yield Enrollment(layout, row)
+
+
+@with_retry
+async def get_enrollment_page_cursor(filters: Optional[Dict[str, Any]], page: int,
+                                     page_size: int) -> Optional[Tuple[str, int]]:
+    """Async database_pg.get_enrollment_page_cursor."""
+    if page <= 1:
+        return None
+    conditions, params = pg._enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append((page - 1) * page_size - 1)
+    async with get_connection() as conn:
+        row = await conn.fetchrow(_numbered(f"""
+            SELECT e.submission_date, e.id FROM enrollments e
+            {where}
+            ORDER BY e.submission_date DESC, e.id DESC
+            OFFSET %s LIMIT 1
+        """), *params)
+    return (pg._decode_timestamp(None, row[0]), row[1]) if row else None
+
+
+@with_retry
+async def count_enrollments(filters: Optional[Dict[str, Any]] = None) -> int:
+    """Count enrollments matching the listing filters."""
+    conditions, params = pg._enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    async with get_connection() as conn:
+        return await conn.fetchval(
+            _numbered(f"SELECT COUNT(*) FROM enrollments e {where}"), *params
+        )
+
+
+@with_retry
+async def get_enrollment_stats() -> Dict[str, Any]:
+    """Return enrollment totals from the enrollment_stats table."""
+    async with get_connection() as conn:
+        rows = await conn.fetch(pg._ENROLLMENT_STATS_SQL)
+    return pg._shape_enrollment_stats(tuple(row) for row in rows)
+
+
+@with_retry
+async def get_enrollment_changes(since_version: Optional[int] = None) -> Tuple[int, List[int]]:
+    """Return (current data version, ids of enrollments changed after since_version)."""
+    async with get_connection() as conn:
+        rows = await conn.fetch(_numbered(pg._ENROLLMENT_CHANGES_SQL), since_version, since_version)
+    return pg._shape_enrollment_changes([tuple(row) for row in rows])
+
+
+@with_retry
+async def get_workflow_queue(completed: Sequence[str] = (), pending: Sequence[str] = (),
+                             stage: Optional[str] = None, limit: int = 100) -> List[Enrollment]:
+    """Enrollments waiting on a checklist step, oldest submission first."""
+    query, params = pg._workflow_queue_query(completed, pending, stage, limit)
+    async with get_connection() as conn:
+        return await _fetch_enrollments(conn, query, params)
+
+
+@with_retry
+async def get_enrollment_by_id(enrollment_id: int) -> Optional[Enrollment]:
+    """Return a single enrollment with its documents."""
+    async with get_connection() as conn:
+        rows = await _fetch_enrollments(conn, f"""
+            SELECT e.*, {pg._DOCUMENTS_JSON_SQL} AS documents
+            FROM enrollments e
+            WHERE e.id = %s
+        """, (enrollment_id,))
+        return rows[0] if rows else None
+
+
+async def get_enrollment(enrollment_id: int) -> Optional[Enrollment]:
+    """Alias for get_enrollment_by_id."""
+    return await get_enrollment_by_id(enrollment_id)
+
+
+async def _inserted_or_existing_id(conn: asyncpg.Connection, new_id: Optional[int],
+                                   table: str, idempotency_key: str) -> int:
+    if new_id is None:
+        new_id = await conn.fetchval(
+            f"SELECT id FROM {table} WHERE idempotency_key = $1", idempotency_key
+        )
+        if new_id is None:
+            raise ValueError(f"Failed to insert into {table}")
+    return new_id
+
+
+async def insert_enrollment(record: Dict[str, Any], idempotency_key: Optional[str] = None) -> int:
+    """Insert a new enrollment and return its ID (idempotent per key, see database_pg)."""
+    return await _insert_enrollment(record, idempotency_key or uuid.uuid4().hex)
+
+
+@with_retry
+async def _insert_enrollment(record: Dict[str, Any], idempotency_key: str) -> int:
+    async with get_connection() as conn:
+        new_id = await conn.fetchval(
+            _numbered(pg._ENROLLMENT_INSERT_SQL),
+            *pg._enrollment_insert_values(record, idempotency_key)
+        )
+        return await _inserted_or_existing_id(conn, new_id, "enrollments", idempotency_key)
+
+
+async def submit_enrollment_bundle(record: Dict[str, Any],
+                                   documents: List[Tuple[str, ...]],
+                                   checklist: bool = True,
+                                   idempotency_key: Optional[str] = None) -> int:
+    """Insert an enrollment, its documents and checklist in one statement."""
+    return await _submit_enrollment_bundle(record, documents, checklist,
+                                           idempotency_key or uuid.uuid4().hex)
+
+
+@with_retry
+async def _submit_enrollment_bundle(record: Dict[str, Any], documents: List[Tuple[str, ...]],
+                                    checklist: bool, idempotency_key: str) -> int:
+    async with get_connection() as conn:
+        new_id = await conn.fetchval(
+            _numbered(pg._SUBMIT_BUNDLE_SQL),
+            *pg._submit_bundle_params(record, documents, checklist, idempotency_key)
+        )
+        return await _inserted_or_existing_id(conn, new_id, "enrollments", idempotency_key)
+
+
+@with_retry
+async def update_enrollment(enrollment_id: int, updates: Dict[str, Any]):
+    """Update specific fields on an enrollment."""
+    if not updates:
+        return
+    fields, values = pg._enrollment_update_clause(updates)
+    values.append(enrollment_id)
+    async with get_connection() as conn:
+        await conn.execute(
+            _numbered(f"UPDATE enrollments SET {', '.join(fields)} WHERE id = %s"), *values
+        )
+
+
+async def set_dashboard_sync_info(enrollment_id: int, dashboard_tech_id: Optional[str] = None,
+                                  report: Optional[dict] = None):
+    """Persist the dashboard technician ID; a report is logged as a sync attempt."""
+    if dashboard_tech_id is not None:
+        await update_enrollment(enrollment_id, {"dashboard_tech_id": str(dashboard_tech_id)})
+    if report is not None:
+        status = "partial" if report.get("failed_uploads") else "success"
+        await record_sync_attempt(enrollment_id, "dashboard", status, details=report)
+
+
+@with_retry
+async def record_sync_attempt(enrollment_id: int, target: str, status: str,
+                              latency_ms: Optional[float] = None, error: Optional[str] = None,
+                              payload: Any = None, details: Optional[dict] = None) -> int:
+    """Append one outbound sync attempt and return its ID (see database_pg)."""
+    params = pg._sync_attempt_params(enrollment_id, target, status, latency_ms, error, payload, details)
+    async with get_connection() as conn:
+        return await conn.fetchval(_numbered(pg._SYNC_ATTEMPT_INSERT_SQL), *params)
+
+
+@with_retry
+async def approve_enrollment(enrollment_id: int, approved_by: str = "Admin") -> bool:
+    """Mark an enrollment as approved."""
+    async with get_connection() as conn:
+        await conn.execute("""
+            UPDATE enrollments
+            SET approved = 1, approved_at = $1, approved_by = $2
+            WHERE id = $3
+        """, datetime.now(), approved_by, enrollment_id)
+    return True
+
+
+@with_retry
+async def update_segno_status(enrollment_id: int, status: str, segno_record_id: Optional[str] = None):
+    """Update Segno sync status for an enrollment."""
+    async with get_connection() as conn:
+        await conn.execute("""
+            UPDATE enrollments SET segno_sync_status = $1, segno_record_id = $2
+            WHERE id = $3
+        """, status, segno_record_id, enrollment_id)
+
+
+@with_retry
+async def delete_enrollment(enrollment_id: int):
+    """Delete an enrollment and its documents (CASCADE)."""
+    async with get_connection() as conn:
+        await conn.execute("DELETE FROM enrollments WHERE id = $1", enrollment_id)
+
+
+async def add_document(enrollment_id: int, doc_type: str, file_path: str,
+                       idempotency_key: Optional[str] = None,
+                       thumbnail_path: Optional[str] = None,
+                       metadata: Optional[Dict[str, Any]] = None) -> int:
+    """Add a document record for an enrollment and return its ID (idempotent per key)."""
+    return await _add_document(enrollment_id, doc_type, file_path, thumbnail_path, metadata,
+                               idempotency_key or uuid.uuid4().hex)
+
+
+@with_retry
+async def _add_document(enrollment_id: int, doc_type: str, file_path: str,
+                        thumbnail_path: Optional[str], metadata: Optional[Dict[str, Any]],
+                        idempotency_key: str) -> int:
+    async with get_connection() as conn:
+        new_id = await conn.fetchval(
+            _numbered(pg._ADD_DOCUMENT_SQL),
+            *pg._add_document_params(enrollment_id, doc_type, file_path,
+                                     thumbnail_path, metadata, idempotency_key)
+        )
+        return await _inserted_or_existing_id(conn, new_id, "documents", idempotency_key)
+
+
+@with_retry
+async def set_document_thumbnail(document_id: int, thumbnail_path: Optional[str]):
+    """Record the thumbnail generated for an existing document."""
+    async with get_connection() as conn:
+        await conn.execute("UPDATE documents SET thumbnail_path = $1 WHERE id = $2",
+                           thumbnail_path, document_id)
+
+
+@with_retry
+async def set_document_metadata(document_id: int, metadata: Optional[Dict[str, Any]]):
+    """Record a storage check of a document; metadata None means the file is missing."""
+    metadata = metadata or {}
+    async with get_connection() as conn:
+        await conn.execute(
+            _numbered(pg._SET_DOCUMENT_METADATA_SQL),
+            *(metadata.get(column) for column in pg.DOCUMENT_METADATA_COLUMNS), document_id
+        )
+
+
+@with_retry
+async def get_documents_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
+    """Get all documents for an enrollment."""
+    async with get_connection() as conn:
+        rows = await conn.fetch(
+            f"SELECT {pg._DOCUMENT_COLUMNS_SQL} FROM documents WHERE enrollment_id = $1 ORDER BY id",
+            enrollment_id
+        )
+        return [dict(row) for row in rows]
+
+
+@with_retry
+async def create_checklist_for_enrollment(enrollment_id: int) -> bool:
+    """Create checklist tasks for a new enrollment."""
+    async with get_connection() as conn:
+        await conn.executemany("""
+            INSERT INTO enrollment_checklist (enrollment_id, task_key, task_name)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (enrollment_id, task_key) DO NOTHING
+        """, [(enrollment_id, task['key'], task['name']) for task in CHECKLIST_TASKS])
+    return True
+
+
+@with_retry
+async def get_checklist_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
+    """Get all checklist tasks for an enrollment."""
+    async with get_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT id, enrollment_id, task_key, task_name, completed, completed_at,
+                   completed_by, email_recipient, email_sent, email_sent_at, created_at
+            FROM enrollment_checklist
+            WHERE enrollment_id = $1
+            ORDER BY id
+        """, enrollment_id)
+        return [
+            _timestamps_to_str(dict(row), "completed_at", "email_sent_at", "created_at")
+            for row in rows
+        ]
+
+
+@with_retry
+async def update_checklist_task(task_id: int, completed: bool, completed_by: str = "Admin") -> bool:
+    """Update a checklist task's completion status and the enrollment's checklist_mask."""
+    async with get_connection() as conn:
+        await conn.execute(
+            _numbered(pg._UPDATE_CHECKLIST_TASK_SQL),
+            *pg._update_checklist_task_params(task_id, completed, completed_by)
+        )
+    return True
+
+
+@with_retry
+async def mark_checklist_task_by_key(enrollment_id: int, task_key: str, completed: bool = True,
+                                     completed_by: str = "System") -> bool:
+    """Mark a checklist task as complete by enrollment_id and task_key (upsert)."""
+    async with get_connection() as conn:
+        await conn.execute(
+            _numbered(pg._MARK_CHECKLIST_TASK_SQL),
+            *pg._mark_checklist_task_params(enrollment_id, task_key, completed, completed_by)
+        )
+    return True
+
+
+async def _get_app_setting(setting_key: str) -> Any:
+    """Return the decoded setting_value for a key (None if missing)."""
+    async with get_connection() as conn:
+        value = await conn.fetchval(
+            "SELECT setting_value FROM app_settings WHERE setting_key = $1", setting_key
+        )
+    return json.loads(value) if isinstance(value, str) else value
+
+
+async def _save_app_setting(setting_key: str, value: Any):
+    """Upsert a setting and notify processes caching it via database_pg."""
+    async with get_connection() as conn:
+        await conn.execute("""
+            INSERT INTO app_settings (setting_key, setting_value, updated_at)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (setting_key)
+            DO UPDATE SET setting_value = EXCLUDED.setting_value, updated_at = EXCLUDED.updated_at
+        """, setting_key, json.dumps(value), datetime.now())
+        await conn.execute("SELECT pg_notify($1, $2)", pg.SETTINGS_NOTIFY_CHANNEL, setting_key)
+    pg.invalidate_settings_cache(setting_key)
+
+
+async def get_approval_notification_settings() -> Optional[Dict[str, Any]]:
+    """Get approval notification settings from app_settings table."""
+    return await _get_app_setting("approval_notification")
+
+
+async def save_approval_notification_settings(settings: Dict[str, Any]) -> bool:
+    """Save approval notification settings to app_settings table."""
+    await _save_app_setting("approval_notification", settings)
+    return True
+
+
+async def get_notification_settings() -> Optional[Dict[str, Any]]:
+    """Get all notification settings from app_settings table."""
+    return await _get_app_setting("notification_settings")
+
+
+async def save_notification_settings(settings: Dict[str, Any]) -> bool:
+    """Save all notification settings to app_settings table."""
+    await _save_app_setting("notification_settings", settings)
+    return True
+
+
+async def get_checklist_task_recipients() -> Dict[str, str]:
+    """Get default email recipients for each task type from app_settings."""
+    value = await _get_app_setting("checklist_recipients")
+    return value if isinstance(value, dict) else {}
+
+
+async def save_checklist_task_recipients(recipients: Dict[str, str]) -> bool:
+    """Save default email recipients for checklist tasks."""
+    await _save_app_setting("checklist_recipients", recipients)
+    return True
+
+
+async def get_admin_settings(setting_key: str) -> Optional[Dict[str, Any]]:
+    """Get admin settings by key from app_settings table."""
+    return await _get_app_setting(setting_key)
+
+
+async def save_admin_settings(setting_key: str, settings: Dict[str, Any]) -> bool:
+    """Save admin settings by key to app_settings table."""
+    await _save_app_setting(setting_key, settings)
+    return True
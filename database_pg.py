@@ -4,16 +4,25 @@ Replaces SQLite with PostgreSQL for persistent storage across deployments.
 Uses connection pooling for optimal performance under load.
 """
 import os
+import sys
+import copy
 import json
 import time
+import hashlib
+import logging
+import select
+import uuid
 import atexit
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import threading
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Sequence
+from collections.abc import Mapping
 from contextlib import contextmanager
 from functools import wraps
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
 from psycopg2 import pool
 
 def get_database_url():
@@ -29,112 +38,631 @@ def get_database_url():
 
 DATABASE_URL = get_database_url()
 
+
+def get_read_database_url():
+    """Get the optional read-replica URL (PRODUCTION_READ_DATABASE_URL in production).
+    Returns None when no replica is configured, so every read uses the primary.
+    """
+    if os.environ.get("REPLIT_DEPLOYMENT"):
+        prod_url = os.environ.get("PRODUCTION_READ_DATABASE_URL")
+        if prod_url:
+            return prod_url
+    return os.environ.get("READ_DATABASE_URL") or None
+
+READ_DATABASE_URL = get_read_database_url()
+
+# After a session commits on the primary, its reads stay on the primary this long
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "5"))
+# Reads fall back to the primary while the replica is further behind than this
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+# How long a replica lag measurement is reused before checking again
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_LAG_CHECK_SECONDS", "10"))
+
 MAX_RETRIES = 3
 RETRY_DELAY = 0.5
 
 # Connection pool settings
 POOL_MIN_CONN = 2
 POOL_MAX_CONN = 10
+# Seconds a caller waits for a free connection before giving up
+POOL_WAIT_TIMEOUT = float(os.environ.get("DB_POOL_WAIT_TIMEOUT", "10"))
+# Connections idle for less than this are handed out without a SELECT 1 ping
+POOL_PING_IDLE_SECONDS = float(os.environ.get("DB_POOL_PING_IDLE_SECONDS", "30"))
+
+# Opt-in query instrumentation (see get_query_stats)
+QUERY_STATS_ENABLED = os.environ.get("DB_QUERY_STATS", "").lower() in ("1", "true", "yes")
+# Statements slower than this are written to the slow-query log
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "250"))
+# Upper bounds of the latency histogram buckets in ms; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+slow_query_log = logging.getLogger("byov.db.slow_queries")
+
+# Connection options; TCP keepalives let the kernel notice dead peers
+# between pings instead of the first query after an outage.
+CONNECT_KWARGS = {
+    "connect_timeout": 10,
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+
+class _ManagedPool:
+    """ThreadedConnectionPool wrapper with bounded waits and lazy liveness checks.
+    
+    A semaphore caps the number of connections checked out at once (pooled or
+    fallback), so callers queue for up to POOL_WAIT_TIMEOUT seconds instead of
+    opening extra connections. Connections are only pinged when they have sat
+    idle longer than POOL_PING_IDLE_SECONDS.
+    """
+    
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+        self._lock = threading.Lock()
+        self._pooled_ids = set()
+        self._fallback_ids = set()
+        self._last_used: Dict[int, float] = {}
+        self._local = threading.local()
+        self._stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "wait_time_total_ms": 0.0,
+            "wait_time_max_ms": 0.0,
+            "wait_timeouts": 0,
+            "pings": 0,
+            "stale_drops": 0,
+            "fallback_connects": 0,
+        }
+    
+    def _get_pool(self):
+        """Get or create the underlying psycopg2 pool."""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    try:
+                        self._pool = pool.ThreadedConnectionPool(
+                            POOL_MIN_CONN,
+                            POOL_MAX_CONN,
+                            self.dsn,
+                            **CONNECT_KWARGS
+                        )
+                    except Exception as e:
+                        print(f"Warning: Could not create connection pool: {e}")
+                        return None
+        return self._pool
+    
+    def _bump(self, key: str, amount: float = 1):
+        with self._lock:
+            self._stats[key] += amount
+    
+    def getconn(self):
+        """Check out a connection, waiting up to POOL_WAIT_TIMEOUT for a free slot."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=POOL_WAIT_TIMEOUT):
+            self._bump("wait_timeouts")
+            raise pool.PoolError(
+                f"Timed out after {POOL_WAIT_TIMEOUT:.1f}s waiting for a database connection"
+            )
+        waited_ms = (time.monotonic() - started) * 1000
+        self._local.wait_ms = waited_ms
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_time_total_ms"] += waited_ms
+            self._stats["wait_time_max_ms"] = max(self._stats["wait_time_max_ms"], waited_ms)
+        
+        try:
+            return self._checkout()
+        except Exception:
+            self._release_slot()
+            raise
+    
+    def _checkout(self):
+        pool_instance = self._get_pool()
+        if pool_instance:
+            # Stale connections are closed and replaced; a fresh connection is
+            # never pinged, so this loop ends after at most POOL_MAX_CONN drops.
+            for _ in range(POOL_MAX_CONN + 1):
+                conn = pool_instance.getconn()
+                if self._is_alive(conn):
+                    with self._lock:
+                        self._pooled_ids.add(id(conn))
+                    return conn
+                self._bump("stale_drops")
+                self._last_used.pop(id(conn), None)
+                try:
+                    pool_instance.putconn(conn, close=True)
+                except Exception:
+                    pass
+        
+        # Pool unavailable: fall back to a direct connection with retry. It
+        # still holds a slot, so fallbacks are bounded by POOL_MAX_CONN too.
+        last_error = None
+        for attempt in range(MAX_RETRIES):
+            try:
+                conn = psycopg2.connect(self.dsn, **CONNECT_KWARGS)
+                self._bump("fallback_connects")
+                with self._lock:
+                    self._fallback_ids.add(id(conn))
+                return conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                last_error = e
+                if attempt < MAX_RETRIES - 1:
+                    time.sleep(RETRY_DELAY * (attempt + 1))
+        
+        raise last_error if last_error else RuntimeError("Failed to connect to database")
+    
+    def _is_alive(self, conn) -> bool:
+        """Ping the connection only if it has been idle long enough to go stale."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < POOL_PING_IDLE_SECONDS:
+            return True
+        self._bump("pings")
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+    
+    def _release_slot(self):
+        with self._lock:
+            self._stats["in_use"] -= 1
+        self._slots.release()
+    
+    def putconn(self, conn):
+        """Return a connection to the pool (or close it if it was a fallback)."""
+        conn_id = id(conn)
+        with self._lock:
+            pooled = conn_id in self._pooled_ids
+            self._pooled_ids.discard(conn_id)
+            self._fallback_ids.discard(conn_id)
+        try:
+            if pooled and self._pool is not None and not self._pool.closed:
+                try:
+                    self._pool.putconn(conn, close=conn.closed)
+                except Exception:
+                    conn.close()
+            elif not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        finally:
+            if conn.closed:
+                self._last_used.pop(conn_id, None)
+            else:
+                self._last_used[conn_id] = time.monotonic()
+            self._release_slot()
+    
+    def last_wait_ms(self) -> float:
+        """Time the current thread spent waiting for its latest checkout."""
+        return getattr(self._local, "wait_ms", 0.0)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["max_connections"] = POOL_MAX_CONN
+        snapshot["avg_wait_ms"] = (
+            snapshot["wait_time_total_ms"] / snapshot["checkouts"] if snapshot["checkouts"] else 0.0
+        )
+        return snapshot
+    
+    def closeall(self):
+        with self._lock:
+            pool_instance, self._pool = self._pool, None
+        if pool_instance is not None:
+            try:
+                pool_instance.closeall()
+            except Exception:
+                pass
+
 
 # Global connection pool
-_connection_pool = None
+_connection_pool: Optional[_ManagedPool] = None
+_pool_init_lock = threading.Lock()
 
 
-def _get_pool():
+def _get_pool() -> Optional[_ManagedPool]:
     """Get or create the connection pool (singleton pattern)."""
     global _connection_pool
     if _connection_pool is None and DATABASE_URL:
-        try:
-            _connection_pool = pool.ThreadedConnectionPool(
-                POOL_MIN_CONN,
-                POOL_MAX_CONN,
-                DATABASE_URL,
-                connect_timeout=10
-            )
-            # Register cleanup on exit
-            atexit.register(_cleanup_pool)
-        except Exception as e:
-            print(f"Warning: Could not create connection pool: {e}")
-            return None
+        with _pool_init_lock:
+            if _connection_pool is None:
+                _connection_pool = _ManagedPool(DATABASE_URL)
+                # Register cleanup on exit
+                atexit.register(_cleanup_pool)
     return _connection_pool
 
 
 def _cleanup_pool():
-    """Clean up connection pool on shutdown."""
-    global _connection_pool
+    """Clean up connection pools on shutdown."""
+    global _connection_pool, _read_pool
     if _connection_pool:
-        try:
-            _connection_pool.closeall()
-        except Exception:
-            pass
+        _connection_pool.closeall()
         _connection_pool = None
+    if _read_pool:
+        _read_pool.closeall()
+        _read_pool = None
 
 
-def _create_connection():
-    """Get a connection from pool or create new one with retry logic."""
-    if not DATABASE_URL:
-        raise RuntimeError("DATABASE_URL environment variable not set")
+# Replica pool and routing state (unused unless READ_DATABASE_URL is set)
+_read_pool: Optional[_ManagedPool] = None
+_replica_lock = threading.Lock()
+_replica_lag: Dict[str, Any] = {"checked_at": None, "lag_seconds": None, "healthy": True, "error": None}
+_replica_reads = {"replica": 0, "primary_recent_write": 0, "primary_lagging": 0}
+_last_write_at: Dict[Any, float] = {}
+_session_resolver = None
+
+
+def _get_read_pool() -> Optional[_ManagedPool]:
+    """Get or create the replica pool; None when no replica is configured."""
+    global _read_pool
+    if _read_pool is None and READ_DATABASE_URL:
+        with _pool_init_lock:
+            if _read_pool is None:
+                _read_pool = _ManagedPool(READ_DATABASE_URL)
+    return _read_pool
+
+
+def set_session_resolver(resolver):
+    """Register a callable returning the current user session's key.
     
-    # Try to get from pool first
-    pool_instance = _get_pool()
-    if pool_instance:
-        conn = None
+    Read-your-writes is tracked per session key; without a resolver the
+    current thread is used. The Streamlit apps register their session id.
+    """
+    global _session_resolver
+    _session_resolver = resolver
+
+
+def _session_key() -> Any:
+    if _session_resolver is not None:
         try:
-            conn = pool_instance.getconn()
-            # Test connection is still alive
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
-            return conn
+            key = _session_resolver()
+            if key is not None:
+                return key
         except Exception:
-            # Connection from pool is stale, close and get new one
-            if conn is not None:
-                try:
-                    pool_instance.putconn(conn, close=True)
-                except Exception:
-                    pass
+            pass
+    return threading.get_ident()
+
+
+def _note_write():
+    """Remember that the current session just committed on the primary."""
+    if not READ_DATABASE_URL:
+        return
+    now = time.monotonic()
+    with _replica_lock:
+        _last_write_at[_session_key()] = now
+        if len(_last_write_at) > 1000:
+            cutoff = now - READ_YOUR_WRITES_SECONDS
+            for key in [k for k, t in _last_write_at.items() if t < cutoff]:
+                del _last_write_at[key]
+
+
+def _replica_lag_ok(replica: _ManagedPool) -> bool:
+    """Return True if the replica is reachable and within REPLICA_MAX_LAG_SECONDS.
     
-    # Fallback to direct connection with retry
-    last_error = None
-    for attempt in range(MAX_RETRIES):
+    The measurement is cached for REPLICA_LAG_CHECK_SECONDS. A replica that
+    has replayed everything it received counts as zero lag even when the
+    primary has been idle.
+    """
+    now = time.monotonic()
+    with _replica_lock:
+        checked_at = _replica_lag["checked_at"]
+        if checked_at is not None and now - checked_at < REPLICA_LAG_CHECK_SECONDS:
+            return _replica_lag["healthy"]
+        # Claim this check so concurrent readers reuse the previous result
+        _replica_lag["checked_at"] = now
+    
+    lag_seconds, error = None, None
+    try:
+        conn = replica.getconn()
         try:
-            conn = psycopg2.connect(DATABASE_URL, connect_timeout=10)
             with conn.cursor() as cur:
-                cur.execute("SELECT 1")
-            return conn
-        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-            last_error = e
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY * (attempt + 1))
+                cur.execute("""
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                    END
+                """)
+                lag_seconds = float(cur.fetchone()[0])
+            conn.rollback()
+        finally:
+            replica.putconn(conn)
+    except Exception as e:
+        error = str(e)
+        print(f"Warning: read replica unavailable, using primary: {e}")
     
-    raise last_error if last_error else RuntimeError("Failed to connect to database")
+    healthy = error is None and lag_seconds <= REPLICA_MAX_LAG_SECONDS
+    with _replica_lock:
+        _replica_lag.update(lag_seconds=lag_seconds, healthy=healthy, error=error)
+    return healthy
+
+
+def _mark_replica_unhealthy(error: Exception):
+    with _replica_lock:
+        _replica_lag.update(checked_at=time.monotonic(), healthy=False, error=str(error))
+    print(f"Warning: read replica unavailable, using primary: {error}")
+
+
+def _replica_for_read() -> Optional[_ManagedPool]:
+    """Pick the replica pool for a read, or None to read from the primary."""
+    replica = _get_read_pool()
+    if replica is None:
+        return None
+    with _replica_lock:
+        last_write = _last_write_at.get(_session_key())
+    if last_write is not None and time.monotonic() - last_write < READ_YOUR_WRITES_SECONDS:
+        reason = "primary_recent_write"
+    elif not _replica_lag_ok(replica):
+        reason = "primary_lagging"
+    else:
+        reason = "replica"
+    with _replica_lock:
+        _replica_reads[reason] += 1
+    return replica if reason == "replica" else None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return a snapshot of connection pool counters.
+    
+    Includes checkouts, in_use, total/max/average wait time, wait timeouts,
+    liveness pings, stale connections dropped and fallback connects. With a
+    read replica configured, 'replica' holds the same counters for its pool
+    plus routing decisions and the last lag measurement.
+    """
+    pool_instance = _get_pool()
+    stats = pool_instance.stats() if pool_instance else {}
+    replica = _get_read_pool()
+    if replica is not None:
+        with _replica_lock:
+            routing = dict(_replica_reads)
+            lag = {k: v for k, v in _replica_lag.items() if k != "checked_at"}
+        stats["replica"] = dict(replica.stats(), reads=routing, **lag)
+    return stats
+
+
+def _create_connection():
+    """Check out a connection from the managed pool."""
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL environment variable not set")
+    pool_instance = _get_pool()
+    if pool_instance is None:
+        raise RuntimeError("Failed to connect to database")
+    return pool_instance.getconn()
 
 
 def _return_connection(conn):
-    """Return connection to pool or close it."""
-    if conn.closed:
-        return
+    """Return connection to the managed pool."""
     pool_instance = _get_pool()
     if pool_instance:
-        try:
-            pool_instance.putconn(conn)
-            return
-        except Exception:
-            pass
-    # If no pool or putconn failed, just close
+        pool_instance.putconn(conn)
+        return
     try:
         conn.close()
     except Exception:
         pass
 
 
+class _QueryStats:
+    """Thread-safe latency histograms keyed by calling function and statement."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._functions: Dict[str, Dict[str, Any]] = {}
+            self._statements: Dict[str, Dict[str, Any]] = {}
+            self._since = datetime.now().isoformat()
+    
+    @staticmethod
+    def _entry(table: Dict[str, Dict[str, Any]], key: str) -> Dict[str, Any]:
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {
+                "calls": 0,
+                "rows": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        return entry
+    
+    @staticmethod
+    def _observe(entry: Dict[str, Any], elapsed_ms: float, rows: int, count: bool = True):
+        if count:
+            entry["calls"] += 1
+            bucket = len(LATENCY_BUCKETS_MS)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    bucket = i
+                    break
+            entry["histogram"][bucket] += 1
+        entry["rows"] += rows
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+    
+    def record_checkout(self, function: str, wait_ms: float):
+        with self._lock:
+            entry = self._entry(self._functions, function)
+            entry["cursors"] = entry.get("cursors", 0) + 1
+            entry["pool_wait_ms"] = entry.get("pool_wait_ms", 0.0) + wait_ms
+    
+    def record(self, function: str, statement: str, elapsed_ms: float, rows: int,
+               count: bool = True):
+        with self._lock:
+            self._observe(self._entry(self._functions, function), elapsed_ms, rows, count)
+            self._observe(self._entry(self._statements, statement), elapsed_ms, rows, count)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        def rows_of(table):
+            result = []
+            for key, entry in table.items():
+                item = copy.deepcopy(entry)
+                item["avg_ms"] = item["total_ms"] / item["calls"] if item["calls"] else 0.0
+                result.append((key, item))
+            result.sort(key=lambda pair: pair[1]["total_ms"], reverse=True)
+            return dict(result)
+        
+        with self._lock:
+            return {
+                "enabled": QUERY_STATS_ENABLED,
+                "since": self._since,
+                "slow_query_ms": SLOW_QUERY_MS,
+                "buckets_ms": list(LATENCY_BUCKETS_MS),
+                "functions": rows_of(self._functions),
+                "statements": rows_of(self._statements),
+                "pool": get_pool_stats(),
+            }
+
+
+_query_stats = _QueryStats()
+
+# Frames skipped when attributing a query to the function that issued it
+_CURSOR_HELPERS = {
+    "get_cursor", "get_read_cursor", "get_record_cursor", "_iter_server_side", "_instrument"
+}
+
+
+def _calling_function() -> str:
+    """Name of the nearest caller outside the cursor helpers and contextlib."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name not in _CURSOR_HELPERS and not code.co_filename.endswith("contextlib.py"):
+            module = frame.f_globals.get("__name__", "?")
+            return f"{module}.{code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _normalize_statement(query: Any) -> str:
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", errors="replace")
+    text = " ".join(str(query).split())
+    # Keep head and tail so long statements that share a prefix stay distinct
+    return text if len(text) <= 300 else f"{text[:200]} … {text[-90:]}"
+
+
+class _InstrumentedCursor:
+    """Cursor proxy that times execute/fetch calls into _query_stats.
+    
+    For named (server-side) cursors the fetches do the real work, so their
+    time and row counts are added to the statement that opened the cursor.
+    """
+    
+    def __init__(self, cursor, function: str):
+        self._cursor = cursor
+        self._function = function
+        self._statement = None
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def _record(self, elapsed_ms: float, rows: int, count: bool, params: Any = None):
+        _query_stats.record(self._function, self._statement, elapsed_ms, rows, count)
+        if count and elapsed_ms >= SLOW_QUERY_MS:
+            slow_query_log.warning(json.dumps({
+                "event": "slow_query",
+                "function": self._function,
+                "statement": self._statement,
+                "elapsed_ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "params": len(params) if isinstance(params, (list, tuple, dict)) else 0,
+            }))
+    
+    def execute(self, query, params=None):
+        self._statement = _normalize_statement(query)
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._record((time.perf_counter() - started) * 1000,
+                         max(self._cursor.rowcount, 0), True, params)
+    
+    def executemany(self, query, params_seq):
+        self._statement = _normalize_statement(query)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, params_seq)
+        finally:
+            self._record((time.perf_counter() - started) * 1000,
+                         max(self._cursor.rowcount, 0), True)
+    
+    def _timed_fetch(self, method, *args):
+        if self._cursor.name is None or self._statement is None:
+            return method(*args)
+        started = time.perf_counter()
+        result = method(*args)
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        self._record((time.perf_counter() - started) * 1000, rows, False)
+        return result
+    
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+    
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(self._cursor.fetchmany)
+        return self._timed_fetch(self._cursor.fetchmany, size)
+    
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+
+def _instrument(cursor):
+    """Wrap a cursor for query stats when DB_QUERY_STATS is enabled."""
+    if not QUERY_STATS_ENABLED:
+        return cursor
+    function = _calling_function()
+    pool_instance = _get_pool()
+    _query_stats.record_checkout(function, pool_instance.last_wait_ms() if pool_instance else 0.0)
+    return _InstrumentedCursor(cursor, function)
+
+
+def get_query_stats() -> Dict[str, Any]:
+    """Return a snapshot of per-function and per-statement query latency.
+    
+    Entries carry calls, rows, total/avg/max ms and a histogram over
+    LATENCY_BUCKETS_MS; functions also carry cursor checkouts and pool wait.
+    Empty unless DB_QUERY_STATS is enabled.
+    """
+    return _query_stats.snapshot()
+
+
+def reset_query_stats():
+    """Clear the collected query statistics."""
+    _query_stats.reset()
+
+
 @contextmanager
 def get_connection():
-    """Context manager for database connections with pooling support."""
+    """Context manager for primary database connections with pooling support.
+    
+    This is the write path: committing a transaction here pins this
+    session's reads to the primary for READ_YOUR_WRITES_SECONDS. Pure reads
+    use get_read_connection (primary=True when they must see the primary).
+    """
     conn = _create_connection()
     try:
         yield conn
         if not conn.closed:
+            # Nothing to pin when the block ran no statement
+            wrote = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
             conn.commit()
+            if wrote:
+                _note_write()
     except Exception:
         try:
             if not conn.closed:
@@ -147,13 +675,68 @@ def get_connection():
 
 
 @contextmanager
-def get_cursor(dict_cursor: bool = True):
-    """Context manager for database cursors."""
+def get_read_connection(primary: bool = False):
+    """Context manager for read-only work, routed to the replica when safe.
+    
+    Uses the primary when no replica is configured, when this session wrote
+    within READ_YOUR_WRITES_SECONDS, or when the replica lags or is down.
+    primary=True forces the primary without counting as a write.
+    """
+    replica = None if primary else _replica_for_read()
+    conn = None
+    if replica is not None:
+        try:
+            conn = replica.getconn()
+        except (psycopg2.OperationalError, pool.PoolError) as e:
+            _mark_replica_unhealthy(e)
+            replica = None
+    if conn is None:
+        conn = _create_connection()
+    try:
+        yield conn
+        if not conn.closed:
+            conn.commit()
+    except Exception:
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        if replica is not None:
+            replica.putconn(conn)
+        else:
+            _return_connection(conn)
+
+
+@contextmanager
+def get_read_cursor(dict_cursor: bool = True, raw_types: bool = False, primary: bool = False):
+    """Like get_cursor, but on a get_read_connection connection."""
+    with get_read_connection(primary) as conn:
+        cursor_factory = RealDictCursor if dict_cursor else None
+        cursor = conn.cursor(cursor_factory=cursor_factory)
+        if raw_types:
+            psycopg2.extensions.register_type(_RAW_TEXT_TYPE, cursor)
+        try:
+            yield _instrument(cursor)
+        finally:
+            cursor.close()
+
+
+@contextmanager
+def get_cursor(dict_cursor: bool = True, raw_types: bool = False):
+    """Context manager for database cursors.
+    
+    raw_types leaves JSON and timestamp columns as raw text (see Enrollment).
+    """
     with get_connection() as conn:
         cursor_factory = RealDictCursor if dict_cursor else None
         cursor = conn.cursor(cursor_factory=cursor_factory)
+        if raw_types:
+            psycopg2.extensions.register_type(_RAW_TEXT_TYPE, cursor)
         try:
-            yield cursor
+            yield _instrument(cursor)
         finally:
             cursor.close()
 
@@ -177,91 +760,255 @@ def with_retry(func):
     return wrapper
 
 
-def init_db():
-    """Initialize database tables if they don't exist."""
-    with get_cursor(dict_cursor=False) as cursor:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS enrollments (
-                id SERIAL PRIMARY KEY,
-                full_name TEXT NOT NULL,
-                tech_id TEXT NOT NULL,
-                district TEXT,
-                state TEXT,
-                referred_by TEXT,
-                industries JSONB DEFAULT '[]',
-                industry JSONB DEFAULT '[]',
-                year TEXT,
-                make TEXT,
-                model TEXT,
-                vin TEXT,
-                insurance_exp TEXT,
-                registration_exp TEXT,
-                template_used TEXT,
-                comment TEXT,
-                submission_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                approved INTEGER DEFAULT 0,
-                approved_at TIMESTAMP WITH TIME ZONE,
-                approved_by TEXT,
-                dashboard_tech_id TEXT,
-                last_upload_report JSONB
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id SERIAL PRIMARY KEY,
-                enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
-                doc_type TEXT NOT NULL,
-                file_path TEXT NOT NULL
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notification_rules (
-                id SERIAL PRIMARY KEY,
-                rule_name TEXT NOT NULL,
-                trigger TEXT NOT NULL,
-                days_before INTEGER,
-                recipients TEXT NOT NULL,
-                enabled INTEGER DEFAULT 1
-            )
+class EnrollmentLocked(Exception):
+    """Raised when another session already holds an enrollment_lock."""
+    pass
+
+
+# First key of the two-int advisory lock taken per operation; the second key
+# is the enrollment id. 'delete' takes every class.
+ENROLLMENT_LOCK_CLASSES = {
+    "dashboard": 0x6279_0001,
+    "segno": 0x6279_0002,
+}
+
+
+def _enrollment_lock_classes(purpose: str) -> List[int]:
+    if purpose == "delete":
+        return sorted(ENROLLMENT_LOCK_CLASSES.values())
+    if purpose not in ENROLLMENT_LOCK_CLASSES:
+        raise ValueError(f"Unknown enrollment lock purpose: {purpose}")
+    return [ENROLLMENT_LOCK_CLASSES[purpose]]
+
+
+@contextmanager
+def enrollment_lock(enrollment_id: int, purpose: str):
+    """Serialize a slow external operation on one enrollment across sessions.
+
+    purpose is 'dashboard' or 'segno' (separate locks, so the two syncs may
+    overlap) or 'delete', which excludes both. Built on pg_try_advisory_lock:
+    raises EnrollmentLocked immediately when another session holds it, and
+    no row lock or open transaction is kept while the body runs.
+    
+    The lock is held on its own connection outside the managed pool: the body
+    checks out pool connections itself, so POOL_MAX_CONN concurrent syncs
+    holding pool slots would starve them.
+    """
+    classes = _enrollment_lock_classes(purpose)
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL environment variable not set")
+    conn = psycopg2.connect(DATABASE_URL, **CONNECT_KWARGS)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for lock_class in classes:
+                cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (lock_class, enrollment_id))
+                if not cursor.fetchone()[0]:
+                    raise EnrollmentLocked(
+                        f"Enrollment {enrollment_id} is busy; cannot start {purpose} now")
+        yield
+    finally:
+        # Unlock before closing: the server ends a closed session asynchronously
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock_all()")
+        except psycopg2.Error as e:
+            # A broken connection drops its session locks with it
+            print(f"Could not release enrollment lock {enrollment_id}/{purpose}: {e}")
+        finally:
+            conn.close()
+
+
+def _migration_001_base_schema(cursor):
+    """Core tables: enrollments, documents, notification rules and settings."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id SERIAL PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            tech_id TEXT NOT NULL,
+            district TEXT,
+            state TEXT,
+            referred_by TEXT,
+            industries JSONB DEFAULT '[]',
+            industry JSONB DEFAULT '[]',
+            year TEXT,
+            make TEXT,
+            model TEXT,
+            vin TEXT,
+            insurance_exp TEXT,
+            registration_exp TEXT,
+            template_used TEXT,
+            comment TEXT,
+            submission_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            approved INTEGER DEFAULT 0,
+            approved_at TIMESTAMP WITH TIME ZONE,
+            approved_by TEXT,
+            dashboard_tech_id TEXT,
+            last_upload_report JSONB
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id SERIAL PRIMARY KEY,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            doc_type TEXT NOT NULL,
+            file_path TEXT NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_rules (
+            id SERIAL PRIMARY KEY,
+            rule_name TEXT NOT NULL,
+            trigger TEXT NOT NULL,
+            days_before INTEGER,
+            recipients TEXT NOT NULL,
+            enabled INTEGER DEFAULT 1
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notifications_sent (
+            id SERIAL PRIMARY KEY,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            rule_id INTEGER NOT NULL REFERENCES notification_rules(id) ON DELETE CASCADE,
+            sent_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_settings (
+            id SERIAL PRIMARY KEY,
+            setting_key TEXT UNIQUE NOT NULL,
+            setting_value JSONB NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_tech_id ON enrollments(tech_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_enrollment_id ON documents(enrollment_id)")
+    
+    # Hire status, truck number, split name and Segno sync columns were added
+    # after the first deployments, so older databases pick them up here.
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS is_new_hire BOOLEAN DEFAULT FALSE")
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS truck_number TEXT")
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS first_name TEXT")
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS last_name TEXT")
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS segno_sync_status TEXT DEFAULT 'pending'")
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS segno_record_id TEXT")
+
+
+def _migration_004_listing_indexes(cursor):
+    """Composite (filter column, submission_date, id) indexes for keyset-paginated listings."""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_enrollments_submission_id
+        ON enrollments(submission_date DESC, id DESC)
+    """)
+    for column in ("approved", "state", "district", "segno_sync_status"):
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_{column}_submission_id
+            ON enrollments({column}, submission_date DESC, id DESC)
         """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notifications_sent (
-                id SERIAL PRIMARY KEY,
-                enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
-                rule_id INTEGER NOT NULL REFERENCES notification_rules(id) ON DELETE CASCADE,
-                sent_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
+
+
+# Typed DATE shadows of the free-text expiration columns
+EXPIRATION_DATE_COLUMNS = {
+    "insurance_exp": "insurance_exp_date",
+    "registration_exp": "registration_exp_date",
+}
+
+_EXP_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%Y/%m/%d")
+
+
+def parse_expiration_date(value: Any) -> Optional[date]:
+    """Parse an expiration value (ISO date/datetime or US style) to a date."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        pass
+    for fmt in _EXP_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _migration_005_expiration_dates(cursor):
+    """DATE columns for insurance/registration expiry, backfilled from the text values."""
+    for column in EXPIRATION_DATE_COLUMNS.values():
+        cursor.execute(f"ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS {column} DATE")
+    
+    cursor.execute("""
+        SELECT id, insurance_exp, registration_exp FROM enrollments
+        WHERE insurance_exp IS NOT NULL OR registration_exp IS NOT NULL
+    """)
+    rows = [
+        (row[0], parse_expiration_date(row[1]), parse_expiration_date(row[2]))
+        for row in cursor.fetchall()
+    ]
+    if rows:
+        execute_values(cursor, """
+            UPDATE enrollments e
+            SET insurance_exp_date = v.insurance_exp_date,
+                registration_exp_date = v.registration_exp_date
+            FROM (VALUES %s) AS v(id, insurance_exp_date, registration_exp_date)
+            WHERE e.id = v.id
+        """, rows, template="(%s, %s::date, %s::date)")
+    
+    for column in EXPIRATION_DATE_COLUMNS.values():
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_{column}
+            ON enrollments({column}, id)
         """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS app_settings (
-                id SERIAL PRIMARY KEY,
-                setting_key TEXT UNIQUE NOT NULL,
-                setting_value JSONB NOT NULL,
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
+
+
+# Tables whose inserts take a client-generated idempotency key, so retried
+# or repeated submissions resolve to the row the first attempt wrote
+IDEMPOTENT_TABLES = ("enrollments", "documents", "notifications_sent")
+
+
+def _migration_008_idempotency_keys(cursor):
+    """Unique idempotency_key columns on enrollments, documents and notifications_sent."""
+    for table in IDEMPOTENT_TABLES:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS idempotency_key TEXT")
+        cursor.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_idempotency_key
+            ON {table}(idempotency_key)
         """)
-        
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_tech_id ON enrollments(tech_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_enrollment_id ON documents(enrollment_id)")
-        
-        # Add new columns for hire status and truck number (if they don't exist)
-        try:
-            cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS is_new_hire BOOLEAN DEFAULT FALSE")
-            cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS truck_number TEXT")
-            cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS first_name TEXT")
-            cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS last_name TEXT")
-            cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS segno_sync_status TEXT DEFAULT 'pending'")
-            cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS segno_record_id TEXT")
-        except Exception:
-            pass  # Columns may already exist
 
 
-def insert_enrollment(record: Dict[str, Any]) -> int:
-    """Insert a new enrollment and return its ID."""
+_ENROLLMENT_INSERT_COLUMNS = (
+    "full_name", "tech_id", "district", "state", "referred_by",
+    "industries", "industry", "year", "make", "model", "vin",
+    "insurance_exp", "registration_exp", "template_used", "comment",
+    "submission_date", "approved", "approved_at", "approved_by",
+    "is_new_hire", "truck_number", "first_name", "last_name",
+    "insurance_exp_date", "registration_exp_date", "idempotency_key",
+)
+
+# Returns no row when an enrollment with the same idempotency_key exists
+_ENROLLMENT_INSERT_SQL = """
+    INSERT INTO enrollments ({}) VALUES ({})
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id
+""".format(
+    ", ".join(_ENROLLMENT_INSERT_COLUMNS),
+    ", ".join(["%s"] * len(_ENROLLMENT_INSERT_COLUMNS)),
+)
+
+
+def _enrollment_insert_values(record: Dict[str, Any],
+                              idempotency_key: Optional[str] = None) -> Tuple[Any, ...]:
+    """Build the parameter tuple matching _ENROLLMENT_INSERT_COLUMNS."""
     industries_list = record.get("industry", record.get("industries", []))
     if isinstance(industries_list, str):
         try:
@@ -271,149 +1018,628 @@ def insert_enrollment(record: Dict[str, Any]) -> int:
     
     industries_json = json.dumps(industries_list)
     
-    with get_cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO enrollments (
-                full_name, tech_id, district, state, referred_by,
-                industries, industry, year, make, model, vin,
-                insurance_exp, registration_exp, template_used, comment,
-                submission_date, approved, approved_at, approved_by,
-                is_new_hire, truck_number, first_name, last_name
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            ) RETURNING id
-        """, (
-            record.get("full_name"),
-            record.get("tech_id"),
-            record.get("district"),
-            record.get("state"),
-            record.get("referred_by"),
-            industries_json,
-            industries_json,
-            record.get("year"),
-            record.get("make"),
-            record.get("model"),
-            record.get("vin"),
-            record.get("insurance_exp"),
-            record.get("registration_exp"),
-            record.get("template_used"),
-            record.get("comment"),
-            record.get("submission_date", datetime.now().isoformat()),
-            0,
-            None,
-            None,
-            record.get("is_new_hire", False),
-            record.get("truck_number"),
-            record.get("first_name"),
-            record.get("last_name")
-        ))
+    return (
+        record.get("full_name"),
+        record.get("tech_id"),
+        record.get("district"),
+        record.get("state"),
+        record.get("referred_by"),
+        industries_json,
+        industries_json,
+        record.get("year"),
+        record.get("make"),
+        record.get("model"),
+        record.get("vin"),
+        record.get("insurance_exp"),
+        record.get("registration_exp"),
+        record.get("template_used"),
+        record.get("comment"),
+        record.get("submission_date", datetime.now().isoformat()),
+        0,
+        None,
+        None,
+        record.get("is_new_hire", False),
+        record.get("truck_number"),
+        record.get("first_name"),
+        record.get("last_name"),
+        parse_expiration_date(record.get("insurance_exp")),
+        parse_expiration_date(record.get("registration_exp")),
+        idempotency_key
+    )
+
+
+def _inserted_or_existing_id(cursor, table: str, idempotency_key: str) -> int:
+    """ID RETURNING'd by an idempotent insert, else that of the row already holding the key."""
+    result = cursor.fetchone()
+    if result is None:
+        cursor.execute(f"SELECT id FROM {table} WHERE idempotency_key = %s", (idempotency_key,))
         result = cursor.fetchone()
         if result is None:
-            raise ValueError("Failed to insert enrollment")
-        return result["id"] if isinstance(result, dict) else result[0]
+            raise ValueError(f"Failed to insert into {table}")
+    return result["id"] if isinstance(result, dict) else result[0]
+
+
+def insert_enrollment(record: Dict[str, Any], idempotency_key: Optional[str] = None) -> int:
+    """Insert a new enrollment and return its ID.
+    
+    Repeating a call with the same idempotency_key returns the existing
+    enrollment instead of adding another; a key is generated when omitted so
+    connection-error retries cannot insert twice.
+    """
+    return _insert_enrollment(record, idempotency_key or uuid.uuid4().hex)
 
 
 @with_retry
-def get_all_enrollments() -> List[Dict[str, Any]]:
-    """Return all enrollments ordered by submission date."""
+def _insert_enrollment(record: Dict[str, Any], idempotency_key: str) -> int:
     with get_cursor() as cursor:
-        cursor.execute("SELECT * FROM enrollments ORDER BY submission_date DESC")
-        rows = cursor.fetchall()
-        
-        results = []
-        for row in rows:
-            r = dict(row)
-            if r.get("industries"):
-                if isinstance(r["industries"], str):
-                    try:
-                        r["industries"] = json.loads(r["industries"])
-                    except Exception:
-                        r["industries"] = []
-            else:
-                r["industries"] = []
-            
-            if r.get("industry"):
-                if isinstance(r["industry"], str):
-                    try:
-                        r["industry"] = json.loads(r["industry"])
-                    except Exception:
-                        r["industry"] = []
-            else:
-                r["industry"] = r["industries"]
-            
-            if r.get("submission_date"):
-                r["submission_date"] = str(r["submission_date"])
-            if r.get("approved_at"):
-                r["approved_at"] = str(r["approved_at"])
-            
-            results.append(r)
-        
-        return results
+        cursor.execute(_ENROLLMENT_INSERT_SQL, _enrollment_insert_values(record, idempotency_key))
+        return _inserted_or_existing_id(cursor, "enrollments", idempotency_key)
+
+
+_SUBMIT_BUNDLE_SQL = "WITH new_enrollment AS (" + _ENROLLMENT_INSERT_SQL + """),
+    new_documents AS (
+        INSERT INTO documents (enrollment_id, doc_type, file_path, thumbnail_path,
+                               size_bytes, sha256, content_type, width, height, verified_at)
+        SELECT ne.id, d.doc_type, d.file_path, d.thumbnail_path,
+               d.size_bytes, d.sha256, d.content_type, d.width, d.height,
+               CASE WHEN d.size_bytes IS NOT NULL THEN NOW() END
+        FROM new_enrollment ne,
+             unnest(%s::text[], %s::text[], %s::text[], %s::bigint[], %s::text[],
+                    %s::text[], %s::int[], %s::int[])
+             AS d(doc_type, file_path, thumbnail_path, size_bytes, sha256, content_type, width, height)
+    ),
+    new_checklist AS (
+        INSERT INTO enrollment_checklist (enrollment_id, task_key, task_name)
+        SELECT ne.id, t.task_key, t.task_name
+        FROM new_enrollment ne,
+             unnest(%s::text[], %s::text[]) AS t(task_key, task_name)
+        ON CONFLICT (enrollment_id, task_key) DO NOTHING
+    )
+    SELECT id FROM new_enrollment
+"""
+
+
+def _document_fields(document: Any) -> Dict[str, Any]:
+    """Normalize a (doc_type, file_path[, thumbnail_path]) tuple or a document dict."""
+    if isinstance(document, dict):
+        return document
+    return {
+        "doc_type": document[0],
+        "file_path": document[1],
+        "thumbnail_path": document[2] if len(document) > 2 else None,
+    }
+
+
+def _submit_bundle_params(record: Dict[str, Any],
+                          documents: List[Any],
+                          checklist: bool,
+                          idempotency_key: str) -> Tuple[Any, ...]:
+    """Parameters for _SUBMIT_BUNDLE_SQL."""
+    tasks = CHECKLIST_TASKS if checklist else []
+    rows = [_document_fields(document) for document in documents]
+    columns = ("doc_type", "file_path", "thumbnail_path") + DOCUMENT_METADATA_COLUMNS
+    return _enrollment_insert_values(record, idempotency_key) + tuple(
+        [row.get(column) for row in rows] for column in columns
+    ) + (
+        [task["key"] for task in tasks],
+        [task["name"] for task in tasks],
+    )
+
+
+def submit_enrollment_bundle(record: Dict[str, Any],
+                             documents: List[Any],
+                             checklist: bool = True,
+                             idempotency_key: Optional[str] = None) -> int:
+    """Insert an enrollment with its documents and checklist atomically.
+    
+    documents is a list of (doc_type, file_path) pairs, optionally with a
+    third thumbnail_path, or of dicts that may also carry the
+    DOCUMENT_METADATA_COLUMNS (see file_storage.save_uploaded_documents).
+    Everything is written by one statement in one transaction, so a failure
+    leaves nothing behind.
+    Returns the new enrollment ID, or the existing one when a bundle with
+    the same idempotency_key was already submitted (nothing is added then).
+    """
+    return _submit_enrollment_bundle(record, documents, checklist,
+                                     idempotency_key or uuid.uuid4().hex)
 
 
 @with_retry
-def get_enrollment_by_id(enrollment_id: int) -> Optional[Dict[str, Any]]:
-    """Return a single enrollment with its documents."""
+def _submit_enrollment_bundle(record: Dict[str, Any], documents: List[Any],
+                              checklist: bool, idempotency_key: str) -> int:
     with get_cursor() as cursor:
-        cursor.execute("SELECT * FROM enrollments WHERE id = %s", (enrollment_id,))
-        row = cursor.fetchone()
-        
-        if not row:
-            return None
-        
-        record = dict(row)
-        
-        if record.get("industries"):
-            if isinstance(record["industries"], str):
-                try:
-                    record["industries"] = json.loads(record["industries"])
-                except Exception:
-                    record["industries"] = []
-        else:
-            record["industries"] = []
-        
-        if record.get("industry"):
-            if isinstance(record["industry"], str):
-                try:
-                    record["industry"] = json.loads(record["industry"])
-                except Exception:
-                    record["industry"] = []
+        cursor.execute(_SUBMIT_BUNDLE_SQL,
+                       _submit_bundle_params(record, documents, checklist, idempotency_key))
+        return _inserted_or_existing_id(cursor, "enrollments", idempotency_key)
+
+
+# Type OIDs that record cursors leave as raw text: json, jsonb, timestamp, timestamptz, date
+_JSON_OIDS = (114, 3802)
+_TIMESTAMP_OIDS = (1114, 1184)
+# DATE values are already YYYY-MM-DD text, so they need no decoder
+_DATE_OIDS = (1082,)
+_RAW_TEXT_TYPE = psycopg2.extensions.new_type(
+    _JSON_OIDS + _TIMESTAMP_OIDS + _DATE_OIDS, "BYOV_RAW_TEXT", lambda value, cursor: value
+)
+
+
+def _decode_json(record: "Enrollment", raw: Any) -> Any:
+    if raw is None or not isinstance(raw, str):
+        return raw
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+def _decode_timestamp(record: "Enrollment", raw: Any) -> Any:
+    """Render timestamps the way str(datetime) did for the old dict rows."""
+    if not raw:
+        return raw
+    try:
+        return str(datetime.fromisoformat(raw))
+    except (TypeError, ValueError):
+        return raw
+
+
+def _decode_industries(record: "Enrollment", raw: Any) -> List[Any]:
+    value = _decode_json(record, raw)
+    return value if value else []
+
+
+def _decode_industry(record: "Enrollment", raw: Any) -> Any:
+    value = _decode_json(record, raw)
+    # Summary projections select industry without industries
+    return value if value else (record.get("industries") or [])
+
+
+# Column-specific decoders; other JSON/timestamp columns use the type defaults
+_COLUMN_DECODERS = {
+    "industries": _decode_industries,
+    "industry": _decode_industry,
+}
+
+
+class Enrollment(Mapping):
+    """Compact, read-only enrollment row.
+    
+    Backed by the raw result tuple plus a column layout shared by every row
+    of the same query. JSON and timestamp columns are kept as database text
+    and decoded on first access, so listing code only pays for the fields it
+    reads. Supports the dict-style reads callers already use (get, [], in,
+    keys, items); to_dict() returns a plain dict, e.g. for JSON export.
+    """
+    __slots__ = ("_layout", "_row", "_decoded")
+    
+    def __init__(self, layout: Dict[str, Tuple[int, Any]], row: tuple):
+        self._layout = layout
+        self._row = row
+        self._decoded: Optional[Dict[str, Any]] = None
+    
+    def __getitem__(self, key: str) -> Any:
+        decoded = self._decoded
+        if decoded is not None and key in decoded:
+            return decoded[key]
+        index, decoder = self._layout[key]
+        value = self._row[index]
+        if decoder is None:
+            return value
+        value = decoder(self, value)
+        if self._decoded is None:
+            self._decoded = {}
+        self._decoded[key] = value
+        return value
+    
+    def __iter__(self):
+        return iter(self._layout)
+    
+    def __len__(self) -> int:
+        return len(self._layout)
+    
+    def __repr__(self) -> str:
+        return f"Enrollment(id={self.get('id')!r}, tech_id={self.get('tech_id')!r})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return every column decoded into a plain dict."""
+        return {key: self[key] for key in self._layout}
+
+
+def _row_layout(description) -> Dict[str, Tuple[int, Any]]:
+    """Map column name -> (position, decoder) for a record cursor's result."""
+    layout: Dict[str, Tuple[int, Any]] = {}
+    for index, column in enumerate(description):
+        decoder = _COLUMN_DECODERS.get(column.name)
+        if decoder is None:
+            if column.type_code in _JSON_OIDS:
+                decoder = _decode_json
+            elif column.type_code in _TIMESTAMP_OIDS:
+                decoder = _decode_timestamp
+        layout[column.name] = (index, decoder)
+    return layout
+
+
+def _fetch_enrollments(cursor, size: Optional[int] = None) -> List[Enrollment]:
+    """Fetch rows from a record cursor as Enrollment objects."""
+    rows = cursor.fetchall() if size is None else cursor.fetchmany(size)
+    if not rows:
+        return []
+    layout = _row_layout(cursor.description)
+    return [Enrollment(layout, row) for row in rows]
+
+
+@contextmanager
+def get_record_cursor(read_only: bool = False, primary: bool = False):
+    """Tuple cursor for Enrollment rows: JSON and timestamps stay raw text.
+    
+    read_only=True routes the query through get_read_cursor (primary=True
+    keeps it on the primary without counting as a write).
+    """
+    if read_only:
+        with get_read_cursor(dict_cursor=False, raw_types=True, primary=primary) as cursor:
+            yield cursor
+    else:
+        with get_cursor(dict_cursor=False, raw_types=True) as cursor:
+            yield cursor
+
+
+# Correlated subqueries that aggregate an enrollment's documents / checklist
+_DOCUMENTS_JSON_SQL = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+                   'id', d.id, 'doc_type', d.doc_type, 'file_path', d.file_path,
+                   'thumbnail_path', d.thumbnail_path, 'size_bytes', d.size_bytes,
+                   'content_type', d.content_type, 'width', d.width, 'height', d.height,
+                   'verified_at', d.verified_at
+               ) ORDER BY d.id)
+        FROM documents d
+        WHERE d.enrollment_id = e.id
+    ), '[]'::json)
+"""
+
+_CHECKLIST_JSON_SQL = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+                   'id', c.id, 'enrollment_id', c.enrollment_id,
+                   'task_key', c.task_key, 'task_name', c.task_name,
+                   'completed', c.completed, 'completed_at', c.completed_at,
+                   'completed_by', c.completed_by, 'email_recipient', c.email_recipient,
+                   'email_sent', c.email_sent, 'email_sent_at', c.email_sent_at,
+                   'created_at', c.created_at
+               ) ORDER BY c.id)
+        FROM enrollment_checklist c
+        WHERE c.enrollment_id = e.id
+    ), '[]'::json)
+"""
+
+
+# Columns a listing row needs to render an admin card. Detail-only columns
+# (comment, industries, template_used, approval audit, idempotency_key, ...)
+# are loaded per record with get_enrollment_by_id.
+ENROLLMENT_SUMMARY_COLUMNS = (
+    "id", "full_name", "tech_id", "district", "state", "referred_by", "industry",
+    "year", "make", "model", "vin", "insurance_exp", "registration_exp",
+    "submission_date", "approved", "segno_sync_status", "checklist_mask", "workflow_stage",
+)
+
+ENROLLMENT_PROJECTIONS = ("summary", "full")
+
+
+def _enrollment_columns(projection: str, alias: str = "e") -> str:
+    """SELECT list for an enrollment projection: 'summary' or 'full'."""
+    if projection == "full":
+        return f"{alias}.*"
+    if projection == "summary":
+        return ", ".join(f"{alias}.{column}" for column in ENROLLMENT_SUMMARY_COLUMNS)
+    raise ValueError(f"Unknown enrollment projection: {projection}")
+
+
+@with_retry
+def get_all_enrollments(projection: str = "full") -> List[Enrollment]:
+    """Return all enrollments ordered by submission date."""
+    with get_record_cursor(read_only=True) as cursor:
+        cursor.execute(f"""
+            SELECT {_enrollment_columns(projection)} FROM enrollments e
+            ORDER BY e.submission_date DESC
+        """)
+        return _fetch_enrollments(cursor)
+
+
+ENROLLMENT_FILTER_KEYS = {
+    "approved", "state", "district", "segno_sync_status", "submitted_from", "submitted_to"
+}
+
+
+def _enrollment_filter_clause(filters: Optional[Dict[str, Any]], alias: str = "e") -> Tuple[List[str], List[Any]]:
+    """Translate listing filters into SQL conditions and parameters.
+    
+    Supported keys: approved (bool), state, district, segno_sync_status,
+    submitted_from and submitted_to (date, datetime or ISO string; a plain
+    date for submitted_to includes that whole day).
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    if not filters:
+        return conditions, params
+    
+    unknown = set(filters) - ENROLLMENT_FILTER_KEYS
+    if unknown:
+        raise ValueError(f"Invalid enrollment filter: {', '.join(sorted(unknown))}")
+    
+    if filters.get("approved") is not None:
+        conditions.append(f"{alias}.approved = %s")
+        params.append(1 if filters["approved"] else 0)
+    for column in ("state", "district", "segno_sync_status"):
+        if filters.get(column):
+            conditions.append(f"{alias}.{column} = %s")
+            params.append(filters[column])
+    if filters.get("submitted_from"):
+        conditions.append(f"{alias}.submission_date >= %s")
+        params.append(filters["submitted_from"])
+    if filters.get("submitted_to"):
+        submitted_to = filters["submitted_to"]
+        if isinstance(submitted_to, date) and not isinstance(submitted_to, datetime):
+            conditions.append(f"{alias}.submission_date < %s")
+            params.append(submitted_to + timedelta(days=1))
         else:
-            record["industry"] = record["industries"]
-        
-        if record.get("submission_date"):
-            record["submission_date"] = str(record["submission_date"])
-        if record.get("approved_at"):
-            record["approved_at"] = str(record["approved_at"])
-        
-        cursor.execute(
-            "SELECT id, doc_type, file_path FROM documents WHERE enrollment_id = %s",
-            (enrollment_id,)
-        )
-        docs = cursor.fetchall()
-        record["documents"] = [dict(d) for d in docs]
-        
-        return record
+            conditions.append(f"{alias}.submission_date <= %s")
+            params.append(submitted_to)
+    return conditions, params
 
 
-def update_enrollment(enrollment_id: int, updates: Dict[str, Any]):
-    """Update specific fields on an enrollment."""
-    if not updates:
-        return
+@with_retry
+def get_enrollments_with_details(filters: Optional[Dict[str, Any]] = None,
+                                 cursor_key: Optional[Tuple[str, int]] = None,
+                                 limit: Optional[int] = None,
+                                 projection: str = "full",
+                                 primary: bool = False) -> List[Enrollment]:
+    """Return enrollments with their documents and checklist rows attached.
     
-    ALLOWED_COLUMNS = {
-        'full_name', 'tech_id', 'district', 'state', 'referred_by', 
-        'industries', 'industry', 'year', 'make', 'model', 'vin',
-        'insurance_exp', 'registration_exp', 'template_used', 'comment',
-        'submission_date', 'approved', 'approved_at', 'approved_by',
-        'dashboard_tech_id', 'last_upload_report'
-    }
+    Documents and checklist tasks are aggregated into JSON arrays inside a
+    single query, so loading the admin listing costs one round trip no matter
+    how many enrollments exist. Each record gets 'documents' and 'checklist' keys.
+    
+    Rows are ordered newest first by (submission_date, id). Pass the
+    (submission_date, id) of the last row seen as cursor_key to continue
+    after it; see get_enrollments_page. projection='summary' selects only
+    ENROLLMENT_SUMMARY_COLUMNS. primary=True reads the primary even when a
+    replica is configured, for results shared beyond this session.
+    """
+    columns = _enrollment_columns(projection)
+    conditions, params = _enrollment_filter_clause(filters)
+    if cursor_key is not None:
+        conditions.append("(e.submission_date, e.id) < (%s, %s)")
+        params.extend(cursor_key)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(int(limit))
+    
+    with get_record_cursor(read_only=True, primary=primary) as cursor:
+        cursor.execute(f"""
+            SELECT {columns},
+                   {_DOCUMENTS_JSON_SQL} AS documents,
+                   {_CHECKLIST_JSON_SQL} AS checklist
+            FROM enrollments e
+            {where}
+            ORDER BY e.submission_date DESC, e.id DESC
+            {limit_sql}
+        """, params)
+        return _fetch_enrollments(cursor)
+
+
+# Rows fetched per round trip by the streaming iterators
+ITER_BATCH_SIZE = 500
+
+
+def _iter_server_side(query: str, params, batch_size: int, raw_types: bool = False):
+    """Yield result batches from a named (server-side) cursor.
+    
+    Only batch_size rows are held client-side at a time. The connection and
+    its transaction stay open until the generator is exhausted or closed.
+    """
+    with get_read_connection() as conn:
+        cursor = conn.cursor(name=f"byov_iter_{uuid.uuid4().hex[:12]}")
+        cursor.itersize = batch_size
+        if raw_types:
+            psycopg2.extensions.register_type(_RAW_TEXT_TYPE, cursor)
+        tracked = _instrument(cursor)
+        try:
+            tracked.execute(query, params)
+            while True:
+                rows = tracked.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield cursor, rows
+        finally:
+            cursor.close()
+
+
+def iter_enrollments(batch_size: int = ITER_BATCH_SIZE,
+                     filters: Optional[Dict[str, Any]] = None,
+                     with_details: bool = False,
+                     projection: str = "full") -> Iterator[Enrollment]:
+    """Stream enrollments (newest first) without loading the whole table.
     
+    Accepts the same filters and projections as get_enrollments_with_details.
+    With with_details=True each row also carries 'documents' and 'checklist'.
+    """
+    columns = _enrollment_columns(projection)
+    conditions, params = _enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    details = ""
+    if with_details:
+        details = f", {_DOCUMENTS_JSON_SQL} AS documents, {_CHECKLIST_JSON_SQL} AS checklist"
+    query = f"""
+        SELECT {columns}{details}
+        FROM enrollments e
+        {where}
+        ORDER BY e.submission_date DESC, e.id DESC
+    """
+    layout = None
+    for cursor, rows in _iter_server_side(query, params, batch_size, raw_types=True):
+        if layout is None:
+            layout = _row_layout(cursor.description)
+        for row in rows:
+            yield Enrollment(layout, row)
+
+
+def iter_documents(batch_size: int = ITER_BATCH_SIZE,
+                   unverified_only: bool = False) -> Iterator[Dict[str, Any]]:
+    """Stream document rows ordered by enrollment.
+    
+    unverified_only limits the stream to rows whose file was never checked
+    (see set_document_metadata).
+    """
+    where = "WHERE verified_at IS NULL" if unverified_only else ""
+    query = f"""
+        SELECT {_DOCUMENT_COLUMNS_SQL}
+        FROM documents
+        {where}
+        ORDER BY enrollment_id, id
+    """
+    for cursor, rows in _iter_server_side(query, None, batch_size):
+        columns = [c.name for c in cursor.description]
+        for row in rows:
+            yield dict(zip(columns, row))
+
+
+def iter_checklists(batch_size: int = ITER_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream every checklist task row ordered by enrollment."""
+    query = """
+        SELECT id, enrollment_id, task_key, task_name, completed, completed_at,
+               completed_by, email_recipient, email_sent, email_sent_at, created_at
+        FROM enrollment_checklist
+        ORDER BY enrollment_id, id
+    """
+    for cursor, rows in _iter_server_side(query, None, batch_size):
+        columns = [c.name for c in cursor.description]
+        for row in rows:
+            r = dict(zip(columns, row))
+            for key in ("completed_at", "email_sent_at", "created_at"):
+                if r.get(key):
+                    r[key] = str(r[key])
+            yield r
+
+
+def get_enrollments_page(filters: Optional[Dict[str, Any]] = None,
+                         cursor_key: Optional[Tuple[str, int]] = None,
+                         limit: int = 25,
+                         projection: str = "full",
+                         primary: bool = False) -> Dict[str, Any]:
+    """Return one keyset-paginated page of enrollments with details.
+    
+    Returns {'records': [...], 'next_cursor': (submission_date, id) or None}.
+    Pass next_cursor back as cursor_key to fetch the following page.
+    """
+    rows = get_enrollments_with_details(filters, cursor_key=cursor_key, limit=limit + 1,
+                                        projection=projection, primary=primary)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = (rows[-1]["submission_date"], rows[-1]["id"])
+    return {"records": rows, "next_cursor": next_cursor}
+
+
+@with_retry
+def get_enrollment_page_cursor(filters: Optional[Dict[str, Any]], page: int,
+                               page_size: int) -> Optional[Tuple[str, int]]:
+    """Return the cursor_key that starts listing page `page` (1-based).
+    
+    Lets a caller jump straight to a page: the (submission_date, id) of the
+    last row on the previous page is read off the listing index with OFFSET,
+    and get_enrollments_page continues by keyset from there. Returns None
+    for page 1 or a page past the end.
+    """
+    if page <= 1:
+        return None
+    conditions, params = _enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append((page - 1) * page_size - 1)
+    with get_read_cursor(dict_cursor=False, raw_types=True) as cursor:
+        cursor.execute(f"""
+            SELECT e.submission_date, e.id FROM enrollments e
+            {where}
+            ORDER BY e.submission_date DESC, e.id DESC
+            OFFSET %s LIMIT 1
+        """, params)
+        row = cursor.fetchone()
+        return (_decode_timestamp(None, row[0]), row[1]) if row else None
+
+
+@with_retry
+def count_enrollments(filters: Optional[Dict[str, Any]] = None, primary: bool = False) -> int:
+    """Count enrollments matching the listing filters."""
+    conditions, params = _enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with get_read_cursor(dict_cursor=False, primary=primary) as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM enrollments e {where}", params)
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+
+@with_retry
+def get_enrollment_by_id(enrollment_id: int) -> Optional[Enrollment]:
+    """Return a single enrollment (every column) with its documents.
+    
+    Read on the primary: callers re-read right after their own updates.
+    """
+    with get_record_cursor(read_only=True, primary=True) as cursor:
+        cursor.execute(f"""
+            SELECT e.*, {_DOCUMENTS_JSON_SQL} AS documents
+            FROM enrollments e
+            WHERE e.id = %s
+        """, (enrollment_id,))
+        rows = _fetch_enrollments(cursor)
+        return rows[0] if rows else None
+
+
+def get_expiring_enrollments(field: str, within_days: int = 30,
+                             limit: Optional[int] = 100) -> List[Enrollment]:
+    """Return enrollments whose insurance or registration expires soon.
+    
+    field is 'insurance' or 'registration' (the *_exp column names are also
+    accepted). Rows expiring between today and today + within_days are
+    returned soonest first, served by the index on the DATE column.
+    """
+    column = EXPIRATION_DATE_COLUMNS.get(field) or EXPIRATION_DATE_COLUMNS.get(f"{field}_exp")
+    if column is None:
+        raise ValueError(f"Unknown expiration field: {field}")
+    
+    today = date.today()
+    params: List[Any] = [today, today + timedelta(days=int(within_days))]
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(int(limit))
+    
+    with get_record_cursor(read_only=True) as cursor:
+        cursor.execute(f"""
+            SELECT e.* FROM enrollments e
+            WHERE e.{column} >= %s AND e.{column} <= %s
+            ORDER BY e.{column}, e.id
+            {limit_sql}
+        """, params)
+        return _fetch_enrollments(cursor)
+
+
+_UPDATABLE_COLUMNS = {
+    'full_name', 'tech_id', 'district', 'state', 'referred_by', 
+    'industries', 'industry', 'year', 'make', 'model', 'vin',
+    'insurance_exp', 'registration_exp', 'template_used', 'comment',
+    'submission_date', 'approved', 'approved_at', 'approved_by',
+    'dashboard_tech_id'
+}
+
+
+def _enrollment_update_clause(updates: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    """Validate updates and return (SET fragments, values) for update_enrollment."""
     fields = []
     values = []
     
     for key, value in updates.items():
-        if key not in ALLOWED_COLUMNS:
+        if key not in _UPDATABLE_COLUMNS:
             raise ValueError(f"Invalid column name: {key}")
         
         if key in ("industries", "industry"):
@@ -426,7 +1652,19 @@ def update_enrollment(enrollment_id: int, updates: Dict[str, Any]):
                 continue
         fields.append(f"{key} = %s")
         values.append(value)
+        if key in EXPIRATION_DATE_COLUMNS:
+            fields.append(f"{EXPIRATION_DATE_COLUMNS[key]} = %s")
+            values.append(parse_expiration_date(value))
+    return fields, values
+
+
+@with_retry
+def update_enrollment(enrollment_id: int, updates: Dict[str, Any]):
+    """Update specific fields on an enrollment."""
+    if not updates:
+        return
     
+    fields, values = _enrollment_update_clause(updates)
     values.append(enrollment_id)
     
     with get_cursor() as cursor:
@@ -437,36 +1675,25 @@ def update_enrollment(enrollment_id: int, updates: Dict[str, Any]):
 
 
 def set_dashboard_sync_info(enrollment_id: int, dashboard_tech_id: Optional[str] = None, report: Optional[dict] = None):
-    """Persist dashboard sync metadata on an enrollment."""
-    fields = []
-    values = []
+    """Persist the dashboard technician ID; a report is logged as a sync attempt.
     
+    Prefer record_sync_attempt directly, which also takes latency and errors.
+    """
     if dashboard_tech_id is not None:
-        fields.append("dashboard_tech_id = %s")
-        values.append(str(dashboard_tech_id))
-    
+        update_enrollment(enrollment_id, {"dashboard_tech_id": str(dashboard_tech_id)})
     if report is not None:
-        fields.append("last_upload_report = %s")
-        values.append(json.dumps(report))
-    
-    if not fields:
-        return
-    
-    values.append(enrollment_id)
-    
-    with get_cursor() as cursor:
-        cursor.execute(
-            f"UPDATE enrollments SET {', '.join(fields)} WHERE id = %s",
-            values
-        )
+        status = "partial" if report.get("failed_uploads") else "success"
+        record_sync_attempt(enrollment_id, "dashboard", status, details=report)
 
 
+@with_retry
 def delete_enrollment(enrollment_id: int):
     """Delete an enrollment and its documents (CASCADE)."""
     with get_cursor() as cursor:
         cursor.execute("DELETE FROM enrollments WHERE id = %s", (enrollment_id,))
 
 
+@with_retry
 def update_segno_status(enrollment_id: int, status: str, segno_record_id: Optional[str] = None):
     """Update Segno sync status for an enrollment."""
     with get_cursor() as cursor:
@@ -478,25 +1705,124 @@ def update_segno_status(enrollment_id: int, status: str, segno_record_id: Option
         """, (status, segno_record_id, enrollment_id))
 
 
-def get_enrollment(enrollment_id: int) -> Optional[Dict[str, Any]]:
-    """Get a single enrollment by ID. Alias for get_enrollment_by_id."""
-    return get_enrollment_by_id(enrollment_id)
+def get_enrollment(enrollment_id: int) -> Optional[Enrollment]:
+    """Get a single enrollment by ID. Alias for get_enrollment_by_id."""
+    return get_enrollment_by_id(enrollment_id)
+
+
+def _migration_010_document_thumbnails(cursor):
+    """Path of each document's preview derivative (see file_storage.save_thumbnail)."""
+    cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS thumbnail_path TEXT")
+
+
+# Storage facts kept per document (see file_storage.describe_file). verified_at
+# is when they were last read from storage; a verified row without
+# size_bytes was found missing, and unverified rows have not been checked yet.
+DOCUMENT_METADATA_COLUMNS = ("size_bytes", "sha256", "content_type", "width", "height")
+
+_DOCUMENT_COLUMNS_SQL = (
+    "id, enrollment_id, doc_type, file_path, thumbnail_path, "
+    + ", ".join(DOCUMENT_METADATA_COLUMNS) + ", verified_at"
+)
+
+
+def _migration_011_document_metadata(cursor):
+    """Size, hash, content type, dimensions and last verification of each document."""
+    cursor.execute("""
+        ALTER TABLE documents
+            ADD COLUMN IF NOT EXISTS size_bytes BIGINT,
+            ADD COLUMN IF NOT EXISTS sha256 TEXT,
+            ADD COLUMN IF NOT EXISTS content_type TEXT,
+            ADD COLUMN IF NOT EXISTS width INTEGER,
+            ADD COLUMN IF NOT EXISTS height INTEGER,
+            ADD COLUMN IF NOT EXISTS verified_at TIMESTAMPTZ
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documents_unverified
+        ON documents(enrollment_id, id) WHERE verified_at IS NULL
+    """)
+
+
+def document_missing(document: Dict[str, Any]) -> bool:
+    """True when the last storage check found the document's file missing."""
+    return bool(document.get("verified_at")) and document.get("size_bytes") is None
+
+
+_ADD_DOCUMENT_SQL = """
+    INSERT INTO documents (enrollment_id, doc_type, file_path, thumbnail_path,
+                           size_bytes, sha256, content_type, width, height,
+                           verified_at, idempotency_key)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s,
+            CASE WHEN %s THEN NOW() END, %s)
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id
+"""
+
+
+def _add_document_params(enrollment_id: int, doc_type: str, file_path: str,
+                         thumbnail_path: Optional[str], metadata: Optional[Dict[str, Any]],
+                         idempotency_key: str) -> Tuple[Any, ...]:
+    """Parameters for _ADD_DOCUMENT_SQL."""
+    metadata = metadata or {}
+    return (enrollment_id, doc_type, file_path, thumbnail_path,
+            *(metadata.get(column) for column in DOCUMENT_METADATA_COLUMNS),
+            metadata.get("size_bytes") is not None, idempotency_key)
+
+
+def add_document(enrollment_id: int, doc_type: str, file_path: str,
+                 idempotency_key: Optional[str] = None,
+                 thumbnail_path: Optional[str] = None,
+                 metadata: Optional[Dict[str, Any]] = None) -> int:
+    """Add a document record for an enrollment and return its ID (idempotent per key).
+    
+    metadata holds DOCUMENT_METADATA_COLUMNS values from file_storage.describe_file.
+    """
+    return _add_document(enrollment_id, doc_type, file_path, thumbnail_path, metadata,
+                         idempotency_key or uuid.uuid4().hex)
+
+
+@with_retry
+def _add_document(enrollment_id: int, doc_type: str, file_path: str,
+                  thumbnail_path: Optional[str], metadata: Optional[Dict[str, Any]],
+                  idempotency_key: str) -> int:
+    with get_cursor() as cursor:
+        cursor.execute(_ADD_DOCUMENT_SQL,
+                       _add_document_params(enrollment_id, doc_type, file_path,
+                                            thumbnail_path, metadata, idempotency_key))
+        return _inserted_or_existing_id(cursor, "documents", idempotency_key)
+
+
+_SET_DOCUMENT_METADATA_SQL = """
+    UPDATE documents
+    SET size_bytes = %s, sha256 = %s, content_type = %s, width = %s, height = %s,
+        verified_at = NOW()
+    WHERE id = %s
+"""
 
 
-def add_document(enrollment_id: int, doc_type: str, file_path: str):
-    """Add a document record for an enrollment."""
+@with_retry
+def set_document_metadata(document_id: int, metadata: Optional[Dict[str, Any]]):
+    """Record a storage check of a document; metadata None means the file is missing."""
+    metadata = metadata or {}
     with get_cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO documents (enrollment_id, doc_type, file_path) VALUES (%s, %s, %s)",
-            (enrollment_id, doc_type, file_path)
-        )
+        cursor.execute(_SET_DOCUMENT_METADATA_SQL, (
+            *(metadata.get(column) for column in DOCUMENT_METADATA_COLUMNS), document_id
+        ))
+
+
+@with_retry
+def set_document_thumbnail(document_id: int, thumbnail_path: Optional[str]):
+    """Record the thumbnail generated for an existing document."""
+    with get_cursor() as cursor:
+        cursor.execute("UPDATE documents SET thumbnail_path = %s WHERE id = %s",
+                       (thumbnail_path, document_id))
 
 
 def get_documents_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
     """Get all documents for an enrollment."""
-    with get_cursor() as cursor:
+    with get_read_cursor() as cursor:
         cursor.execute(
-            "SELECT id, doc_type, file_path FROM documents WHERE enrollment_id = %s",
+            f"SELECT {_DOCUMENT_COLUMNS_SQL} FROM documents WHERE enrollment_id = %s ORDER BY id",
             (enrollment_id,)
         )
         return [dict(row) for row in cursor.fetchall()]
@@ -529,7 +1855,7 @@ def add_notification_rule(rule: Dict[str, Any]):
 
 def get_notification_rules() -> List[Dict[str, Any]]:
     """Get all notification rules."""
-    with get_cursor() as cursor:
+    with get_read_cursor() as cursor:
         cursor.execute("SELECT * FROM notification_rules ORDER BY id DESC")
         rules = []
         for row in cursor.fetchall():
@@ -572,18 +1898,27 @@ def delete_notification_rule(rule_id: int):
         cursor.execute("DELETE FROM notification_rules WHERE id = %s", (rule_id,))
 
 
-def log_notification_sent(enrollment_id: int, rule_id: int):
-    """Log that a notification was sent."""
+def log_notification_sent(enrollment_id: int, rule_id: int,
+                          idempotency_key: Optional[str] = None) -> int:
+    """Log that a notification was sent and return the log row ID (idempotent per key)."""
+    return _log_notification_sent(enrollment_id, rule_id, idempotency_key or uuid.uuid4().hex)
+
+
+@with_retry
+def _log_notification_sent(enrollment_id: int, rule_id: int, idempotency_key: str) -> int:
     with get_cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO notifications_sent (enrollment_id, rule_id) VALUES (%s, %s)",
-            (enrollment_id, rule_id)
-        )
+        cursor.execute("""
+            INSERT INTO notifications_sent (enrollment_id, rule_id, idempotency_key)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id
+        """, (enrollment_id, rule_id, idempotency_key))
+        return _inserted_or_existing_id(cursor, "notifications_sent", idempotency_key)
 
 
 def get_sent_notifications(enrollment_id: int) -> List[Dict[str, Any]]:
     """Get sent notifications for an enrollment."""
-    with get_cursor() as cursor:
+    with get_read_cursor() as cursor:
         cursor.execute(
             "SELECT * FROM notifications_sent WHERE enrollment_id = %s",
             (enrollment_id,)
@@ -597,6 +1932,7 @@ def get_sent_notifications(enrollment_id: int) -> List[Dict[str, Any]]:
         return results
 
 
+@with_retry
 def approve_enrollment(enrollment_id: int, approved_by: str = "Admin") -> bool:
     """Mark an enrollment as approved."""
     with get_cursor() as cursor:
@@ -610,7 +1946,7 @@ def approve_enrollment(enrollment_id: int, approved_by: str = "Admin") -> bool:
     return True
 
 
-def load_enrollments() -> List[Dict[str, Any]]:
+def load_enrollments() -> List[Enrollment]:
     """Legacy compatibility: returns all enrollments."""
     return get_all_enrollments()
 
@@ -620,24 +1956,282 @@ def save_enrollments(records):
     pass
 
 
-def get_approval_notification_settings() -> Optional[Dict[str, Any]]:
-    """Get the approval notification settings."""
-    with get_cursor() as cursor:
+# Outbound integrations whose calls are logged in sync_attempts
+SYNC_TARGETS = ("dashboard", "segno", "email")
+SYNC_STATUSES = ("success", "partial", "failed")
+
+
+def _migration_009_sync_attempts(cursor):
+    """Append-only sync_attempts history; moves last_upload_report blobs into it."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_attempts (
+            id BIGSERIAL PRIMARY KEY,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            target TEXT NOT NULL,
+            status TEXT NOT NULL,
+            latency_ms INTEGER,
+            error TEXT,
+            payload_digest TEXT,
+            details JSONB,
+            attempted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_attempts_enrollment
+        ON sync_attempts(enrollment_id, target, attempted_at DESC)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_attempts_target_time
+        ON sync_attempts(target, attempted_at DESC)
+    """)
+    cursor.execute("""
+        INSERT INTO sync_attempts (enrollment_id, target, status, details, attempted_at)
+        SELECT id, 'dashboard',
+               CASE WHEN jsonb_typeof(last_upload_report) = 'object'
+                         AND last_upload_report ? 'failed_uploads' THEN 'partial' ELSE 'success' END,
+               last_upload_report, COALESCE(approved_at, submission_date, NOW())
+        FROM enrollments
+        WHERE last_upload_report IS NOT NULL
+    """)
+    cursor.execute("UPDATE enrollments SET last_upload_report = NULL WHERE last_upload_report IS NOT NULL")
+
+
+def payload_digest(payload: Any) -> Optional[str]:
+    """SHA-256 of a request payload (JSON-encoded with sorted keys), or None."""
+    if payload is None:
+        return None
+    if not isinstance(payload, (bytes, str)):
+        payload = json.dumps(payload, sort_keys=True, default=str)
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+_SYNC_ATTEMPT_INSERT_SQL = """
+    INSERT INTO sync_attempts
+        (enrollment_id, target, status, latency_ms, error, payload_digest, details)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING id
+"""
+
+
+def _sync_attempt_params(enrollment_id: int, target: str, status: str, latency_ms: Optional[float],
+                         error: Optional[str], payload: Any, details: Optional[dict]) -> Tuple[Any, ...]:
+    """Validate a sync attempt and build the _SYNC_ATTEMPT_INSERT_SQL parameters."""
+    if target not in SYNC_TARGETS:
+        raise ValueError(f"Invalid sync target: {target}")
+    if status not in SYNC_STATUSES:
+        raise ValueError(f"Invalid sync status: {status}")
+    return (
+        enrollment_id,
+        target,
+        status,
+        None if latency_ms is None else int(round(latency_ms)),
+        error,
+        payload_digest(payload),
+        None if details is None else json.dumps(details),
+    )
+
+
+@with_retry
+def record_sync_attempt(enrollment_id: int, target: str, status: str,
+                        latency_ms: Optional[float] = None, error: Optional[str] = None,
+                        payload: Any = None, details: Optional[dict] = None) -> int:
+    """Append one outbound sync attempt and return its ID.
+    
+    target is one of SYNC_TARGETS and status one of SYNC_STATUSES. Only a
+    digest of payload is stored; details is a small JSON summary (e.g.
+    photo_count, failed_uploads).
+    """
+    params = _sync_attempt_params(enrollment_id, target, status, latency_ms, error, payload, details)
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute(_SYNC_ATTEMPT_INSERT_SQL, params)
+        return cursor.fetchone()[0]
+
+
+def _shape_sync_attempt(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(row)
+    if row.get("attempted_at"):
+        row["attempted_at"] = str(row["attempted_at"])
+    return row
+
+
+def get_sync_attempts(enrollment_id: int, target: Optional[str] = None,
+                      limit: int = 50) -> List[Dict[str, Any]]:
+    """Sync attempts for an enrollment, newest first, optionally for one target."""
+    params: List[Any] = [enrollment_id]
+    target_sql = ""
+    if target is not None:
+        target_sql = "AND target = %s"
+        params.append(target)
+    params.append(limit)
+    with get_read_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id, enrollment_id, target, status, latency_ms, error,
+                   payload_digest, details, attempted_at
+            FROM sync_attempts
+            WHERE enrollment_id = %s {target_sql}
+            ORDER BY attempted_at DESC, id DESC
+            LIMIT %s
+        """, params)
+        return [_shape_sync_attempt(row) for row in cursor.fetchall()]
+
+
+def get_latest_sync_attempt(enrollment_id: int, target: str) -> Optional[Dict[str, Any]]:
+    """The most recent attempt for an enrollment and target, or None."""
+    attempts = get_sync_attempts(enrollment_id, target, limit=1)
+    return attempts[0] if attempts else None
+
+
+def get_sync_attempt_stats(target: Optional[str] = None,
+                           since: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-target attempt counts, failure rate and latency (avg/p50/p95 ms).
+    
+    since defaults to the last 30 days.
+    """
+    since = since or datetime.now() - timedelta(days=30)
+    params: List[Any] = [since]
+    target_sql = ""
+    if target is not None:
+        target_sql = "AND target = %s"
+        params.append(target)
+    with get_read_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT target,
+                   COUNT(*) AS attempts,
+                   COUNT(*) FILTER (WHERE status = 'failed') AS failed,
+                   COUNT(*) FILTER (WHERE status = 'partial') AS partial,
+                   AVG(latency_ms) AS avg_latency_ms,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms) AS p50_latency_ms,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_latency_ms
+            FROM sync_attempts
+            WHERE attempted_at >= %s {target_sql}
+            GROUP BY target
+        """, params)
+        stats = {}
+        for row in cursor.fetchall():
+            row = dict(row)
+            name = row.pop("target")
+            for key in ("avg_latency_ms", "p50_latency_ms", "p95_latency_ms"):
+                if row[key] is not None:
+                    row[key] = round(float(row[key]), 1)
+            row["failure_rate"] = row["failed"] / row["attempts"] if row["attempts"] else 0.0
+            stats[name] = row
+        return stats
+
+
+# app_settings read-through cache. Each process keeps decoded settings in
+# memory; save_* functions NOTIFY this channel and a background LISTEN thread
+# evicts the changed key, so replicas stay consistent. While the listener is
+# not connected the cache is bypassed.
+SETTINGS_NOTIFY_CHANNEL = "byov_app_settings"
+SETTINGS_CACHE_ENABLED = os.environ.get("DB_SETTINGS_CACHE", "1") != "0"
+
+_settings_cache: Dict[str, Any] = {}
+_settings_cache_lock = threading.Lock()
+_settings_generation = 0
+_settings_listener_ready = threading.Event()
+_settings_listener_thread: Optional[threading.Thread] = None
+
+
+def invalidate_settings_cache(setting_key: Optional[str] = None):
+    """Drop one cached setting (or all of them when setting_key is None)."""
+    global _settings_generation
+    with _settings_cache_lock:
+        _settings_generation += 1
+        if setting_key is None:
+            _settings_cache.clear()
+        else:
+            _settings_cache.pop(setting_key, None)
+
+
+def _settings_listener_loop():
+    """LISTEN for settings changes and evict keys; reconnects with backoff."""
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL, **CONNECT_KWARGS)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {SETTINGS_NOTIFY_CHANNEL}")
+            # Anything cached before LISTEN took effect may have missed a change
+            invalidate_settings_cache()
+            _settings_listener_ready.set()
+            backoff = 1.0
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    # Idle: make sure the connection is still alive
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    invalidate_settings_cache(notify.payload or None)
+        except Exception as e:
+            _settings_listener_ready.clear()
+            invalidate_settings_cache()
+            print(f"Warning: settings listener disconnected: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def _ensure_settings_listener():
+    """Start the settings LISTEN thread once per process."""
+    global _settings_listener_thread
+    if _settings_listener_thread is not None or not DATABASE_URL:
+        return
+    with _settings_cache_lock:
+        if _settings_listener_thread is None:
+            _settings_listener_thread = threading.Thread(
+                target=_settings_listener_loop, name="settings-listener", daemon=True
+            )
+            _settings_listener_thread.start()
+
+
+def _get_app_setting(setting_key: str) -> Any:
+    """Return the decoded setting_value for a key (None if missing), cached."""
+    use_cache = SETTINGS_CACHE_ENABLED
+    if use_cache:
+        _ensure_settings_listener()
+        use_cache = _settings_listener_ready.is_set()
+    if use_cache:
+        with _settings_cache_lock:
+            if setting_key in _settings_cache:
+                return copy.deepcopy(_settings_cache[setting_key])
+            generation = _settings_generation
+    
+    # Cached values must come from the primary: a lagging replica could
+    # otherwise repopulate the cache with a value a NOTIFY just evicted.
+    with get_read_cursor(primary=use_cache) as cursor:
         cursor.execute(
             "SELECT setting_value FROM app_settings WHERE setting_key = %s",
-            ("approval_notification",)
+            (setting_key,)
         )
         row = cursor.fetchone()
-        if row:
-            value = row.get('setting_value') if isinstance(row, dict) else row[0]
-            if isinstance(value, str):
-                return json.loads(value)
-            return value
-        return None
+    value = None
+    if row:
+        value = row.get('setting_value') if isinstance(row, dict) else row[0]
+        if isinstance(value, str):
+            value = json.loads(value)
+    
+    if use_cache:
+        with _settings_cache_lock:
+            # Skip the store if an invalidation raced with our read
+            if generation == _settings_generation:
+                _settings_cache[setting_key] = value
+    return copy.deepcopy(value)
 
 
-def save_approval_notification_settings(settings: Dict[str, Any]) -> bool:
-    """Save the approval notification settings."""
+def _save_app_setting(setting_key: str, value: Any):
+    """Upsert a setting and notify every process to drop its cached copy."""
     with get_cursor() as cursor:
         cursor.execute("""
             INSERT INTO app_settings (setting_key, setting_value, updated_at)
@@ -645,42 +2239,34 @@ def save_approval_notification_settings(settings: Dict[str, Any]) -> bool:
             ON CONFLICT (setting_key) 
             DO UPDATE SET setting_value = EXCLUDED.setting_value, updated_at = EXCLUDED.updated_at
         """, (
-            "approval_notification",
-            json.dumps(settings),
+            setting_key,
+            json.dumps(value),
             datetime.now()
         ))
+        # Delivered to listeners when this transaction commits
+        cursor.execute("SELECT pg_notify(%s, %s)", (SETTINGS_NOTIFY_CHANNEL, setting_key))
+    invalidate_settings_cache(setting_key)
+
+
+def get_approval_notification_settings() -> Optional[Dict[str, Any]]:
+    """Get the approval notification settings."""
+    return _get_app_setting("approval_notification")
+
+
+def save_approval_notification_settings(settings: Dict[str, Any]) -> bool:
+    """Save the approval notification settings."""
+    _save_app_setting("approval_notification", settings)
     return True
 
 
 def get_notification_settings() -> Optional[Dict[str, Any]]:
     """Get the full notification settings (all 4 email types)."""
-    with get_cursor() as cursor:
-        cursor.execute(
-            "SELECT setting_value FROM app_settings WHERE setting_key = %s",
-            ("notification_settings",)
-        )
-        row = cursor.fetchone()
-        if row:
-            value = row.get('setting_value') if isinstance(row, dict) else row[0]
-            if isinstance(value, str):
-                return json.loads(value)
-            return value
-        return None
+    return _get_app_setting("notification_settings")
 
 
 def save_notification_settings(settings: Dict[str, Any]) -> bool:
     """Save the full notification settings (all 4 email types)."""
-    with get_cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO app_settings (setting_key, setting_value, updated_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (setting_key) 
-            DO UPDATE SET setting_value = EXCLUDED.setting_value, updated_at = EXCLUDED.updated_at
-        """, (
-            "notification_settings",
-            json.dumps(settings),
-            datetime.now()
-        ))
+    _save_app_setting("notification_settings", settings)
     return True
 
 
@@ -693,26 +2279,43 @@ CHECKLIST_TASKS = [
     {'key': 'survey_30day', 'name': '30 Day survey completed'},
 ]
 
-
-def init_checklist_table():
-    """Initialize the enrollment_checklist table."""
-    with get_cursor(dict_cursor=False) as cursor:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS enrollment_checklist (
-                id SERIAL PRIMARY KEY,
-                enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
-                task_key TEXT NOT NULL,
-                task_name TEXT NOT NULL,
-                completed BOOLEAN DEFAULT FALSE,
-                completed_at TIMESTAMPTZ,
-                completed_by TEXT,
-                email_recipient TEXT,
-                email_sent BOOLEAN DEFAULT FALSE,
-                email_sent_at TIMESTAMPTZ,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                UNIQUE(enrollment_id, task_key)
-            )
-        """)
+# Steps of the admin workflow checklist, in order. workflow_stage is the index
+# of the first step not yet completed (len(WORKFLOW_STEPS) when all are done).
+WORKFLOW_STEPS = ("approved_synced", "policy_hshr", "segno_synced", "fleet_notified")
+
+CHECKLIST_TASK_NAMES = {task['key']: task['name'] for task in CHECKLIST_TASKS}
+CHECKLIST_TASK_NAMES.update({
+    'segno_synced': 'Mileage Form Created in Segno',
+    'fleet_notified': 'Fleet, Inventory, Supplies Notified',
+})
+
+# Bit of each task in enrollments.checklist_mask; append only, never reorder.
+CHECKLIST_TASK_BITS = {
+    key: 1 << index
+    for index, key in enumerate(
+        WORKFLOW_STEPS + tuple(task['key'] for task in CHECKLIST_TASKS if task['key'] not in WORKFLOW_STEPS)
+    )
+}
+
+
+def _migration_002_checklist(cursor):
+    """The enrollment_checklist table."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_checklist (
+            id SERIAL PRIMARY KEY,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            task_key TEXT NOT NULL,
+            task_name TEXT NOT NULL,
+            completed BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMPTZ,
+            completed_by TEXT,
+            email_recipient TEXT,
+            email_sent BOOLEAN DEFAULT FALSE,
+            email_sent_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            UNIQUE(enrollment_id, task_key)
+        )
+    """)
 
 
 def create_checklist_for_enrollment(enrollment_id: int) -> bool:
@@ -729,7 +2332,7 @@ def create_checklist_for_enrollment(enrollment_id: int) -> bool:
 
 def get_checklist_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
     """Get all checklist tasks for an enrollment."""
-    with get_cursor() as cursor:
+    with get_read_cursor() as cursor:
         cursor.execute("""
             SELECT id, enrollment_id, task_key, task_name, completed, completed_at, 
                    completed_by, email_recipient, email_sent, email_sent_at, created_at
@@ -751,42 +2354,212 @@ def get_checklist_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
         return results
 
 
+# Applies a completion change RETURNed by a "task" CTE to the owning
+# enrollment's checklist_mask in the same statement.
+_CHECKLIST_MASK_UPDATE_SQL = """
+    UPDATE enrollments e
+    SET checklist_mask = CASE WHEN t.completed THEN e.checklist_mask | b.bit
+                              ELSE e.checklist_mask & ~b.bit END
+    FROM task t
+    JOIN unnest(%s::text[], %s::int[]) AS b(task_key, bit) USING (task_key)
+    WHERE e.id = t.enrollment_id
+"""
+
+
+def _checklist_bit_arrays() -> Tuple[List[str], List[int]]:
+    return list(CHECKLIST_TASK_BITS), list(CHECKLIST_TASK_BITS.values())
+
+
+_UPDATE_CHECKLIST_TASK_SQL = """
+    WITH task AS (
+        UPDATE enrollment_checklist
+        SET completed = %s, completed_at = %s, completed_by = %s
+        WHERE id = %s
+        RETURNING enrollment_id, task_key, completed
+    )
+""" + _CHECKLIST_MASK_UPDATE_SQL
+
+# Upserts the task row, so workflow steps without a pre-created row work too
+_MARK_CHECKLIST_TASK_SQL = """
+    WITH task AS (
+        INSERT INTO enrollment_checklist
+            (enrollment_id, task_key, task_name, completed, completed_at, completed_by)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (enrollment_id, task_key) DO UPDATE
+        SET completed = EXCLUDED.completed,
+            completed_at = EXCLUDED.completed_at,
+            completed_by = EXCLUDED.completed_by
+        RETURNING enrollment_id, task_key, completed
+    )
+""" + _CHECKLIST_MASK_UPDATE_SQL
+
+
+def _update_checklist_task_params(task_id: int, completed: bool, completed_by: str) -> Tuple[Any, ...]:
+    return (
+        completed,
+        datetime.now() if completed else None,
+        completed_by if completed else None,
+        task_id,
+        *_checklist_bit_arrays(),
+    )
+
+
+def _mark_checklist_task_params(enrollment_id: int, task_key: str, completed: bool,
+                                completed_by: str) -> Tuple[Any, ...]:
+    return (
+        enrollment_id,
+        task_key,
+        CHECKLIST_TASK_NAMES.get(task_key, task_key),
+        completed,
+        datetime.now() if completed else None,
+        completed_by if completed else None,
+        *_checklist_bit_arrays(),
+    )
+
+
+@with_retry
 def update_checklist_task(task_id: int, completed: bool, completed_by: str = "Admin") -> bool:
-    """Update a checklist task's completion status."""
+    """Update a checklist task's completion status and the enrollment's checklist_mask."""
     with get_cursor() as cursor:
-        if completed:
-            cursor.execute("""
-                UPDATE enrollment_checklist
-                SET completed = %s, completed_at = %s, completed_by = %s
-                WHERE id = %s
-            """, (completed, datetime.now(), completed_by, task_id))
-        else:
-            cursor.execute("""
-                UPDATE enrollment_checklist
-                SET completed = %s, completed_at = NULL, completed_by = NULL
-                WHERE id = %s
-            """, (completed, task_id))
+        cursor.execute(_UPDATE_CHECKLIST_TASK_SQL,
+                       _update_checklist_task_params(task_id, completed, completed_by))
     return True
 
 
+@with_retry
 def mark_checklist_task_by_key(enrollment_id: int, task_key: str, completed: bool = True, completed_by: str = "System") -> bool:
-    """Mark a checklist task as complete by enrollment_id and task_key."""
+    """Mark a checklist task as complete by enrollment_id and task_key.
+    
+    The task row is created if missing, and checklist_mask is updated in
+    the same statement.
+    """
     with get_cursor() as cursor:
-        if completed:
-            cursor.execute("""
-                UPDATE enrollment_checklist
-                SET completed = %s, completed_at = %s, completed_by = %s
-                WHERE enrollment_id = %s AND task_key = %s
-            """, (completed, datetime.now(), completed_by, enrollment_id, task_key))
-        else:
-            cursor.execute("""
-                UPDATE enrollment_checklist
-                SET completed = %s, completed_at = NULL, completed_by = NULL
-                WHERE enrollment_id = %s AND task_key = %s
-            """, (completed, enrollment_id, task_key))
+        cursor.execute(_MARK_CHECKLIST_TASK_SQL,
+                       _mark_checklist_task_params(enrollment_id, task_key, completed, completed_by))
     return True
 
 
+def _workflow_stage_sql(mask: str) -> str:
+    """SQL CASE giving the index of the first incomplete WORKFLOW_STEPS bit of mask."""
+    whens = " ".join(
+        f"WHEN {mask} & {CHECKLIST_TASK_BITS[step]} = 0 THEN {index}"
+        for index, step in enumerate(WORKFLOW_STEPS)
+    )
+    return f"CASE {whens} ELSE {len(WORKFLOW_STEPS)} END"
+
+
+def _migration_007_checklist_mask(cursor):
+    """enrollments.checklist_mask/workflow_stage, backfilled from completed checklist rows."""
+    cursor.execute("ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS checklist_mask INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(f"""
+        ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS workflow_stage SMALLINT
+        GENERATED ALWAYS AS ({_workflow_stage_sql("checklist_mask")}) STORED
+    """)
+    cursor.execute("""
+        UPDATE enrollments e
+        SET checklist_mask = m.mask
+        FROM (
+            SELECT c.enrollment_id, bit_or(b.bit) AS mask
+            FROM enrollment_checklist c
+            JOIN unnest(%s::text[], %s::int[]) AS b(task_key, bit) USING (task_key)
+            WHERE c.completed
+            GROUP BY c.enrollment_id
+        ) m
+        WHERE e.id = m.enrollment_id
+    """, _checklist_bit_arrays())
+    for column in ("checklist_mask", "workflow_stage"):
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_{column}_submission_id
+            ON enrollments({column}, submission_date DESC, id DESC)
+        """)
+
+
+def checklist_mask_bits(completed: Sequence[str] = (), pending: Sequence[str] = ()) -> Tuple[int, int]:
+    """(required, excluded) checklist_mask bits for completed and pending task keys.
+    
+    A row matches when checklist_mask & required = required and
+    checklist_mask & excluded = 0.
+    """
+    unknown = (set(completed) | set(pending)) - set(CHECKLIST_TASK_BITS)
+    if unknown:
+        raise ValueError(f"Unknown checklist task: {', '.join(sorted(unknown))}")
+    required = sum(CHECKLIST_TASK_BITS[key] for key in set(completed))
+    excluded = sum(CHECKLIST_TASK_BITS[key] for key in set(pending))
+    return required, excluded
+
+
+# (completed, pending) task-key queues with a partial index each (see 015):
+# approved and synced, still waiting on a later workflow step
+WORKFLOW_QUEUES = tuple(((WORKFLOW_STEPS[0],), (step,)) for step in WORKFLOW_STEPS[1:])
+
+
+def _checklist_mask_condition(required: int, excluded: int, column: str = "checklist_mask") -> str:
+    """SQL test of checklist_mask bits, with the bits inlined.
+    
+    Literal bits let the planner match a WORKFLOW_QUEUES partial index,
+    whose predicate is built by this same function.
+    """
+    return f"{column} & {int(required)} = {int(required)} AND {column} & {int(excluded)} = 0"
+
+
+def _migration_015_workflow_queue_indexes(cursor):
+    """Partial indexes for WORKFLOW_QUEUES instead of the checklist_mask index.
+    
+    Task-key queues test checklist_mask bitwise, which a B-tree on the column
+    cannot serve, so that index only cost a write on every checklist tick.
+    """
+    cursor.execute("DROP INDEX IF EXISTS idx_enrollments_checklist_mask_submission_id")
+    for completed, pending in WORKFLOW_QUEUES:
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_queue_{pending[0]}
+            ON enrollments(submission_date, id)
+            WHERE {_checklist_mask_condition(*checklist_mask_bits(completed, pending))}
+        """)
+
+
+def _workflow_queue_query(completed: Sequence[str], pending: Sequence[str],
+                          stage: Optional[str], limit: int) -> Tuple[str, Tuple[Any, ...]]:
+    if stage is None:
+        # "Steps before X done, X not done" is exactly workflow stage X
+        for index, step in enumerate(WORKFLOW_STEPS):
+            if set(completed) == set(WORKFLOW_STEPS[:index]) and set(pending) == {step}:
+                stage = step
+                break
+    if stage is not None:
+        if stage not in WORKFLOW_STEPS:
+            raise ValueError(f"Unknown workflow stage: {stage}")
+        condition, params = "e.workflow_stage = %s", (WORKFLOW_STEPS.index(stage),)
+    else:
+        condition = _checklist_mask_condition(*checklist_mask_bits(completed, pending), "e.checklist_mask")
+        params = ()
+    query = f"""
+        SELECT e.* FROM enrollments e
+        WHERE {condition}
+        ORDER BY e.submission_date, e.id
+        LIMIT %s
+    """
+    return query, (*params, limit)
+
+
+@with_retry
+def get_workflow_queue(completed: Sequence[str] = (), pending: Sequence[str] = (),
+                       stage: Optional[str] = None, limit: int = 100) -> List[Enrollment]:
+    """Enrollments waiting on a checklist step, oldest submission first.
+    
+    Either give task keys that must be completed/pending (e.g.
+    completed=("approved_synced",), pending=("segno_synced",)), or stage,
+    a WORKFLOW_STEPS key, for enrollments whose first incomplete step is
+    that one. Indexed: every stage (including task keys that amount to one)
+    and the WORKFLOW_QUEUES, which have partial indexes. Other task-key
+    combinations test checklist_mask bitwise while walking enrollments in
+    submission order.
+    """
+    query, params = _workflow_queue_query(completed, pending, stage, limit)
+    with get_record_cursor(read_only=True) as cursor:
+        cursor.execute(query, params)
+        return _fetch_enrollments(cursor)
+
+
 def update_checklist_task_email(task_id: int, email_recipient: str) -> bool:
     """Update the email recipient for a checklist task."""
     with get_cursor() as cursor:
@@ -811,83 +2584,40 @@ def mark_checklist_email_sent(task_id: int) -> bool:
 
 def get_checklist_task_recipients() -> Dict[str, str]:
     """Get default email recipients for each task type from app_settings."""
-    with get_cursor() as cursor:
-        cursor.execute(
-            "SELECT setting_value FROM app_settings WHERE setting_key = %s",
-            ("checklist_recipients",)
-        )
-        row = cursor.fetchone()
-        if row:
-            value = row.get('setting_value') if isinstance(row, dict) else row[0]
-            if isinstance(value, str):
-                return json.loads(value)
-            return value if isinstance(value, dict) else {}
-        return {}
+    value = _get_app_setting("checklist_recipients")
+    return value if isinstance(value, dict) else {}
 
 
 def save_checklist_task_recipients(recipients: Dict[str, str]) -> bool:
     """Save default email recipients for checklist tasks."""
-    with get_cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO app_settings (setting_key, setting_value, updated_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (setting_key) 
-            DO UPDATE SET setting_value = EXCLUDED.setting_value, updated_at = EXCLUDED.updated_at
-        """, (
-            "checklist_recipients",
-            json.dumps(recipients),
-            datetime.now()
-        ))
+    _save_app_setting("checklist_recipients", recipients)
     return True
 
 
 def get_admin_settings(setting_key: str) -> Optional[Dict[str, Any]]:
     """Get admin settings by key from app_settings table."""
-    with get_cursor() as cursor:
-        cursor.execute(
-            "SELECT setting_value FROM app_settings WHERE setting_key = %s",
-            (setting_key,)
-        )
-        row = cursor.fetchone()
-        if row:
-            value = row.get('setting_value') if isinstance(row, dict) else row[0]
-            if isinstance(value, str):
-                return json.loads(value)
-            return value
-    return None
+    return _get_app_setting(setting_key)
 
 
 def save_admin_settings(setting_key: str, settings: Dict[str, Any]) -> bool:
     """Save admin settings by key to app_settings table."""
-    with get_cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO app_settings (setting_key, setting_value, updated_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (setting_key) 
-            DO UPDATE SET setting_value = EXCLUDED.setting_value, updated_at = EXCLUDED.updated_at
-        """, (
-            setting_key,
-            json.dumps(settings),
-            datetime.now()
-        ))
+    _save_app_setting(setting_key, settings)
     return True
 
 
-def init_docusign_tokens_table():
-    """Initialize the docusign_tokens table for California signature confirmations."""
-    with get_cursor(dict_cursor=False) as cursor:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS docusign_tokens (
-                id SERIAL PRIMARY KEY,
-                enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
-                token VARCHAR(64) NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                confirmed_at TIMESTAMP,
-                confirmed BOOLEAN DEFAULT FALSE
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_docusign_token ON docusign_tokens(token)")
-    return True
+def _migration_003_docusign_tokens(cursor):
+    """The docusign_tokens table for California signature confirmations."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS docusign_tokens (
+            id SERIAL PRIMARY KEY,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            token VARCHAR(64) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            confirmed_at TIMESTAMP,
+            confirmed BOOLEAN DEFAULT FALSE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_docusign_token ON docusign_tokens(token)")
 
 
 def create_docusign_token(enrollment_id: int) -> str:
@@ -946,7 +2676,7 @@ def confirm_docusign_token(token: str) -> Dict[str, Any]:
 
 def get_docusign_status(enrollment_id: int) -> Dict[str, Any]:
     """Get the DocuSign confirmation status for an enrollment."""
-    with get_cursor() as cursor:
+    with get_read_cursor() as cursor:
         cursor.execute("""
             SELECT token, confirmed, confirmed_at, created_at
             FROM docusign_tokens
@@ -964,12 +2694,462 @@ def get_docusign_status(enrollment_id: int) -> Dict[str, Any]:
         return {'has_token': False, 'confirmed': False}
 
 
+# Aggregate counters kept in enrollment_stats by triggers: (dimension, bucket)
+# -> total, summed over slots. "approved" buckets are the approved value as
+# text and add up to the enrollment total (migration 006 also kept an "all"
+# row; see 014); "checklist" buckets are task keys counting completed tasks.
+ENROLLMENT_STATS_DIMENSIONS = ("approved", "state", "district", "checklist")
+
+# Each bucket is split over this many rows, picked by backend pid, so
+# concurrent writers to the same bucket rarely wait on one row lock (see 014)
+ENROLLMENT_STATS_SLOTS = 16
+
+_ENROLLMENT_STATS_BACKFILL_SQL = """
+    INSERT INTO enrollment_stats (dimension, bucket, total)
+    SELECT 'all', '', COUNT(*) FROM enrollments
+    UNION ALL
+    SELECT 'approved', COALESCE(approved::text, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'state', COALESCE(state, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'district', COALESCE(district, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'checklist', task_key, COUNT(*) FROM enrollment_checklist WHERE completed GROUP BY 2
+"""
+
+
+def _migration_006_enrollment_stats(cursor):
+    """The enrollment_stats counter table, its maintenance triggers and a backfill."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_stats (
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            total BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket)
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_enrollment_stat(p_dimension TEXT, p_bucket TEXT, p_delta BIGINT)
+        RETURNS VOID LANGUAGE SQL AS $$
+            INSERT INTO enrollment_stats (dimension, bucket, total)
+            VALUES (p_dimension, COALESCE(p_bucket, ''), p_delta)
+            ON CONFLICT (dimension, bucket)
+            DO UPDATE SET total = enrollment_stats.total + EXCLUDED.total
+        $$
+    """)
+    
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION enrollment_stats_on_enrollment() RETURNS TRIGGER
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM bump_enrollment_stat('all', '', -1);
+                END IF;
+                IF TG_OP = 'DELETE' OR OLD.approved IS DISTINCT FROM NEW.approved THEN
+                    PERFORM bump_enrollment_stat('approved', OLD.approved::text, -1);
+                END IF;
+                IF TG_OP = 'DELETE' OR OLD.state IS DISTINCT FROM NEW.state THEN
+                    PERFORM bump_enrollment_stat('state', OLD.state, -1);
+                END IF;
+                IF TG_OP = 'DELETE' OR OLD.district IS DISTINCT FROM NEW.district THEN
+                    PERFORM bump_enrollment_stat('district', OLD.district, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM bump_enrollment_stat('all', '', 1);
+                END IF;
+                IF TG_OP = 'INSERT' OR OLD.approved IS DISTINCT FROM NEW.approved THEN
+                    PERFORM bump_enrollment_stat('approved', NEW.approved::text, 1);
+                END IF;
+                IF TG_OP = 'INSERT' OR OLD.state IS DISTINCT FROM NEW.state THEN
+                    PERFORM bump_enrollment_stat('state', NEW.state, 1);
+                END IF;
+                IF TG_OP = 'INSERT' OR OLD.district IS DISTINCT FROM NEW.district THEN
+                    PERFORM bump_enrollment_stat('district', NEW.district, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION enrollment_stats_on_checklist() RETURNS TRIGGER
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.completed THEN
+                PERFORM bump_enrollment_stat('checklist', OLD.task_key, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.completed THEN
+                PERFORM bump_enrollment_stat('checklist', NEW.task_key, 1);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    
+    # Creating the triggers locks out concurrent writers until this migration
+    # commits, so the backfill below cannot miss or double count a row.
+    cursor.execute("DROP TRIGGER IF EXISTS trg_enrollment_stats ON enrollments")
+    cursor.execute("""
+        CREATE TRIGGER trg_enrollment_stats
+        AFTER INSERT OR DELETE OR UPDATE OF approved, state, district ON enrollments
+        FOR EACH ROW EXECUTE PROCEDURE enrollment_stats_on_enrollment()
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS trg_enrollment_checklist_stats ON enrollment_checklist")
+    cursor.execute("""
+        CREATE TRIGGER trg_enrollment_checklist_stats
+        AFTER INSERT OR DELETE OR UPDATE OF completed, task_key ON enrollment_checklist
+        FOR EACH ROW EXECUTE PROCEDURE enrollment_stats_on_checklist()
+    """)
+    
+    cursor.execute("DELETE FROM enrollment_stats")
+    cursor.execute(_ENROLLMENT_STATS_BACKFILL_SQL)
+
+
+def _migration_014_enrollment_stats_slots(cursor):
+    """Spread enrollment_stats buckets over slots and drop the 'all' row.
+    
+    Every insert and delete used to update the single ('all', '') row and
+    the shared approved/state/district bucket rows, so concurrent
+    submissions waited on those row locks until commit. The total is now the
+    sum of the approved buckets, and a bump goes to the slot of the writing
+    backend (pid % ENROLLMENT_STATS_SLOTS); reads sum the slots. Two sessions
+    whose pids share a slot still queue on that bucket's row.
+    """
+    cursor.execute("ALTER TABLE enrollment_stats ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE enrollment_stats DROP CONSTRAINT IF EXISTS enrollment_stats_pkey")
+    cursor.execute("ALTER TABLE enrollment_stats ADD PRIMARY KEY (dimension, bucket, slot)")
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION bump_enrollment_stat(p_dimension TEXT, p_bucket TEXT, p_delta BIGINT)
+        RETURNS VOID LANGUAGE SQL AS $$
+            INSERT INTO enrollment_stats (dimension, bucket, slot, total)
+            VALUES (p_dimension, COALESCE(p_bucket, ''), pg_backend_pid() % {ENROLLMENT_STATS_SLOTS}, p_delta)
+            ON CONFLICT (dimension, bucket, slot)
+            DO UPDATE SET total = enrollment_stats.total + EXCLUDED.total
+        $$
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION enrollment_stats_on_enrollment() RETURNS TRIGGER
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                IF TG_OP = 'DELETE' OR OLD.approved IS DISTINCT FROM NEW.approved THEN
+                    PERFORM bump_enrollment_stat('approved', OLD.approved::text, -1);
+                END IF;
+                IF TG_OP = 'DELETE' OR OLD.state IS DISTINCT FROM NEW.state THEN
+                    PERFORM bump_enrollment_stat('state', OLD.state, -1);
+                END IF;
+                IF TG_OP = 'DELETE' OR OLD.district IS DISTINCT FROM NEW.district THEN
+                    PERFORM bump_enrollment_stat('district', OLD.district, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF TG_OP = 'INSERT' OR OLD.approved IS DISTINCT FROM NEW.approved THEN
+                    PERFORM bump_enrollment_stat('approved', NEW.approved::text, 1);
+                END IF;
+                IF TG_OP = 'INSERT' OR OLD.state IS DISTINCT FROM NEW.state THEN
+                    PERFORM bump_enrollment_stat('state', NEW.state, 1);
+                END IF;
+                IF TG_OP = 'INSERT' OR OLD.district IS DISTINCT FROM NEW.district THEN
+                    PERFORM bump_enrollment_stat('district', NEW.district, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute("DELETE FROM enrollment_stats WHERE dimension = 'all'")
+
+
+# Recount for refresh_enrollment_stats; the total is derived (see 014)
+_ENROLLMENT_STATS_RECOUNT_SQL = """
+    INSERT INTO enrollment_stats (dimension, bucket, total)
+    SELECT 'approved', COALESCE(approved::text, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'state', COALESCE(state, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'district', COALESCE(district, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'checklist', task_key, COUNT(*) FROM enrollment_checklist WHERE completed GROUP BY 2
+"""
+
+
+def refresh_enrollment_stats():
+    """Recount enrollment_stats from the base tables (repairs manual edits)."""
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("LOCK TABLE enrollments, enrollment_checklist IN SHARE MODE")
+        cursor.execute("DELETE FROM enrollment_stats")
+        cursor.execute(_ENROLLMENT_STATS_RECOUNT_SQL)
+
+
+_ENROLLMENT_STATS_SQL = """
+    SELECT dimension, bucket, SUM(total) FROM enrollment_stats GROUP BY dimension, bucket
+"""
+
+
+def _shape_enrollment_stats(rows) -> Dict[str, Any]:
+    """Turn (dimension, bucket, total) rows into the get_enrollment_stats dict."""
+    buckets: Dict[str, Dict[str, int]] = {dimension: {} for dimension in ENROLLMENT_STATS_DIMENSIONS}
+    for dimension, bucket, total in rows:
+        if dimension in buckets and total:
+            buckets[dimension][bucket] = int(total)
+    return {
+        "total": sum(buckets["approved"].values()),
+        "approved": buckets["approved"].get("1", 0),
+        "pending": buckets["approved"].get("0", 0),
+        "by_state": buckets["state"],
+        "by_district": buckets["district"],
+        "checklist_completed": {
+            key: buckets["checklist"].get(key, 0) for key in CHECKLIST_TASK_BITS
+        },
+    }
+
+
+@with_retry
+def get_enrollment_stats(primary: bool = False) -> Dict[str, Any]:
+    """Return enrollment totals from the trigger-maintained enrollment_stats table.
+    
+    Keys: total, approved, pending, by_state and by_district ({value: count},
+    "" for unset), and checklist_completed ({task_key: completed count}).
+    The cost is one read of a small table regardless of enrollment volume.
+    """
+    with get_read_cursor(dict_cursor=False, primary=primary) as cursor:
+        cursor.execute(_ENROLLMENT_STATS_SQL)
+        return _shape_enrollment_stats(cursor.fetchall())
+
+
+# Change versions for caches. Triggers stamp the changed enrollment's own
+# 'enrollment:<id>' row with the writing transaction's id on every write to an
+# enrollment, its documents or its checklist (012 also bumped a shared
+# 'enrollments' row; see 013). get_enrollment_changes reports the oldest
+# transaction still running as the current version, so a cache that remembers
+# the last version it saw can ask which ids changed since.
+DATA_VERSION_SCOPE = "enrollments"
+
+
+def _migration_012_data_versions(cursor):
+    """data_versions table kept current by triggers on enrollment data."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_data_versions_version ON data_versions(version)")
+    cursor.execute("""
+        INSERT INTO data_versions (scope, version) VALUES ('enrollments', 0)
+        ON CONFLICT (scope) DO NOTHING
+    """)
+    
+    # TG_ARGV[0] names the column holding the enrollment id
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_data_version() RETURNS TRIGGER
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changed JSONB;
+            new_version BIGINT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := to_jsonb(OLD);
+            ELSE
+                changed := to_jsonb(NEW);
+            END IF;
+            UPDATE data_versions SET version = version + 1
+            WHERE scope = 'enrollments'
+            RETURNING version INTO new_version;
+            INSERT INTO data_versions (scope, version)
+            VALUES ('enrollment:' || (changed ->> TG_ARGV[0]), new_version)
+            ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table, column in (("enrollments", "id"), ("documents", "enrollment_id"),
+                          ("enrollment_checklist", "enrollment_id")):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_data_version ON {table}")
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{table}_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE bump_data_version('{column}')
+        """)
+
+
+def _shape_enrollment_changes(rows: List[Tuple[str, int]]) -> Tuple[int, List[int]]:
+    version, changed = 0, []
+    for scope, scope_version in rows:
+        if scope == DATA_VERSION_SCOPE:
+            version = scope_version
+        else:
+            changed.append(int(scope.split(":", 1)[1]))
+    return version, changed
+
+
+def _migration_013_data_version_xids(cursor):
+    """Stamp data_versions with transaction ids instead of a shared counter.
+    
+    Every write used to update the single 'enrollments' row, so all writers
+    queued on its row lock until commit. txid_current() needs no lock, and the
+    snapshot's oldest running transaction (see _ENROLLMENT_CHANGES_SQL) is a
+    version no later commit can fall behind, which a sequence would not give.
+    """
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_data_version() RETURNS TRIGGER
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changed JSONB;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := to_jsonb(OLD);
+            ELSE
+                changed := to_jsonb(NEW);
+            END IF;
+            INSERT INTO data_versions (scope, version)
+            VALUES ('enrollment:' || (changed ->> TG_ARGV[0]), txid_current())
+            ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version
+            WHERE data_versions.version <> EXCLUDED.version;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute("DELETE FROM data_versions WHERE scope = 'enrollments'")
+
+
+# Every transaction below the snapshot's xmin has finished, so stamps under it
+# are final. Stamps at or above it can still be joined by commits of open
+# transactions; they are returned again until xmin passes them.
+_ENROLLMENT_CHANGES_SQL = """
+    SELECT 'enrollments', txid_snapshot_xmin(txid_current_snapshot())
+    UNION ALL
+    SELECT scope, version FROM data_versions
+    WHERE %s::bigint IS NOT NULL AND version >= %s::bigint
+"""
+
+
+@with_retry
+def get_enrollment_changes(since_version: Optional[int] = None) -> Tuple[int, List[int]]:
+    """Return (current data version, ids of enrollments changed after since_version).
+    
+    With since_version None only the current version is read. Cheap enough to
+    poll: it reads the version rows written since the caller last looked. Ids
+    written by transactions still open at since_version can be reported again.
+    Always read on the primary: a lagging replica would report a version
+    whose changes a cache then misses.
+    """
+    with get_read_cursor(dict_cursor=False, primary=True) as cursor:
+        cursor.execute(_ENROLLMENT_CHANGES_SQL, (since_version, since_version))
+        return _shape_enrollment_changes(cursor.fetchall())
+
+
+# Ordered schema migrations: (version, name, function taking a cursor).
+# Append new steps at the end; never renumber or edit an applied step.
+MIGRATIONS = [
+    (1, "base_schema", _migration_001_base_schema),
+    (2, "checklist", _migration_002_checklist),
+    (3, "docusign_tokens", _migration_003_docusign_tokens),
+    (4, "listing_indexes", _migration_004_listing_indexes),
+    (5, "expiration_dates", _migration_005_expiration_dates),
+    (6, "enrollment_stats", _migration_006_enrollment_stats),
+    (7, "checklist_mask", _migration_007_checklist_mask),
+    (8, "idempotency_keys", _migration_008_idempotency_keys),
+    (9, "sync_attempts", _migration_009_sync_attempts),
+    (10, "document_thumbnails", _migration_010_document_thumbnails),
+    (11, "document_metadata", _migration_011_document_metadata),
+    (12, "data_versions", _migration_012_data_versions),
+    (13, "data_version_xids", _migration_013_data_version_xids),
+    (14, "enrollment_stats_slots", _migration_014_enrollment_stats_slots),
+    (15, "workflow_queue_indexes", _migration_015_workflow_queue_indexes),
+]
+
+SCHEMA_HEAD = MIGRATIONS[-1][0]
+
+# Advisory lock key held while migrating so only one process applies DDL
+MIGRATION_LOCK_KEY = 0x6279_6F76
+
+
+def get_schema_version() -> int:
+    """Return the highest applied migration version (0 for a fresh database)."""
+    try:
+        with get_read_cursor(dict_cursor=False, primary=True) as cursor:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+            row = cursor.fetchone()
+            return int(row[0]) if row else 0
+    except psycopg2.errors.UndefinedTable:
+        return 0
+
+
+def run_migrations() -> int:
+    """Apply pending schema migrations and return the resulting version.
+    
+    When the database is already at SCHEMA_HEAD this costs a single query.
+    Otherwise the migrations run under a session advisory lock, each step in
+    its own transaction, so concurrent boots wait instead of racing on DDL.
+    """
+    if get_schema_version() >= SCHEMA_HEAD:
+        return SCHEMA_HEAD
+    
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMPTZ DEFAULT NOW()
+                    )
+                """)
+                cursor.execute("SELECT version FROM schema_migrations")
+                applied = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+            
+            for version, name, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                with conn.cursor() as cursor:
+                    migrate(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, name)
+                    )
+                conn.commit()
+                print(f"Applied schema migration {version:03d}_{name}")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if not conn.closed:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+                conn.commit()
+    return SCHEMA_HEAD
+
+
+def init_db():
+    """Bring the database schema up to date (see run_migrations)."""
+    run_migrations()
+
+
+def init_checklist_table():
+    """Legacy entry point; the checklist table is created by run_migrations."""
+    run_migrations()
+
+
+def init_docusign_tokens_table():
+    """Legacy entry point; the docusign_tokens table is created by run_migrations."""
+    run_migrations()
+    return True
+
+
 USE_SQLITE = False
 DB_PATH = None
 
 try:
-    init_db()
-    init_checklist_table()
-    init_docusign_tokens_table()
+    run_migrations()
 except Exception as e:
     print(f"Warning: Could not initialize PostgreSQL database: {e}")
@@ -0,0 +1,1987 @@
+"""
+SQLite database module for BYOV Enrollment Engine.
+Implements the database_pg public API on an embedded database so tests,
+benchmarks and load generators can run without a Postgres server.
+Select it with BYOV_DB_BACKEND=sqlite (see database.py).
+"""
+import os
+import json
+import time
+import hashlib
+import secrets
+import sqlite3
+import threading
+import uuid
+from collections.abc import Mapping
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Sequence
+from contextlib import contextmanager
+from functools import wraps
+
+DATABASE_PATH = os.environ.get(
+    "BYOV_SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "byov.db"),
+)
+
+MAX_RETRIES = 3
+RETRY_DELAY = 0.5
+
+# Seconds a writer waits for the database lock before raising
+BUSY_TIMEOUT = float(os.environ.get("BYOV_SQLITE_BUSY_TIMEOUT", "10"))
+
+# The SQLite backend does not collect per-query stats
+QUERY_STATS_ENABLED = False
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a connection in autocommit mode with WAL journaling."""
+    directory = os.path.dirname(DATABASE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(DATABASE_PATH, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def _dict_factory(cursor, row) -> Dict[str, Any]:
+    return {col[0]: row[i] for i, col in enumerate(cursor.description)}
+
+
+@contextmanager
+def get_connection():
+    """Context manager for the calling thread's connection.
+
+    Each thread reuses one connection. The outermost block opens a
+    transaction and commits it on success; nested blocks join it.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+        _local.depth = 0
+
+    outermost = _local.depth == 0
+    if outermost:
+        conn.execute("BEGIN")
+    _local.depth += 1
+    try:
+        yield conn
+        if outermost:
+            conn.execute("COMMIT")
+    except Exception:
+        if outermost and conn.in_transaction:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+        raise
+    finally:
+        _local.depth -= 1
+
+
+@contextmanager
+def get_cursor(dict_cursor: bool = True, raw_types: bool = False):
+    """Context manager for database cursors.
+
+    raw_types is accepted for API compatibility; SQLite returns text anyway.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if dict_cursor:
+            cursor.row_factory = _dict_factory
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+@contextmanager
+def get_read_cursor(dict_cursor: bool = True, raw_types: bool = False,
+                    primary: bool = False):
+    """Same as get_cursor; the embedded database has no read replica."""
+    with get_cursor(dict_cursor, raw_types) as cursor:
+        yield cursor
+
+
+def set_session_resolver(resolver):
+    """No-op for API compatibility; there is no replica to route around."""
+    pass
+
+
+def with_retry(func):
+    """Decorator to retry database operations while the database is locked."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(MAX_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == MAX_RETRIES - 1:
+                    raise
+                time.sleep(RETRY_DELAY * (attempt + 1))
+    return wrapper
+
+
+class EnrollmentLocked(Exception):
+    """Raised when another caller already holds an enrollment_lock."""
+    pass
+
+
+ENROLLMENT_LOCK_CLASSES = {
+    "dashboard": 0x6279_0001,
+    "segno": 0x6279_0002,
+}
+
+_enrollment_locks_guard = threading.Lock()
+_held_enrollment_locks = set()
+
+
+@contextmanager
+def enrollment_lock(enrollment_id: int, purpose: str):
+    """Process-local stand-in for database_pg.enrollment_lock.
+
+    The embedded database serves a single process, so an in-memory set of
+    held (purpose, enrollment) keys gives the same try-lock semantics.
+    """
+    if purpose == "delete":
+        classes = sorted(ENROLLMENT_LOCK_CLASSES.values())
+    elif purpose in ENROLLMENT_LOCK_CLASSES:
+        classes = [ENROLLMENT_LOCK_CLASSES[purpose]]
+    else:
+        raise ValueError(f"Unknown enrollment lock purpose: {purpose}")
+    keys = {(lock_class, enrollment_id) for lock_class in classes}
+    with _enrollment_locks_guard:
+        if keys & _held_enrollment_locks:
+            raise EnrollmentLocked(
+                f"Enrollment {enrollment_id} is busy; cannot start {purpose} now")
+        _held_enrollment_locks.update(keys)
+    try:
+        yield
+    finally:
+        with _enrollment_locks_guard:
+            _held_enrollment_locks.difference_update(keys)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """SQLite has no connection pool; returns an empty snapshot."""
+    return {}
+
+
+def get_query_stats() -> Dict[str, Any]:
+    """Query stats are not collected by the SQLite backend."""
+    return {"enabled": False, "functions": {}, "statements": {}, "pool": {}}
+
+
+def reset_query_stats():
+    """No-op for API compatibility."""
+    pass
+
+
+def _column_names(cursor, table: str) -> set:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _add_column(cursor, table: str, column: str, definition: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if column not in _column_names(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _migration_001_base_schema(cursor):
+    """Core tables: enrollments, documents, notification rules and settings."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL,
+            tech_id TEXT NOT NULL,
+            district TEXT,
+            state TEXT,
+            referred_by TEXT,
+            industries TEXT DEFAULT '[]',
+            industry TEXT DEFAULT '[]',
+            year TEXT,
+            make TEXT,
+            model TEXT,
+            vin TEXT,
+            insurance_exp TEXT,
+            registration_exp TEXT,
+            template_used TEXT,
+            comment TEXT,
+            submission_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            approved INTEGER DEFAULT 0,
+            approved_at TEXT,
+            approved_by TEXT,
+            dashboard_tech_id TEXT,
+            last_upload_report TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            doc_type TEXT NOT NULL,
+            file_path TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_name TEXT NOT NULL,
+            trigger TEXT NOT NULL,
+            days_before INTEGER,
+            recipients TEXT NOT NULL,
+            enabled INTEGER DEFAULT 1
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notifications_sent (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            rule_id INTEGER NOT NULL REFERENCES notification_rules(id) ON DELETE CASCADE,
+            sent_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            setting_key TEXT UNIQUE NOT NULL,
+            setting_value TEXT NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_tech_id ON enrollments(tech_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_enrollment_id ON documents(enrollment_id)")
+
+    # Older data/byov.db files predate these columns
+    _add_column(cursor, "enrollments", "industry", "TEXT DEFAULT '[]'")
+    _add_column(cursor, "enrollments", "dashboard_tech_id", "TEXT")
+    _add_column(cursor, "enrollments", "last_upload_report", "TEXT")
+    _add_column(cursor, "enrollments", "is_new_hire", "INTEGER DEFAULT 0")
+    _add_column(cursor, "enrollments", "truck_number", "TEXT")
+    _add_column(cursor, "enrollments", "first_name", "TEXT")
+    _add_column(cursor, "enrollments", "last_name", "TEXT")
+    _add_column(cursor, "enrollments", "segno_sync_status", "TEXT DEFAULT 'pending'")
+    _add_column(cursor, "enrollments", "segno_record_id", "TEXT")
+
+
+def _migration_002_checklist(cursor):
+    """The enrollment_checklist table."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_checklist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            task_key TEXT NOT NULL,
+            task_name TEXT NOT NULL,
+            completed INTEGER DEFAULT 0,
+            completed_at TEXT,
+            completed_by TEXT,
+            email_recipient TEXT,
+            email_sent INTEGER DEFAULT 0,
+            email_sent_at TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(enrollment_id, task_key)
+        )
+    """)
+
+
+def _migration_003_docusign_tokens(cursor):
+    """The docusign_tokens table, one token per enrollment."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS docusign_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enrollment_id INTEGER NOT NULL UNIQUE REFERENCES enrollments(id) ON DELETE CASCADE,
+            token TEXT NOT NULL UNIQUE,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            confirmed_at TEXT,
+            confirmed INTEGER DEFAULT 0
+        )
+    """)
+
+
+def _migration_004_listing_indexes(cursor):
+    """Composite (filter column, submission_date, id) indexes for keyset-paginated listings."""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_enrollments_submission_id
+        ON enrollments(submission_date DESC, id DESC)
+    """)
+    for column in ("approved", "state", "district", "segno_sync_status"):
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_{column}_submission_id
+            ON enrollments({column}, submission_date DESC, id DESC)
+        """)
+
+
+# YYYY-MM-DD shadows of the free-text expiration columns
+EXPIRATION_DATE_COLUMNS = {
+    "insurance_exp": "insurance_exp_date",
+    "registration_exp": "registration_exp_date",
+}
+
+_EXP_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%Y/%m/%d")
+
+
+def parse_expiration_date(value: Any) -> Optional[date]:
+    """Parse an expiration value (ISO date/datetime or US style) to a date."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        pass
+    for fmt in _EXP_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _iso_date(value: Any) -> Optional[str]:
+    parsed = parse_expiration_date(value)
+    return parsed.isoformat() if parsed else None
+
+
+def _migration_005_expiration_dates(cursor):
+    """Expiration date columns backfilled from the text values."""
+    for column in EXPIRATION_DATE_COLUMNS.values():
+        _add_column(cursor, "enrollments", column, "TEXT")
+
+    cursor.execute("""
+        SELECT id, insurance_exp, registration_exp FROM enrollments
+        WHERE insurance_exp IS NOT NULL OR registration_exp IS NOT NULL
+    """)
+    rows = [(_iso_date(row[1]), _iso_date(row[2]), row[0]) for row in cursor.fetchall()]
+    cursor.executemany("""
+        UPDATE enrollments SET insurance_exp_date = ?, registration_exp_date = ?
+        WHERE id = ?
+    """, rows)
+
+    for column in EXPIRATION_DATE_COLUMNS.values():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_enrollments_{column} ON enrollments({column}, id)")
+
+
+# Tables whose inserts take a client-generated idempotency key
+IDEMPOTENT_TABLES = ("enrollments", "documents", "notifications_sent")
+
+
+def _migration_008_idempotency_keys(cursor):
+    """Unique idempotency_key columns on enrollments, documents and notifications_sent."""
+    for table in IDEMPOTENT_TABLES:
+        _add_column(cursor, table, "idempotency_key", "TEXT")
+        cursor.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_idempotency_key
+            ON {table}(idempotency_key)
+        """)
+
+
+_ENROLLMENT_INSERT_COLUMNS = (
+    "full_name", "tech_id", "district", "state", "referred_by",
+    "industries", "industry", "year", "make", "model", "vin",
+    "insurance_exp", "registration_exp", "template_used", "comment",
+    "submission_date", "approved", "approved_at", "approved_by",
+    "is_new_hire", "truck_number", "first_name", "last_name",
+    "insurance_exp_date", "registration_exp_date", "idempotency_key",
+)
+
+# Returns no row when an enrollment with the same idempotency_key exists
+_ENROLLMENT_INSERT_SQL = """
+    INSERT INTO enrollments ({}) VALUES ({})
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id
+""".format(
+    ", ".join(_ENROLLMENT_INSERT_COLUMNS),
+    ", ".join(["?"] * len(_ENROLLMENT_INSERT_COLUMNS)),
+)
+
+
+def _to_db_value(value: Any) -> Any:
+    """Store datetimes as ISO text, the way the Postgres backend accepts them."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _enrollment_insert_values(record: Dict[str, Any],
+                              idempotency_key: Optional[str] = None) -> Tuple[Any, ...]:
+    """Build the parameter tuple matching _ENROLLMENT_INSERT_COLUMNS."""
+    industries_list = record.get("industry", record.get("industries", []))
+    if isinstance(industries_list, str):
+        try:
+            industries_list = json.loads(industries_list)
+        except Exception:
+            industries_list = [x.strip() for x in industries_list.split(",") if x.strip()]
+
+    industries_json = json.dumps(industries_list)
+
+    return (
+        record.get("full_name"),
+        record.get("tech_id"),
+        record.get("district"),
+        record.get("state"),
+        record.get("referred_by"),
+        industries_json,
+        industries_json,
+        record.get("year"),
+        record.get("make"),
+        record.get("model"),
+        record.get("vin"),
+        record.get("insurance_exp"),
+        record.get("registration_exp"),
+        record.get("template_used"),
+        record.get("comment"),
+        _to_db_value(record.get("submission_date", datetime.now().isoformat())),
+        0,
+        None,
+        None,
+        1 if record.get("is_new_hire", False) else 0,
+        record.get("truck_number"),
+        record.get("first_name"),
+        record.get("last_name"),
+        _iso_date(record.get("insurance_exp")),
+        _iso_date(record.get("registration_exp")),
+        idempotency_key
+    )
+
+
+def _existing_id(cursor, table: str, idempotency_key: str) -> int:
+    """ID of the row an earlier idempotent insert wrote with this key."""
+    cursor.execute(f"SELECT id FROM {table} WHERE idempotency_key = ?", (idempotency_key,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Failed to insert into {table}")
+    return row[0]
+
+
+@with_retry
+def insert_enrollment(record: Dict[str, Any], idempotency_key: Optional[str] = None) -> int:
+    """Insert a new enrollment and return its ID (idempotent per key, see database_pg)."""
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute(_ENROLLMENT_INSERT_SQL, _enrollment_insert_values(record, idempotency_key))
+        row = cursor.fetchone()
+        return row[0] if row else _existing_id(cursor, "enrollments", idempotency_key)
+
+
+@with_retry
+def submit_enrollment_bundle(record: Dict[str, Any],
+                             documents: List[Any],
+                             checklist: bool = True,
+                             idempotency_key: Optional[str] = None) -> int:
+    """Insert an enrollment with its documents and checklist in one transaction.
+
+    documents is a list of (doc_type, file_path[, thumbnail_path]) tuples or of
+    dicts that may also carry the DOCUMENT_METADATA_COLUMNS. Returns the new
+    enrollment ID, or the existing one when a bundle with the same
+    idempotency_key was already submitted.
+    """
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute(_ENROLLMENT_INSERT_SQL, _enrollment_insert_values(record, idempotency_key))
+        row = cursor.fetchone()
+        if row is None:
+            return _existing_id(cursor, "enrollments", idempotency_key)
+        enrollment_id = row[0]
+        cursor.executemany(_INSERT_DOCUMENT_SQL, [
+            _insert_document_params(enrollment_id, _document_fields(document), None)
+            for document in documents
+        ])
+        if checklist:
+            cursor.executemany("""
+                INSERT OR IGNORE INTO enrollment_checklist (enrollment_id, task_key, task_name)
+                VALUES (?, ?, ?)
+            """, [(enrollment_id, task['key'], task['name']) for task in CHECKLIST_TASKS])
+        return enrollment_id
+
+
+class Enrollment(Mapping):
+    """Read-only enrollment row decoded into plain values; mirrors database_pg.Enrollment."""
+    __slots__ = ("_values",)
+
+    def __init__(self, values: Dict[str, Any]):
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"Enrollment(id={self.get('id')!r}, tech_id={self.get('tech_id')!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return every column in a plain dict."""
+        return dict(self._values)
+
+
+_JSON_COLUMNS = ("industries", "industry", "last_upload_report", "documents", "checklist")
+_BOOL_COLUMNS = ("is_new_hire",)
+_CHECKLIST_BOOL_KEYS = ("completed", "email_sent")
+
+
+def _decode_json(raw: Any) -> Any:
+    if raw is None or not isinstance(raw, str):
+        return raw
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+def _to_enrollment(row: Dict[str, Any]) -> Enrollment:
+    for column in _JSON_COLUMNS:
+        if column in row:
+            row[column] = _decode_json(row[column])
+    if "industries" in row:
+        row["industries"] = row["industries"] or []
+    if "industry" in row:
+        row["industry"] = row["industry"] or row.get("industries") or []
+    for column in _BOOL_COLUMNS:
+        if row.get(column) is not None:
+            row[column] = bool(row[column])
+    for task in row.get("checklist") or []:
+        for key in _CHECKLIST_BOOL_KEYS:
+            if task.get(key) is not None:
+                task[key] = bool(task[key])
+    return Enrollment(row)
+
+
+# Correlated subqueries that aggregate an enrollment's documents / checklist
+_DOCUMENTS_JSON_SQL = """
+    COALESCE((
+        SELECT json_group_array(json_object(
+                   'id', d.id, 'doc_type', d.doc_type, 'file_path', d.file_path,
+                   'thumbnail_path', d.thumbnail_path, 'size_bytes', d.size_bytes,
+                   'content_type', d.content_type, 'width', d.width, 'height', d.height,
+                   'verified_at', d.verified_at))
+        FROM (SELECT * FROM documents WHERE enrollment_id = e.id ORDER BY id) d
+    ), '[]')
+"""
+
+_CHECKLIST_JSON_SQL = """
+    COALESCE((
+        SELECT json_group_array(json_object(
+                   'id', c.id, 'enrollment_id', c.enrollment_id,
+                   'task_key', c.task_key, 'task_name', c.task_name,
+                   'completed', c.completed, 'completed_at', c.completed_at,
+                   'completed_by', c.completed_by, 'email_recipient', c.email_recipient,
+                   'email_sent', c.email_sent, 'email_sent_at', c.email_sent_at,
+                   'created_at', c.created_at))
+        FROM (SELECT * FROM enrollment_checklist WHERE enrollment_id = e.id ORDER BY id) c
+    ), '[]')
+"""
+
+
+# Listing projections, as in database_pg
+ENROLLMENT_SUMMARY_COLUMNS = (
+    "id", "full_name", "tech_id", "district", "state", "referred_by", "industry",
+    "year", "make", "model", "vin", "insurance_exp", "registration_exp",
+    "submission_date", "approved", "segno_sync_status", "checklist_mask", "workflow_stage",
+)
+
+ENROLLMENT_PROJECTIONS = ("summary", "full")
+
+
+def _enrollment_columns(projection: str, alias: str = "e") -> str:
+    if projection == "full":
+        return f"{alias}.*"
+    if projection == "summary":
+        return ", ".join(f"{alias}.{column}" for column in ENROLLMENT_SUMMARY_COLUMNS)
+    raise ValueError(f"Unknown enrollment projection: {projection}")
+
+
+def get_all_enrollments(projection: str = "full") -> List[Enrollment]:
+    """Return all enrollments ordered by submission date."""
+    with get_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {_enrollment_columns(projection)} FROM enrollments e
+            ORDER BY e.submission_date DESC
+        """)
+        return [_to_enrollment(row) for row in cursor.fetchall()]
+
+
+ENROLLMENT_FILTER_KEYS = {
+    "approved", "state", "district", "segno_sync_status", "submitted_from", "submitted_to"
+}
+
+
+def _enrollment_filter_clause(filters: Optional[Dict[str, Any]], alias: str = "e") -> Tuple[List[str], List[Any]]:
+    """Translate listing filters into SQL conditions and parameters.
+
+    Accepts the same keys as database_pg._enrollment_filter_clause.
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    if not filters:
+        return conditions, params
+
+    unknown = set(filters) - ENROLLMENT_FILTER_KEYS
+    if unknown:
+        raise ValueError(f"Invalid enrollment filter: {', '.join(sorted(unknown))}")
+
+    if filters.get("approved") is not None:
+        conditions.append(f"{alias}.approved = ?")
+        params.append(1 if filters["approved"] else 0)
+    for column in ("state", "district", "segno_sync_status"):
+        if filters.get(column):
+            conditions.append(f"{alias}.{column} = ?")
+            params.append(filters[column])
+    if filters.get("submitted_from"):
+        conditions.append(f"{alias}.submission_date >= ?")
+        params.append(_to_db_value(filters["submitted_from"]))
+    if filters.get("submitted_to"):
+        submitted_to = filters["submitted_to"]
+        if isinstance(submitted_to, date) and not isinstance(submitted_to, datetime):
+            conditions.append(f"{alias}.submission_date < ?")
+            params.append((submitted_to + timedelta(days=1)).isoformat())
+        else:
+            conditions.append(f"{alias}.submission_date <= ?")
+            params.append(_to_db_value(submitted_to))
+    return conditions, params
+
+
+@with_retry
+def get_enrollments_with_details(filters: Optional[Dict[str, Any]] = None,
+                                 cursor_key: Optional[Tuple[str, int]] = None,
+                                 limit: Optional[int] = None,
+                                 projection: str = "full",
+                                 primary: bool = False) -> List[Enrollment]:
+    """Return enrollments with 'documents' and 'checklist' attached, newest first."""
+    columns = _enrollment_columns(projection)
+    conditions, params = _enrollment_filter_clause(filters)
+    if cursor_key is not None:
+        conditions.append("(e.submission_date, e.id) < (?, ?)")
+        params.extend(cursor_key)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(int(limit))
+
+    with get_read_cursor(primary=primary) as cursor:
+        cursor.execute(f"""
+            SELECT {columns},
+                   {_DOCUMENTS_JSON_SQL} AS documents,
+                   {_CHECKLIST_JSON_SQL} AS checklist
+            FROM enrollments e
+            {where}
+            ORDER BY e.submission_date DESC, e.id DESC
+            {limit_sql}
+        """, params)
+        return [_to_enrollment(row) for row in cursor.fetchall()]
+
+
+# Rows fetched per step by the streaming iterators
+ITER_BATCH_SIZE = 500
+
+
+def _iter_rows(query: str, params, batch_size: int) -> Iterator[Dict[str, Any]]:
+    """Yield rows in batches from a dedicated read connection.
+
+    A separate connection keeps a half-consumed iterator from holding the
+    thread's shared transaction open.
+    """
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = _dict_factory
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def iter_enrollments(batch_size: int = ITER_BATCH_SIZE,
+                     filters: Optional[Dict[str, Any]] = None,
+                     with_details: bool = False,
+                     projection: str = "full") -> Iterator[Enrollment]:
+    """Stream enrollments (newest first) without loading the whole table."""
+    columns = _enrollment_columns(projection)
+    conditions, params = _enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    details = ""
+    if with_details:
+        details = f", {_DOCUMENTS_JSON_SQL} AS documents, {_CHECKLIST_JSON_SQL} AS checklist"
+    query = f"""
+        SELECT {columns}{details}
+        FROM enrollments e
+        {where}
+        ORDER BY e.submission_date DESC, e.id DESC
+    """
+    for row in _iter_rows(query, params, batch_size):
+        yield _to_enrollment(row)
+
+
+def iter_documents(batch_size: int = ITER_BATCH_SIZE,
+                   unverified_only: bool = False) -> Iterator[Dict[str, Any]]:
+    """Stream document rows ordered by enrollment, optionally only never-checked ones."""
+    where = "WHERE verified_at IS NULL" if unverified_only else ""
+    yield from _iter_rows(f"""
+        SELECT {_DOCUMENT_COLUMNS_SQL}
+        FROM documents
+        {where}
+        ORDER BY enrollment_id, id
+    """, None, batch_size)
+
+
+def iter_checklists(batch_size: int = ITER_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream every checklist task row ordered by enrollment."""
+    for row in _iter_rows("""
+        SELECT id, enrollment_id, task_key, task_name, completed, completed_at,
+               completed_by, email_recipient, email_sent, email_sent_at, created_at
+        FROM enrollment_checklist
+        ORDER BY enrollment_id, id
+    """, None, batch_size):
+        row["completed"] = bool(row["completed"])
+        row["email_sent"] = bool(row["email_sent"])
+        yield row
+
+
+def get_enrollments_page(filters: Optional[Dict[str, Any]] = None,
+                         cursor_key: Optional[Tuple[str, int]] = None,
+                         limit: int = 25,
+                         projection: str = "full",
+                         primary: bool = False) -> Dict[str, Any]:
+    """Return one keyset-paginated page of enrollments with details."""
+    rows = get_enrollments_with_details(filters, cursor_key=cursor_key, limit=limit + 1,
+                                        projection=projection, primary=primary)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = (rows[-1]["submission_date"], rows[-1]["id"])
+    return {"records": rows, "next_cursor": next_cursor}
+
+
+@with_retry
+def get_enrollment_page_cursor(filters: Optional[Dict[str, Any]], page: int,
+                               page_size: int) -> Optional[Tuple[str, int]]:
+    """Return the cursor_key that starts listing page `page` (1-based)."""
+    if page <= 1:
+        return None
+    conditions, params = _enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append((page - 1) * page_size - 1)
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute(f"""
+            SELECT e.submission_date, e.id FROM enrollments e
+            {where}
+            ORDER BY e.submission_date DESC, e.id DESC
+            LIMIT 1 OFFSET ?
+        """, params)
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+
+
+@with_retry
+def count_enrollments(filters: Optional[Dict[str, Any]] = None, primary: bool = False) -> int:
+    """Count enrollments matching the listing filters."""
+    conditions, params = _enrollment_filter_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with get_read_cursor(dict_cursor=False, primary=primary) as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM enrollments e {where}", params)
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+
+@with_retry
+def get_enrollment_by_id(enrollment_id: int) -> Optional[Enrollment]:
+    """Return a single enrollment with its documents."""
+    with get_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT e.*, {_DOCUMENTS_JSON_SQL} AS documents
+            FROM enrollments e
+            WHERE e.id = ?
+        """, (enrollment_id,))
+        row = cursor.fetchone()
+        return _to_enrollment(row) if row else None
+
+
+def get_expiring_enrollments(field: str, within_days: int = 30,
+                             limit: Optional[int] = 100) -> List[Enrollment]:
+    """Return enrollments whose insurance or registration expires soon."""
+    column = EXPIRATION_DATE_COLUMNS.get(field) or EXPIRATION_DATE_COLUMNS.get(f"{field}_exp")
+    if column is None:
+        raise ValueError(f"Unknown expiration field: {field}")
+
+    today = date.today()
+    params: List[Any] = [today.isoformat(), (today + timedelta(days=int(within_days))).isoformat()]
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(int(limit))
+
+    with get_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT e.* FROM enrollments e
+            WHERE e.{column} >= ? AND e.{column} <= ?
+            ORDER BY e.{column}, e.id
+            {limit_sql}
+        """, params)
+        return [_to_enrollment(row) for row in cursor.fetchall()]
+
+
+def update_enrollment(enrollment_id: int, updates: Dict[str, Any]):
+    """Update specific fields on an enrollment."""
+    if not updates:
+        return
+
+    ALLOWED_COLUMNS = {
+        'full_name', 'tech_id', 'district', 'state', 'referred_by',
+        'industries', 'industry', 'year', 'make', 'model', 'vin',
+        'insurance_exp', 'registration_exp', 'template_used', 'comment',
+        'submission_date', 'approved', 'approved_at', 'approved_by',
+        'dashboard_tech_id'
+    }
+
+    fields = []
+    values = []
+
+    for key, value in updates.items():
+        if key not in ALLOWED_COLUMNS:
+            raise ValueError(f"Invalid column name: {key}")
+
+        if key in ("industries", "industry"):
+            value = json.dumps(value) if isinstance(value, (list, dict)) else value
+            if key == "industry":
+                fields.append("industry = ?")
+                values.append(value)
+                fields.append("industries = ?")
+                values.append(value)
+                continue
+        fields.append(f"{key} = ?")
+        values.append(_to_db_value(value))
+        if key in EXPIRATION_DATE_COLUMNS:
+            fields.append(f"{EXPIRATION_DATE_COLUMNS[key]} = ?")
+            values.append(_iso_date(value))
+
+    values.append(enrollment_id)
+
+    with get_cursor() as cursor:
+        cursor.execute(
+            f"UPDATE enrollments SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+
+
+def set_dashboard_sync_info(enrollment_id: int, dashboard_tech_id: Optional[str] = None, report: Optional[dict] = None):
+    """Persist the dashboard technician ID; a report is logged as a sync attempt."""
+    if dashboard_tech_id is not None:
+        update_enrollment(enrollment_id, {"dashboard_tech_id": str(dashboard_tech_id)})
+    if report is not None:
+        status = "partial" if report.get("failed_uploads") else "success"
+        record_sync_attempt(enrollment_id, "dashboard", status, details=report)
+
+
+def delete_enrollment(enrollment_id: int):
+    """Delete an enrollment and its documents (CASCADE)."""
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM enrollments WHERE id = ?", (enrollment_id,))
+
+
+def update_segno_status(enrollment_id: int, status: str, segno_record_id: Optional[str] = None):
+    """Update Segno sync status for an enrollment."""
+    with get_cursor() as cursor:
+        cursor.execute("""
+            UPDATE enrollments
+            SET segno_sync_status = ?,
+                segno_record_id = ?
+            WHERE id = ?
+        """, (status, segno_record_id, enrollment_id))
+
+
+def get_enrollment(enrollment_id: int) -> Optional[Enrollment]:
+    """Get a single enrollment by ID. Alias for get_enrollment_by_id."""
+    return get_enrollment_by_id(enrollment_id)
+
+
+def _migration_010_document_thumbnails(cursor):
+    """Path of each document's preview derivative (see file_storage.save_thumbnail)."""
+    _add_column(cursor, "documents", "thumbnail_path", "TEXT")
+
+
+# Mirrors database_pg: a verified row without size_bytes was found missing.
+DOCUMENT_METADATA_COLUMNS = ("size_bytes", "sha256", "content_type", "width", "height")
+
+_DOCUMENT_COLUMNS_SQL = (
+    "id, enrollment_id, doc_type, file_path, thumbnail_path, "
+    + ", ".join(DOCUMENT_METADATA_COLUMNS) + ", verified_at"
+)
+
+_INSERT_DOCUMENT_SQL = """
+    INSERT INTO documents (enrollment_id, doc_type, file_path, thumbnail_path,
+                           size_bytes, sha256, content_type, width, height,
+                           verified_at, idempotency_key)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id
+"""
+
+
+def _migration_011_document_metadata(cursor):
+    """Size, hash, content type, dimensions and last verification of each document."""
+    _add_column(cursor, "documents", "size_bytes", "INTEGER")
+    _add_column(cursor, "documents", "sha256", "TEXT")
+    _add_column(cursor, "documents", "content_type", "TEXT")
+    _add_column(cursor, "documents", "width", "INTEGER")
+    _add_column(cursor, "documents", "height", "INTEGER")
+    _add_column(cursor, "documents", "verified_at", "TEXT")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documents_unverified
+        ON documents(enrollment_id, id) WHERE verified_at IS NULL
+    """)
+
+
+def document_missing(document: Dict[str, Any]) -> bool:
+    """True when the last storage check found the document's file missing."""
+    return bool(document.get("verified_at")) and document.get("size_bytes") is None
+
+
+def _document_fields(document: Any) -> Dict[str, Any]:
+    """Normalize a (doc_type, file_path[, thumbnail_path]) tuple or a document dict."""
+    if isinstance(document, dict):
+        return document
+    return {
+        "doc_type": document[0],
+        "file_path": document[1],
+        "thumbnail_path": document[2] if len(document) > 2 else None,
+    }
+
+
+def _insert_document_params(enrollment_id: int, document: Dict[str, Any],
+                            idempotency_key: Optional[str]) -> Tuple[Any, ...]:
+    """Parameters for _INSERT_DOCUMENT_SQL."""
+    verified = document.get("size_bytes") is not None
+    return (enrollment_id, document["doc_type"], document["file_path"],
+            document.get("thumbnail_path"),
+            *(document.get(column) for column in DOCUMENT_METADATA_COLUMNS),
+            datetime.now().isoformat() if verified else None, idempotency_key)
+
+
+@with_retry
+def add_document(enrollment_id: int, doc_type: str, file_path: str,
+                 idempotency_key: Optional[str] = None,
+                 thumbnail_path: Optional[str] = None,
+                 metadata: Optional[Dict[str, Any]] = None) -> int:
+    """Add a document record for an enrollment and return its ID (idempotent per key)."""
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    document = dict(metadata or {}, doc_type=doc_type, file_path=file_path,
+                    thumbnail_path=thumbnail_path)
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute(_INSERT_DOCUMENT_SQL,
+                       _insert_document_params(enrollment_id, document, idempotency_key))
+        row = cursor.fetchone()
+        return row[0] if row else _existing_id(cursor, "documents", idempotency_key)
+
+
+@with_retry
+def set_document_metadata(document_id: int, metadata: Optional[Dict[str, Any]]):
+    """Record a storage check of a document; metadata None means the file is missing."""
+    metadata = metadata or {}
+    with get_cursor() as cursor:
+        cursor.execute("""
+            UPDATE documents
+            SET size_bytes = ?, sha256 = ?, content_type = ?, width = ?, height = ?,
+                verified_at = ?
+            WHERE id = ?
+        """, (*(metadata.get(column) for column in DOCUMENT_METADATA_COLUMNS),
+              datetime.now().isoformat(), document_id))
+
+
+@with_retry
+def set_document_thumbnail(document_id: int, thumbnail_path: Optional[str]):
+    """Record the thumbnail generated for an existing document."""
+    with get_cursor() as cursor:
+        cursor.execute("UPDATE documents SET thumbnail_path = ? WHERE id = ?",
+                       (thumbnail_path, document_id))
+
+
+def get_documents_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
+    """Get all documents for an enrollment."""
+    with get_cursor() as cursor:
+        cursor.execute(
+            f"SELECT {_DOCUMENT_COLUMNS_SQL} FROM documents WHERE enrollment_id = ? ORDER BY id",
+            (enrollment_id,)
+        )
+        return cursor.fetchall()
+
+
+def delete_documents_for_enrollment(enrollment_id: int):
+    """Delete all documents for an enrollment."""
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM documents WHERE enrollment_id = ?", (enrollment_id,))
+
+
+def add_notification_rule(rule: Dict[str, Any]):
+    """Add a notification rule."""
+    recipients = rule.get("recipients", [])
+    if isinstance(recipients, list):
+        recipients = ",".join(recipients)
+
+    with get_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO notification_rules (rule_name, trigger, days_before, recipients, enabled)
+            VALUES (?, ?, ?, ?, ?)
+        """, (
+            rule["rule_name"],
+            rule["trigger"],
+            rule.get("days_before"),
+            recipients,
+            1 if rule.get("enabled", True) else 0
+        ))
+
+
+def get_notification_rules() -> List[Dict[str, Any]]:
+    """Get all notification rules."""
+    with get_cursor() as cursor:
+        cursor.execute("SELECT * FROM notification_rules ORDER BY id DESC")
+        rules = cursor.fetchall()
+        for r in rules:
+            r["recipients"] = r["recipients"].split(",") if r["recipients"] else []
+        return rules
+
+
+def update_notification_rule(rule_id: int, updates: Dict[str, Any]):
+    """Update a notification rule."""
+    ALLOWED_COLUMNS = {
+        'rule_name', 'trigger', 'days_before', 'recipients', 'enabled'
+    }
+
+    fields = []
+    values = []
+
+    for k, v in updates.items():
+        if k not in ALLOWED_COLUMNS:
+            raise ValueError(f"Invalid column name: {k}")
+
+        if k == "recipients" and isinstance(v, list):
+            v = ",".join(v)
+        fields.append(f"{k} = ?")
+        values.append(v)
+
+    values.append(rule_id)
+
+    with get_cursor() as cursor:
+        cursor.execute(
+            f"UPDATE notification_rules SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+
+
+def delete_notification_rule(rule_id: int):
+    """Delete a notification rule."""
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM notification_rules WHERE id = ?", (rule_id,))
+
+
+@with_retry
+def log_notification_sent(enrollment_id: int, rule_id: int,
+                          idempotency_key: Optional[str] = None) -> int:
+    """Log that a notification was sent and return the log row ID (idempotent per key)."""
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("""
+            INSERT INTO notifications_sent (enrollment_id, rule_id, idempotency_key)
+            VALUES (?, ?, ?)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id
+        """, (enrollment_id, rule_id, idempotency_key))
+        row = cursor.fetchone()
+        return row[0] if row else _existing_id(cursor, "notifications_sent", idempotency_key)
+
+
+def get_sent_notifications(enrollment_id: int) -> List[Dict[str, Any]]:
+    """Get sent notifications for an enrollment."""
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT * FROM notifications_sent WHERE enrollment_id = ?",
+            (enrollment_id,)
+        )
+        return cursor.fetchall()
+
+
+def approve_enrollment(enrollment_id: int, approved_by: str = "Admin") -> bool:
+    """Mark an enrollment as approved."""
+    with get_cursor() as cursor:
+        cursor.execute("""
+            UPDATE enrollments
+            SET approved = 1,
+                approved_at = ?,
+                approved_by = ?
+            WHERE id = ?
+        """, (datetime.now().isoformat(), approved_by, enrollment_id))
+    return True
+
+
+def load_enrollments() -> List[Enrollment]:
+    """Legacy compatibility: returns all enrollments."""
+    return get_all_enrollments()
+
+
+def save_enrollments(records):
+    """Legacy function - no-op for compatibility."""
+    pass
+
+
+def invalidate_settings_cache(setting_key: Optional[str] = None):
+    """No-op: the SQLite backend reads settings straight from the table."""
+    pass
+
+
+# Outbound integrations whose calls are logged in sync_attempts
+SYNC_TARGETS = ("dashboard", "segno", "email")
+SYNC_STATUSES = ("success", "partial", "failed")
+
+
+def _migration_009_sync_attempts(cursor):
+    """Append-only sync_attempts history; moves last_upload_report blobs into it."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enrollment_id INTEGER NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+            target TEXT NOT NULL,
+            status TEXT NOT NULL,
+            latency_ms INTEGER,
+            error TEXT,
+            payload_digest TEXT,
+            details TEXT,
+            attempted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_attempts_enrollment
+        ON sync_attempts(enrollment_id, target, attempted_at DESC)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_attempts_target_time
+        ON sync_attempts(target, attempted_at DESC)
+    """)
+    cursor.execute("""
+        INSERT INTO sync_attempts (enrollment_id, target, status, details, attempted_at)
+        SELECT id, 'dashboard',
+               CASE WHEN json_valid(last_upload_report)
+                         AND json_type(last_upload_report, '$.failed_uploads') IS NOT NULL
+                    THEN 'partial' ELSE 'success' END,
+               last_upload_report,
+               COALESCE(datetime(approved_at), datetime(submission_date), CURRENT_TIMESTAMP)
+        FROM enrollments
+        WHERE last_upload_report IS NOT NULL
+    """)
+    cursor.execute("UPDATE enrollments SET last_upload_report = NULL WHERE last_upload_report IS NOT NULL")
+
+
+def payload_digest(payload: Any) -> Optional[str]:
+    """SHA-256 of a request payload (JSON-encoded with sorted keys), or None."""
+    if payload is None:
+        return None
+    if not isinstance(payload, (bytes, str)):
+        payload = json.dumps(payload, sort_keys=True, default=str)
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+@with_retry
+def record_sync_attempt(enrollment_id: int, target: str, status: str,
+                        latency_ms: Optional[float] = None, error: Optional[str] = None,
+                        payload: Any = None, details: Optional[dict] = None) -> int:
+    """Append one outbound sync attempt and return its ID (see database_pg)."""
+    if target not in SYNC_TARGETS:
+        raise ValueError(f"Invalid sync target: {target}")
+    if status not in SYNC_STATUSES:
+        raise ValueError(f"Invalid sync status: {status}")
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("""
+            INSERT INTO sync_attempts
+                (enrollment_id, target, status, latency_ms, error, payload_digest, details)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            enrollment_id,
+            target,
+            status,
+            None if latency_ms is None else int(round(latency_ms)),
+            error,
+            payload_digest(payload),
+            None if details is None else json.dumps(details),
+        ))
+        return cursor.lastrowid
+
+
+def get_sync_attempts(enrollment_id: int, target: Optional[str] = None,
+                      limit: int = 50) -> List[Dict[str, Any]]:
+    """Sync attempts for an enrollment, newest first, optionally for one target."""
+    params: List[Any] = [enrollment_id]
+    target_sql = ""
+    if target is not None:
+        target_sql = "AND target = ?"
+        params.append(target)
+    params.append(limit)
+    with get_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id, enrollment_id, target, status, latency_ms, error,
+                   payload_digest, details, attempted_at
+            FROM sync_attempts
+            WHERE enrollment_id = ? {target_sql}
+            ORDER BY attempted_at DESC, id DESC
+            LIMIT ?
+        """, params)
+        rows = cursor.fetchall()
+    for row in rows:
+        if row.get("details"):
+            row["details"] = json.loads(row["details"])
+    return rows
+
+
+def get_latest_sync_attempt(enrollment_id: int, target: str) -> Optional[Dict[str, Any]]:
+    """The most recent attempt for an enrollment and target, or None."""
+    attempts = get_sync_attempts(enrollment_id, target, limit=1)
+    return attempts[0] if attempts else None
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Linear-interpolated percentile, matching Postgres percentile_cont."""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def get_sync_attempt_stats(target: Optional[str] = None,
+                           since: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-target attempt counts, failure rate and latency (avg/p50/p95 ms).
+
+    since defaults to the last 30 days.
+    """
+    since = since or datetime.now() - timedelta(days=30)
+    params: List[Any] = [since.isoformat(sep=" ")]
+    target_sql = ""
+    if target is not None:
+        target_sql = "AND target = ?"
+        params.append(target)
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute(f"""
+            SELECT target, status, latency_ms FROM sync_attempts
+            WHERE attempted_at >= ? {target_sql}
+        """, params)
+        rows = cursor.fetchall()
+
+    grouped: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+    for name, status, latency_ms in rows:
+        grouped.setdefault(name, []).append((status, latency_ms))
+    stats = {}
+    for name, attempts in grouped.items():
+        latencies = sorted(float(ms) for _, ms in attempts if ms is not None)
+        failed = sum(1 for status, _ in attempts if status == "failed")
+        summary = {
+            "attempts": len(attempts),
+            "failed": failed,
+            "partial": sum(1 for status, _ in attempts if status == "partial"),
+            "avg_latency_ms": sum(latencies) / len(latencies) if latencies else None,
+            "p50_latency_ms": _percentile(latencies, 0.5),
+            "p95_latency_ms": _percentile(latencies, 0.95),
+            "failure_rate": failed / len(attempts),
+        }
+        for key in ("avg_latency_ms", "p50_latency_ms", "p95_latency_ms"):
+            if summary[key] is not None:
+                summary[key] = round(summary[key], 1)
+        stats[name] = summary
+    return stats
+
+
+def _get_app_setting(setting_key: str) -> Any:
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT setting_value FROM app_settings WHERE setting_key = ?",
+            (setting_key,)
+        )
+        row = cursor.fetchone()
+    return _decode_json(row["setting_value"]) if row else None
+
+
+def _save_app_setting(setting_key: str, value: Any):
+    with get_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO app_settings (setting_key, setting_value, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT (setting_key)
+            DO UPDATE SET setting_value = excluded.setting_value, updated_at = excluded.updated_at
+        """, (setting_key, json.dumps(value), datetime.now().isoformat()))
+
+
+def get_approval_notification_settings() -> Optional[Dict[str, Any]]:
+    """Get approval notification settings from app_settings table."""
+    return _get_app_setting("approval_notification")
+
+
+def save_approval_notification_settings(settings: Dict[str, Any]) -> bool:
+    """Save approval notification settings to app_settings table."""
+    _save_app_setting("approval_notification", settings)
+    return True
+
+
+def get_notification_settings() -> Optional[Dict[str, Any]]:
+    """Get all notification settings from app_settings table."""
+    return _get_app_setting("notification_settings")
+
+
+def save_notification_settings(settings: Dict[str, Any]) -> bool:
+    """Save all notification settings to app_settings table."""
+    _save_app_setting("notification_settings", settings)
+    return True
+
+
+CHECKLIST_TASKS = [
+    {'key': 'approved_synced', 'name': 'Approved Enrollment & Synced to Dashboard'},
+    {'key': 'policy_hshr', 'name': 'Signed Policy Form Sent to HSHRpaperwork'},
+    {'key': 'mileage_segno', 'name': 'Mileage form created in Segno'},
+    {'key': 'supplies_magnets', 'name': 'Supplies Notified for Magnets'},
+    {'key': 'fleet_inventory', 'name': 'Fleet & Inventory Notified'},
+    {'key': 'survey_30day', 'name': '30 Day survey completed'},
+]
+
+# Admin workflow steps and checklist_mask bits, as in database_pg
+WORKFLOW_STEPS = ("approved_synced", "policy_hshr", "segno_synced", "fleet_notified")
+
+CHECKLIST_TASK_NAMES = {task['key']: task['name'] for task in CHECKLIST_TASKS}
+CHECKLIST_TASK_NAMES.update({
+    'segno_synced': 'Mileage Form Created in Segno',
+    'fleet_notified': 'Fleet, Inventory, Supplies Notified',
+})
+
+# Bit of each task in enrollments.checklist_mask; append only, never reorder.
+CHECKLIST_TASK_BITS = {
+    key: 1 << index
+    for index, key in enumerate(
+        WORKFLOW_STEPS + tuple(task['key'] for task in CHECKLIST_TASKS if task['key'] not in WORKFLOW_STEPS)
+    )
+}
+
+
+def create_checklist_for_enrollment(enrollment_id: int) -> bool:
+    """Create checklist tasks for a new enrollment."""
+    with get_cursor() as cursor:
+        cursor.executemany("""
+            INSERT OR IGNORE INTO enrollment_checklist (enrollment_id, task_key, task_name)
+            VALUES (?, ?, ?)
+        """, [(enrollment_id, task['key'], task['name']) for task in CHECKLIST_TASKS])
+    return True
+
+
+def get_checklist_for_enrollment(enrollment_id: int) -> List[Dict[str, Any]]:
+    """Get all checklist tasks for an enrollment."""
+    with get_cursor() as cursor:
+        cursor.execute("""
+            SELECT id, enrollment_id, task_key, task_name, completed, completed_at,
+                   completed_by, email_recipient, email_sent, email_sent_at, created_at
+            FROM enrollment_checklist
+            WHERE enrollment_id = ?
+            ORDER BY id
+        """, (enrollment_id,))
+        results = cursor.fetchall()
+        for r in results:
+            r["completed"] = bool(r["completed"])
+            r["email_sent"] = bool(r["email_sent"])
+        return results
+
+
+def _workflow_stage(mask: int) -> int:
+    """Index of the first WORKFLOW_STEPS task not completed in mask."""
+    for index, step in enumerate(WORKFLOW_STEPS):
+        if not mask & CHECKLIST_TASK_BITS[step]:
+            return index
+    return len(WORKFLOW_STEPS)
+
+
+def _refresh_checklist_mask(cursor, enrollment_id: int):
+    """Recompute checklist_mask/workflow_stage from the enrollment's completed tasks."""
+    cursor.execute(
+        "SELECT task_key FROM enrollment_checklist WHERE enrollment_id = ? AND completed",
+        (enrollment_id,)
+    )
+    mask = sum(CHECKLIST_TASK_BITS.get(row[0], 0) for row in cursor.fetchall())
+    cursor.execute(
+        "UPDATE enrollments SET checklist_mask = ?, workflow_stage = ? WHERE id = ?",
+        (mask, _workflow_stage(mask), enrollment_id)
+    )
+
+
+def update_checklist_task(task_id: int, completed: bool, completed_by: str = "Admin") -> bool:
+    """Update a checklist task's completion status and the enrollment's checklist_mask."""
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("""
+            UPDATE enrollment_checklist
+            SET completed = ?, completed_at = ?, completed_by = ?
+            WHERE id = ?
+            RETURNING enrollment_id
+        """, (
+            1 if completed else 0,
+            datetime.now().isoformat() if completed else None,
+            completed_by if completed else None,
+            task_id
+        ))
+        row = cursor.fetchone()
+        if row:
+            _refresh_checklist_mask(cursor, row[0])
+    return True
+
+
+def mark_checklist_task_by_key(enrollment_id: int, task_key: str, completed: bool = True, completed_by: str = "System") -> bool:
+    """Mark a checklist task as complete by enrollment_id and task_key.
+
+    The task row is created if missing, and checklist_mask is updated in
+    the same transaction.
+    """
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("""
+            INSERT INTO enrollment_checklist
+                (enrollment_id, task_key, task_name, completed, completed_at, completed_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (enrollment_id, task_key) DO UPDATE
+            SET completed = excluded.completed,
+                completed_at = excluded.completed_at,
+                completed_by = excluded.completed_by
+        """, (
+            enrollment_id,
+            task_key,
+            CHECKLIST_TASK_NAMES.get(task_key, task_key),
+            1 if completed else 0,
+            datetime.now().isoformat() if completed else None,
+            completed_by if completed else None
+        ))
+        _refresh_checklist_mask(cursor, enrollment_id)
+    return True
+
+
+def _migration_007_checklist_mask(cursor):
+    """enrollments.checklist_mask/workflow_stage, backfilled from completed checklist rows."""
+    _add_column(cursor, "enrollments", "checklist_mask", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(cursor, "enrollments", "workflow_stage", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("SELECT DISTINCT enrollment_id FROM enrollment_checklist WHERE completed")
+    for (enrollment_id,) in cursor.fetchall():
+        _refresh_checklist_mask(cursor, enrollment_id)
+    for column in ("checklist_mask", "workflow_stage"):
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_{column}_submission_id
+            ON enrollments({column}, submission_date DESC, id DESC)
+        """)
+
+
+def checklist_mask_bits(completed: Sequence[str] = (), pending: Sequence[str] = ()) -> Tuple[int, int]:
+    """(required, excluded) checklist_mask bits for completed and pending task keys.
+
+    A row matches when checklist_mask & required = required and
+    checklist_mask & excluded = 0.
+    """
+    unknown = (set(completed) | set(pending)) - set(CHECKLIST_TASK_BITS)
+    if unknown:
+        raise ValueError(f"Unknown checklist task: {', '.join(sorted(unknown))}")
+    required = sum(CHECKLIST_TASK_BITS[key] for key in set(completed))
+    excluded = sum(CHECKLIST_TASK_BITS[key] for key in set(pending))
+    return required, excluded
+
+
+# Task-key queues with a partial index each, as database_pg.WORKFLOW_QUEUES
+WORKFLOW_QUEUES = tuple(((WORKFLOW_STEPS[0],), (step,)) for step in WORKFLOW_STEPS[1:])
+
+
+def _checklist_mask_condition(required: int, excluded: int, column: str = "checklist_mask") -> str:
+    """SQL test of checklist_mask bits, inlined so WORKFLOW_QUEUES indexes match."""
+    return f"{column} & {int(required)} = {int(required)} AND {column} & {int(excluded)} = 0"
+
+
+def _migration_014_workflow_queue_indexes(cursor):
+    """Partial indexes for WORKFLOW_QUEUES instead of the checklist_mask index."""
+    cursor.execute("DROP INDEX IF EXISTS idx_enrollments_checklist_mask_submission_id")
+    for completed, pending in WORKFLOW_QUEUES:
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_enrollments_queue_{pending[0]}
+            ON enrollments(submission_date, id)
+            WHERE {_checklist_mask_condition(*checklist_mask_bits(completed, pending))}
+        """)
+
+
+@with_retry
+def get_workflow_queue(completed: Sequence[str] = (), pending: Sequence[str] = (),
+                       stage: Optional[str] = None, limit: int = 100) -> List[Enrollment]:
+    """Enrollments waiting on a checklist step, oldest submission first.
+
+    Same arguments and indexed paths as database_pg.get_workflow_queue.
+    """
+    if stage is None:
+        for index, step in enumerate(WORKFLOW_STEPS):
+            if set(completed) == set(WORKFLOW_STEPS[:index]) and set(pending) == {step}:
+                stage = step
+                break
+    if stage is not None:
+        if stage not in WORKFLOW_STEPS:
+            raise ValueError(f"Unknown workflow stage: {stage}")
+        condition, params = "e.workflow_stage = ?", [WORKFLOW_STEPS.index(stage)]
+    else:
+        condition = _checklist_mask_condition(*checklist_mask_bits(completed, pending), "e.checklist_mask")
+        params = []
+    with get_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT e.* FROM enrollments e
+            WHERE {condition}
+            ORDER BY e.submission_date, e.id
+            LIMIT ?
+        """, (*params, limit))
+        return [_to_enrollment(row) for row in cursor.fetchall()]
+
+
+def update_checklist_task_email(task_id: int, email_recipient: str) -> bool:
+    """Update the email recipient for a checklist task."""
+    with get_cursor() as cursor:
+        cursor.execute(
+            "UPDATE enrollment_checklist SET email_recipient = ? WHERE id = ?",
+            (email_recipient, task_id)
+        )
+    return True
+
+
+def mark_checklist_email_sent(task_id: int) -> bool:
+    """Mark that the notification email was sent for a task."""
+    with get_cursor() as cursor:
+        cursor.execute(
+            "UPDATE enrollment_checklist SET email_sent = 1, email_sent_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), task_id)
+        )
+    return True
+
+
+def get_checklist_task_recipients() -> Dict[str, str]:
+    """Get default email recipients for each task type from app_settings."""
+    value = _get_app_setting("checklist_recipients")
+    return value if isinstance(value, dict) else {}
+
+
+def save_checklist_task_recipients(recipients: Dict[str, str]) -> bool:
+    """Save default email recipients for checklist tasks."""
+    _save_app_setting("checklist_recipients", recipients)
+    return True
+
+
+def get_admin_settings(setting_key: str) -> Optional[Dict[str, Any]]:
+    """Get admin settings by key from app_settings table."""
+    return _get_app_setting(setting_key)
+
+
+def save_admin_settings(setting_key: str, settings: Dict[str, Any]) -> bool:
+    """Save admin settings by key to app_settings table."""
+    _save_app_setting(setting_key, settings)
+    return True
+
+
+def create_docusign_token(enrollment_id: int) -> str:
+    """Create a unique token for DocuSign confirmation."""
+    token = secrets.token_urlsafe(32)
+    with get_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO docusign_tokens (enrollment_id, token)
+            VALUES (?, ?)
+            ON CONFLICT (enrollment_id)
+            DO UPDATE SET token = excluded.token, confirmed = 0, confirmed_at = NULL
+        """, (enrollment_id, token))
+    return token
+
+
+def confirm_docusign_token(token: str) -> Dict[str, Any]:
+    """Confirm a DocuSign token and mark the checklist task as complete.
+
+    Returns dict with 'success', 'enrollment_id', 'tech_name' on success,
+    or 'error' key on failure.
+    """
+    with get_cursor() as cursor:
+        cursor.execute("""
+            SELECT dt.id, dt.enrollment_id, dt.confirmed, e.full_name, e.tech_id
+            FROM docusign_tokens dt
+            JOIN enrollments e ON dt.enrollment_id = e.id
+            WHERE dt.token = ?
+        """, (token,))
+        row = cursor.fetchone()
+
+        if not row:
+            return {'error': 'Invalid or expired confirmation link'}
+
+        if row.get('confirmed'):
+            return {'error': 'This DocuSign has already been confirmed', 'already_confirmed': True}
+
+        cursor.execute(
+            "UPDATE docusign_tokens SET confirmed = 1, confirmed_at = ? WHERE token = ?",
+            (datetime.now().isoformat(), token)
+        )
+
+        enrollment_id = row.get('enrollment_id')
+        if enrollment_id is not None:
+            mark_checklist_task_by_key(int(enrollment_id), 'policy_hshr', completed=True, completed_by='DocuSign Confirmation')
+
+        return {
+            'success': True,
+            'enrollment_id': enrollment_id,
+            'tech_name': row.get('full_name'),
+            'tech_id': row.get('tech_id')
+        }
+
+
+def get_docusign_status(enrollment_id: int) -> Dict[str, Any]:
+    """Get the DocuSign confirmation status for an enrollment."""
+    with get_cursor() as cursor:
+        cursor.execute("""
+            SELECT token, confirmed, confirmed_at, created_at
+            FROM docusign_tokens
+            WHERE enrollment_id = ?
+        """, (enrollment_id,))
+        row = cursor.fetchone()
+        if row:
+            return {
+                'has_token': True,
+                'confirmed': bool(row.get('confirmed')),
+                'confirmed_at': row.get('confirmed_at'),
+                'created_at': row.get('created_at')
+            }
+        return {'has_token': False, 'confirmed': False}
+
+
+# Aggregate counters kept in enrollment_stats by triggers, as in database_pg.
+# SQLite has one writer at a time, so there is nothing to gain from
+# database_pg's per-slot rows; a bucket is one row and "all" keeps the total.
+ENROLLMENT_STATS_DIMENSIONS = ("all", "approved", "state", "district", "checklist")
+
+_ENROLLMENT_STATS_BACKFILL_SQL = """
+    INSERT INTO enrollment_stats (dimension, bucket, total)
+    SELECT 'all', '', COUNT(*) FROM enrollments
+    UNION ALL
+    SELECT 'approved', COALESCE(CAST(approved AS TEXT), ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'state', COALESCE(state, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'district', COALESCE(district, ''), COUNT(*) FROM enrollments GROUP BY 2
+    UNION ALL
+    SELECT 'checklist', task_key, COUNT(*) FROM enrollment_checklist WHERE completed GROUP BY 2
+"""
+
+
+def _stat_bump_sql(dimension: str, bucket: str, delta: str) -> str:
+    """Trigger body statements adding delta to one enrollment_stats bucket.
+
+    As created by migration 006; superseded by _stat_upsert_sql (013).
+    """
+    bucket = f"COALESCE({bucket}, '')"
+    return f"""
+            INSERT OR IGNORE INTO enrollment_stats (dimension, bucket, total)
+            VALUES ('{dimension}', {bucket}, 0);
+            UPDATE enrollment_stats SET total = total + ({delta})
+            WHERE dimension = '{dimension}' AND bucket = {bucket};"""
+
+
+def _stat_upsert_sql(dimension: str, bucket: str, delta: str) -> str:
+    """Trigger body statement adding delta to one enrollment_stats bucket.
+
+    An upsert rather than INSERT OR IGNORE: an outer statement's conflict
+    policy (e.g. ABORT for an upsert) would override OR IGNORE in the trigger.
+    """
+    bucket = f"COALESCE({bucket}, '')"
+    return f"""
+            INSERT INTO enrollment_stats (dimension, bucket, total)
+            VALUES ('{dimension}', {bucket}, {delta})
+            ON CONFLICT (dimension, bucket) DO UPDATE SET total = total + ({delta});"""
+
+
+ENROLLMENT_STATS_TRIGGERS = (
+    "trg_enrollment_stats_insert",
+    "trg_enrollment_stats_delete",
+    "trg_enrollment_stats_approved",
+    "trg_enrollment_stats_state",
+    "trg_enrollment_stats_district",
+    "trg_enrollment_checklist_stats_insert",
+    "trg_enrollment_checklist_stats_delete",
+    "trg_enrollment_checklist_stats_update",
+)
+
+
+def _create_enrollment_stats_triggers(cursor, bump_sql):
+    """Create the ENROLLMENT_STATS_TRIGGERS with bump_sql bodies."""
+    buckets = {
+        "approved": "CAST({row}.approved AS TEXT)",
+        "state": "{row}.state",
+        "district": "{row}.district",
+    }
+    inserted = bump_sql("all", "''", "1") + "".join(
+        bump_sql(dimension, bucket.format(row="NEW"), "1") for dimension, bucket in buckets.items()
+    )
+    deleted = bump_sql("all", "''", "-1") + "".join(
+        bump_sql(dimension, bucket.format(row="OLD"), "-1") for dimension, bucket in buckets.items()
+    )
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_stats_insert
+        AFTER INSERT ON enrollments BEGIN {inserted}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_stats_delete
+        AFTER DELETE ON enrollments BEGIN {deleted}
+        END
+    """)
+    for dimension, bucket in buckets.items():
+        old, new = bucket.format(row="OLD"), bucket.format(row="NEW")
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_stats_{dimension}
+            AFTER UPDATE OF {dimension} ON enrollments
+            WHEN OLD.{dimension} IS NOT NEW.{dimension}
+            BEGIN {bump_sql(dimension, old, "-1")}{bump_sql(dimension, new, "1")}
+            END
+        """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_checklist_stats_insert
+        AFTER INSERT ON enrollment_checklist WHEN NEW.completed
+        BEGIN {bump_sql("checklist", "NEW.task_key", "1")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_checklist_stats_delete
+        AFTER DELETE ON enrollment_checklist WHEN OLD.completed
+        BEGIN {bump_sql("checklist", "OLD.task_key", "-1")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_checklist_stats_update
+        AFTER UPDATE OF completed, task_key ON enrollment_checklist
+        BEGIN {bump_sql("checklist", "OLD.task_key", "-(COALESCE(OLD.completed, 0) <> 0)")}
+            {bump_sql("checklist", "NEW.task_key", "COALESCE(NEW.completed, 0) <> 0")}
+        END
+    """)
+
+
+def _migration_006_enrollment_stats(cursor):
+    """The enrollment_stats counter table, its maintenance triggers and a backfill."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_stats (
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket)
+        )
+    """)
+    _create_enrollment_stats_triggers(cursor, _stat_bump_sql)
+
+    cursor.execute("DELETE FROM enrollment_stats")
+    cursor.execute(_ENROLLMENT_STATS_BACKFILL_SQL)
+
+
+def refresh_enrollment_stats():
+    """Recount enrollment_stats from the base tables (repairs manual edits)."""
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("DELETE FROM enrollment_stats")
+        cursor.execute(_ENROLLMENT_STATS_BACKFILL_SQL)
+
+
+@with_retry
+def get_enrollment_stats(primary: bool = False) -> Dict[str, Any]:
+    """Return enrollment totals from the trigger-maintained enrollment_stats table.
+
+    Same shape as database_pg.get_enrollment_stats.
+    """
+    with get_read_cursor(dict_cursor=False, primary=primary) as cursor:
+        cursor.execute("SELECT dimension, bucket, total FROM enrollment_stats")
+        rows = cursor.fetchall()
+    buckets: Dict[str, Dict[str, int]] = {dimension: {} for dimension in ENROLLMENT_STATS_DIMENSIONS}
+    for dimension, bucket, total in rows:
+        if dimension in buckets and total:
+            buckets[dimension][bucket] = int(total)
+    return {
+        "total": buckets["all"].get("", 0),
+        "approved": buckets["approved"].get("1", 0),
+        "pending": buckets["approved"].get("0", 0),
+        "by_state": buckets["state"],
+        "by_district": buckets["district"],
+        "checklist_completed": {
+            key: buckets["checklist"].get(key, 0) for key in CHECKLIST_TASK_BITS
+        },
+    }
+
+
+# Change versions for caches; mirrors database_pg.get_enrollment_changes.
+# SQLite already runs one writer at a time, so a shared counter row costs
+# nothing here and versions stay exact (no id is reported twice).
+DATA_VERSION_SCOPE = "enrollments"
+
+_BUMP_DATA_VERSION_SQL = """
+    UPDATE data_versions SET version = version + 1 WHERE scope = 'enrollments';
+    INSERT INTO data_versions (scope, version)
+    SELECT 'enrollment:' || {row}.{column}, version FROM data_versions WHERE scope = 'enrollments'
+    ON CONFLICT (scope) DO UPDATE SET version = excluded.version;
+"""
+
+
+def _migration_012_data_versions(cursor):
+    """data_versions table kept current by triggers on enrollment data."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_data_versions_version ON data_versions(version)")
+    cursor.execute("INSERT OR IGNORE INTO data_versions (scope, version) VALUES ('enrollments', 0)")
+    for table, column in (("enrollments", "id"), ("documents", "enrollment_id"),
+                          ("enrollment_checklist", "enrollment_id")):
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_data_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN {_BUMP_DATA_VERSION_SQL.format(row=row, column=column)}
+                END
+            """)
+
+
+@with_retry
+def get_enrollment_changes(since_version: Optional[int] = None) -> Tuple[int, List[int]]:
+    """Return (current data version, ids of enrollments changed after since_version)."""
+    with get_cursor(dict_cursor=False) as cursor:
+        cursor.execute("""
+            SELECT scope, version FROM data_versions
+            WHERE scope = 'enrollments' OR (? IS NOT NULL AND version > ?)
+        """, (since_version, since_version))
+        rows = cursor.fetchall()
+    version, changed = 0, []
+    for scope, scope_version in rows:
+        if scope == DATA_VERSION_SCOPE:
+            version = scope_version
+        else:
+            changed.append(int(scope.split(":", 1)[1]))
+    return version, changed
+
+
+def _migration_013_stats_trigger_upserts(cursor):
+    """Recreate the enrollment_stats triggers with upsert bodies.
+
+    Migration 006's INSERT OR IGNORE bodies fail with a UNIQUE error when the
+    firing statement is itself an upsert (mark_checklist_task_by_key).
+    """
+    for trigger in ENROLLMENT_STATS_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _create_enrollment_stats_triggers(cursor, _stat_upsert_sql)
+
+
+# Ordered schema migrations for this backend, numbered independently of
+# database_pg.MIGRATIONS. Append new steps at the end; never renumber or edit
+# an applied step.
+MIGRATIONS = [
+    (1, "base_schema", _migration_001_base_schema),
+    (2, "checklist", _migration_002_checklist),
+    (3, "docusign_tokens", _migration_003_docusign_tokens),
+    (4, "listing_indexes", _migration_004_listing_indexes),
+    (5, "expiration_dates", _migration_005_expiration_dates),
+    (6, "enrollment_stats", _migration_006_enrollment_stats),
+    (7, "checklist_mask", _migration_007_checklist_mask),
+    (8, "idempotency_keys", _migration_008_idempotency_keys),
+    (9, "sync_attempts", _migration_009_sync_attempts),
+    (10, "document_thumbnails", _migration_010_document_thumbnails),
+    (11, "document_metadata", _migration_011_document_metadata),
+    (12, "data_versions", _migration_012_data_versions),
+    (13, "stats_trigger_upserts", _migration_013_stats_trigger_upserts),
+    (14, "workflow_queue_indexes", _migration_014_workflow_queue_indexes),
+]
+
+SCHEMA_HEAD = MIGRATIONS[-1][0]
+
+
+def get_schema_version() -> int:
+    """Return the highest applied migration version (0 for a fresh database)."""
+    try:
+        with get_cursor(dict_cursor=False) as cursor:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+            row = cursor.fetchone()
+            return int(row[0]) if row else 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def run_migrations() -> int:
+    """Apply pending schema migrations and return the resulting version.
+
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent processes
+    apply each step once.
+    """
+    if get_schema_version() >= SCHEMA_HEAD:
+        return SCHEMA_HEAD
+
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        for version, name, migrate in MIGRATIONS:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,))
+                if cursor.fetchone():
+                    cursor.execute("COMMIT")
+                    continue
+                migrate(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                    (version, name)
+                )
+                cursor.execute("COMMIT")
+                print(f"Applied schema migration {version:03d}_{name}")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    return SCHEMA_HEAD
+
+
+def init_db():
+    """Bring the database schema up to date (see run_migrations)."""
+    run_migrations()
+
+
+def init_checklist_table():
+    """Legacy entry point; the checklist table is created by run_migrations."""
+    run_migrations()
+
+
+def init_docusign_tokens_table():
+    """Legacy entry point; the docusign_tokens table is created by run_migrations."""
+    run_migrations()
+    return True
+
+
+USE_SQLITE = True
+DB_PATH = DATABASE_PATH
+
+try:
+    run_migrations()
+except Exception as e:
+    print(f"Warning: Could not initialize database: {e}")
@@ -42,7 +42,7 @@ from PyPDF2 import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 
-import database_pg as database
+import database
 from notifications import send_email_notification, send_docusign_request_hr
 import file_storage
 
@@ -249,8 +249,8 @@ def create_upload_folder(tech_id: str, record_id: str) -> str:
 
 
 def save_uploaded_files(uploaded_files, folder_path: str, prefix: str) -> list:
-    """Save uploaded files using file_storage module."""
-    return file_storage.save_uploaded_files(uploaded_files, folder_path, prefix)
+    """Save uploaded files using file_storage module; returns document dicts."""
+    return file_storage.save_uploaded_documents(uploaded_files, folder_path, prefix)
 
 
 def generate_signed_pdf(template_path: str, signature_image, output_path: str,
@@ -948,9 +948,9 @@ def wizard_step_4():
                 
                 folder_path = create_upload_folder(tech_id, record_id)
                 
-                vehicle_paths = save_uploaded_files(vehicle_photos, folder_path, "vehicle")
-                insurance_paths = save_uploaded_files(insurance_docs, folder_path, "insurance")
-                registration_paths = save_uploaded_files(registration_docs, folder_path, "registration")
+                vehicle_saved = save_uploaded_files(vehicle_photos, folder_path, "vehicle")
+                insurance_saved = save_uploaded_files(insurance_docs, folder_path, "insurance")
+                registration_saved = save_uploaded_files(registration_docs, folder_path, "registration")
                 
                 signature_pdf_path = None
                 if not data.get('is_docusign_state') and data.get('signature_image'):
@@ -993,16 +993,23 @@ def wizard_step_4():
                     'status': 'pending'
                 }
                 
-                enrollment_id = database.insert_enrollment(enrollment_record)
-                
-                for path in vehicle_paths:
-                    database.add_document(enrollment_id, 'vehicle', path)
-                for path in insurance_paths:
-                    database.add_document(enrollment_id, 'insurance', path)
-                for path in registration_paths:
-                    database.add_document(enrollment_id, 'registration', path)
+                documents = [dict(doc, doc_type='vehicle') for doc in vehicle_saved]
+                documents += [dict(doc, doc_type='insurance') for doc in insurance_saved]
+                documents += [dict(doc, doc_type='registration') for doc in registration_saved]
                 if signature_pdf_path:
-                    database.add_document(enrollment_id, 'signature', signature_pdf_path)
+                    signature_bytes = file_storage.read_file(signature_pdf_path)
+                    documents.append({
+                        'doc_type': 'signature',
+                        'file_path': signature_pdf_path,
+                        'thumbnail_path': file_storage.save_thumbnail(signature_pdf_path, signature_bytes),
+                        **file_storage.describe_file(signature_bytes, signature_pdf_path),
+                    })
+                
+                # Kept in the wizard data until the submission succeeds, so a
+                # repeated click or retry after an error cannot create a duplicate
+                submission_key = data.setdefault('submission_key', uuid.uuid4().hex)
+                enrollment_id = database.submit_enrollment_bundle(
+                    enrollment_record, documents, idempotency_key=submission_key)
                 
                 if data.get('is_docusign_state'):
                     try:
@@ -0,0 +1,127 @@
+"""
+Process-wide cache of admin enrollment data.
+
+Streamlit sessions share one process, so listing pages, full enrollment
+records and document bytes are kept here once rather than per session.
+Entries are dropped per enrollment: invalidate() after a write made here,
+and the database change version (database.get_enrollment_changes), polled
+at most every VERSION_POLL_SECONDS, for writes made by other processes.
+Listing pages can show any enrollment, so every change drops all of them.
+
+Cached values are shared between sessions; treat them as read-only.
+Loaders must read the primary (primary=True), like the version poll, so a
+lagging replica's rows are never stored under a newer version.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import database
+
+VERSION_POLL_SECONDS = float(os.environ.get("ENROLLMENT_CACHE_POLL_SECONDS", "2"))
+LIST_CACHE_ENTRIES = 32
+RECORD_CACHE_ENTRIES = 256
+DOCUMENT_CACHE_ENTRIES = 64
+
+_lock = threading.Lock()
+_lists: "OrderedDict[Hashable, Any]" = OrderedDict()
+_records: "OrderedDict[int, Any]" = OrderedDict()
+_documents: "OrderedDict[tuple, bytes]" = OrderedDict()
+# version: last data version applied; generation: bumped on every eviction so
+# a value loaded across an eviction is not stored
+_state: Dict[str, Any] = {"version": None, "checked_at": 0.0, "generation": 0}
+
+
+def _evict(enrollment_id: int):
+    _records.pop(enrollment_id, None)
+    for key in [key for key in _documents if key[0] == enrollment_id]:
+        del _documents[key]
+
+
+def _clear():
+    _lists.clear()
+    _records.clear()
+    _documents.clear()
+    _state["generation"] += 1
+
+
+def _sync_version():
+    """Apply changes recorded in the database since the last poll."""
+    now = time.monotonic()
+    with _lock:
+        since = _state["version"]
+        if since is not None and now - _state["checked_at"] < VERSION_POLL_SECONDS:
+            return
+        _state["checked_at"] = now
+    try:
+        version, changed = database.get_enrollment_changes(since)
+    except Exception as e:
+        print(f"Warning: enrollment cache version check failed: {e}")
+        with _lock:
+            _clear()
+            _state["version"] = None
+        return
+    with _lock:
+        if since is None or _state["version"] is None:
+            _clear()
+        elif changed:
+            for enrollment_id in changed:
+                _evict(enrollment_id)
+            _lists.clear()
+            _state["generation"] += 1
+        # Ids may be reported again by the next poll; a slower concurrent
+        # poll must not move the version back
+        _state["version"] = max(version, _state["version"] or version)
+
+
+def _cached(store: "OrderedDict", key: Hashable, max_entries: int,
+            loader: Callable[[], Any]) -> Any:
+    _sync_version()
+    with _lock:
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+        generation = _state["generation"]
+    value = loader()
+    with _lock:
+        if _state["generation"] == generation and _state["version"] is not None:
+            store[key] = value
+            while len(store) > max_entries:
+                store.popitem(last=False)
+    return value
+
+
+def get_list(key: Hashable, loader: Callable[[], Any]) -> Any:
+    """Cached listing result (a page, a count) for key; loader fills misses."""
+    return _cached(_lists, key, LIST_CACHE_ENTRIES, loader)
+
+
+def get_record(enrollment_id: int, loader: Callable[[], Any]) -> Any:
+    """Cached full enrollment record; loader fills misses."""
+    return _cached(_records, enrollment_id, RECORD_CACHE_ENTRIES, loader)
+
+
+def get_document(enrollment_id: int, path: str, loader: Callable[[], bytes]) -> bytes:
+    """Cached bytes of one of an enrollment's stored files.
+
+    A loader that raises caches nothing, so missing files are retried.
+    """
+    return _cached(_documents, (enrollment_id, path), DOCUMENT_CACHE_ENTRIES, loader)
+
+
+def invalidate(enrollment_id: Optional[int] = None):
+    """Drop cached data for one enrollment (all listings included), or everything.
+
+    The next read also re-checks the database version, so a write made here
+    is reconciled with writes from other processes right away.
+    """
+    with _lock:
+        if enrollment_id is None:
+            _clear()
+        else:
+            _evict(enrollment_id)
+            _lists.clear()
+            _state["generation"] += 1
+        _state["checked_at"] = 0.0
@@ -6,11 +6,41 @@ This preserves all enrollments, documents, checklists, and settings.
 
 import json
 import os
+import shutil
 from datetime import datetime
-import database_pg as database
+import database
+
+def serialize(obj):
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    elif isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    return str(obj)
+
+
+def write_json_array(path, rows):
+    """Stream rows into a JSON array file, one item at a time.
+    
+    Produces the same layout as json.dump(list, indent=2) without holding
+    the list in memory. Returns the number of rows written.
+    """
+    count = 0
+    with open(path, 'w') as f:
+        for row in rows:
+            item = json.dumps(row, indent=2, default=serialize)
+            f.write('[\n' if count == 0 else ',\n')
+            f.write('\n'.join('  ' + line for line in item.split('\n')))
+            count += 1
+        f.write('\n]' if count else '[]')
+    return count
+
 
 def export_all_data():
-    """Export all database tables to JSON files."""
+    """Export all database tables to JSON files.
+    
+    Tables are streamed through server-side cursors, so memory use stays
+    flat regardless of table size.
+    """
     
     backup_dir = "data_backup"
     os.makedirs(backup_dir, exist_ok=True)
@@ -19,29 +49,22 @@ def export_all_data():
     
     print("Starting database export...")
     
-    enrollments = database.get_all_enrollments() or []
-    print(f"Found {len(enrollments)} enrollments")
-    
-    all_documents = []
-    all_checklists = []
+    enrollments_file = os.path.join(backup_dir, f"enrollments_{timestamp}.json")
+    enrollment_count = write_json_array(
+        enrollments_file, (e.to_dict() for e in database.iter_enrollments())
+    )
+    print(f"Found {enrollment_count} enrollments")
+    print(f"Saved enrollments to {enrollments_file}")
     
-    for enrollment in enrollments:
-        eid = enrollment.get('id')
-        if eid is None:
-            continue
-        
-        docs = database.get_documents_for_enrollment(eid) or []
-        for doc in docs:
-            doc['enrollment_id'] = eid
-        all_documents.extend(docs)
-        
-        checklist = database.get_checklist_for_enrollment(eid) or []
-        for item in checklist:
-            item['enrollment_id'] = eid
-        all_checklists.extend(checklist)
+    documents_file = os.path.join(backup_dir, f"documents_{timestamp}.json")
+    document_count = write_json_array(documents_file, database.iter_documents())
+    print(f"Found {document_count} documents")
+    print(f"Saved documents to {documents_file}")
     
-    print(f"Found {len(all_documents)} documents")
-    print(f"Found {len(all_checklists)} checklist items")
+    checklists_file = os.path.join(backup_dir, f"checklists_{timestamp}.json")
+    checklist_count = write_json_array(checklists_file, database.iter_checklists())
+    print(f"Found {checklist_count} checklist items")
+    print(f"Saved checklists to {checklists_file}")
     
     try:
         settings = database.get_notification_settings() or {}
@@ -50,58 +73,27 @@ def export_all_data():
         print(f"No notification settings found: {e}")
         settings = {}
     
-    def serialize(obj):
-        if hasattr(obj, 'isoformat'):
-            return obj.isoformat()
-        elif isinstance(obj, bytes):
-            return obj.decode('utf-8', errors='replace')
-        return str(obj)
-    
-    enrollments_file = os.path.join(backup_dir, f"enrollments_{timestamp}.json")
-    with open(enrollments_file, 'w') as f:
-        json.dump(enrollments, f, indent=2, default=serialize)
-    print(f"Saved enrollments to {enrollments_file}")
-    
-    documents_file = os.path.join(backup_dir, f"documents_{timestamp}.json")
-    with open(documents_file, 'w') as f:
-        json.dump(all_documents, f, indent=2, default=serialize)
-    print(f"Saved documents to {documents_file}")
-    
-    checklists_file = os.path.join(backup_dir, f"checklists_{timestamp}.json")
-    with open(checklists_file, 'w') as f:
-        json.dump(all_checklists, f, indent=2, default=serialize)
-    print(f"Saved checklists to {checklists_file}")
-    
     settings_file = os.path.join(backup_dir, f"settings_{timestamp}.json")
     with open(settings_file, 'w') as f:
         json.dump(settings, f, indent=2, default=serialize)
     print(f"Saved settings to {settings_file}")
     
-    latest_enrollments = os.path.join(backup_dir, "enrollments_latest.json")
-    latest_documents = os.path.join(backup_dir, "documents_latest.json")
-    latest_checklists = os.path.join(backup_dir, "checklists_latest.json")
-    latest_settings = os.path.join(backup_dir, "settings_latest.json")
-    
-    with open(latest_enrollments, 'w') as f:
-        json.dump(enrollments, f, indent=2, default=serialize)
-    with open(latest_documents, 'w') as f:
-        json.dump(all_documents, f, indent=2, default=serialize)
-    with open(latest_checklists, 'w') as f:
-        json.dump(all_checklists, f, indent=2, default=serialize)
-    with open(latest_settings, 'w') as f:
-        json.dump(settings, f, indent=2, default=serialize)
+    shutil.copyfile(enrollments_file, os.path.join(backup_dir, "enrollments_latest.json"))
+    shutil.copyfile(documents_file, os.path.join(backup_dir, "documents_latest.json"))
+    shutil.copyfile(checklists_file, os.path.join(backup_dir, "checklists_latest.json"))
+    shutil.copyfile(settings_file, os.path.join(backup_dir, "settings_latest.json"))
     
     print("\n=== Export Complete ===")
     print(f"Backup directory: {backup_dir}")
-    print(f"Enrollments: {len(enrollments)}")
-    print(f"Documents: {len(all_documents)}")
-    print(f"Checklists: {len(all_checklists)}")
+    print(f"Enrollments: {enrollment_count}")
+    print(f"Documents: {document_count}")
+    print(f"Checklists: {checklist_count}")
     print(f"Settings: {'Yes' if settings else 'No'}")
     
     return {
-        'enrollments': len(enrollments),
-        'documents': len(all_documents),
-        'checklists': len(all_checklists),
+        'enrollments': enrollment_count,
+        'documents': document_count,
+        'checklists': checklist_count,
         'backup_dir': backup_dir,
         'timestamp': timestamp
     }
@@ -6,16 +6,20 @@ and Replit Object Storage.
 import os
 import io
 import base64
+import hashlib
+import mimetypes
 import requests
 from datetime import datetime, timezone
 from uuid import uuid4
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Any
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image
 
 MAX_IMAGE_SIZE = 1600  # Match client-side compression (1600px max dimension)
 JPEG_QUALITY = 65  # Match client-side compression quality
 SMALL_FILE_THRESHOLD = 500 * 1024
+THUMBNAIL_SIZE = 320  # Max dimension of the derivatives shown in admin grids
+THUMBNAIL_QUALITY = 70
 
 PRIVATE_OBJECT_DIR = os.environ.get("PRIVATE_OBJECT_DIR", "")
 USE_OBJECT_STORAGE = bool(PRIVATE_OBJECT_DIR)
@@ -93,7 +97,105 @@ def create_upload_folder(tech_id: str, record_id: str) -> str:
         return base_path
 
 
-def _process_single_file(args: Tuple) -> Tuple[int, str]:
+def make_thumbnail(file_bytes: bytes, ext: str) -> Optional[Tuple[bytes, str, str]]:
+    """Render a small preview of an image or of a PDF's first page.
+    
+    Returns (bytes, extension, content type): a JPEG for images, a PNG for
+    PDFs. None when the file cannot be rendered (PDF previews need PyMuPDF).
+    """
+    ext = ext.lower()
+    if ext not in ('.jpg', '.jpeg', '.png', '.pdf'):
+        return None
+    try:
+        if ext == '.pdf':
+            import fitz
+            doc = fitz.open(stream=file_bytes, filetype="pdf")
+            try:
+                if not len(doc):
+                    return None
+                page = doc[0]
+                zoom = THUMBNAIL_SIZE / max(page.rect.width, page.rect.height)
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                return pix.tobytes("png"), '.png', "image/png"
+            finally:
+                doc.close()
+        
+        img = Image.open(io.BytesIO(file_bytes))
+        img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        return buffer.getvalue(), '.jpg', "image/jpeg"
+    except Exception as e:
+        print(f"Warning: Thumbnail generation failed ({ext}): {e}")
+        return None
+
+
+def save_thumbnail(path: str, file_bytes: Optional[bytes] = None) -> Optional[str]:
+    """Store a thumbnail next to a saved file and return the thumbnail's path.
+    
+    Thumbnails go in a thumbs/ folder beside the original, in the same
+    storage backend. file_bytes avoids re-reading a file just written.
+    Returns None if no thumbnail could be made.
+    """
+    if not path:
+        return None
+    try:
+        if file_bytes is None:
+            file_bytes = read_file(path)
+        stem, ext = os.path.splitext(path)
+        thumbnail = make_thumbnail(file_bytes, ext)
+        if thumbnail is None:
+            return None
+        thumb_bytes, thumb_ext, content_type = thumbnail
+        folder, name = os.path.split(stem)
+        
+        if is_object_storage_path(path):
+            object_key = f"{folder[len('/objects/'):]}/thumbs/{name}{thumb_ext}"
+            return _upload_to_object_storage(thumb_bytes, object_key, content_type)
+        
+        thumb_path = os.path.join(folder, "thumbs", f"{name}{thumb_ext}")
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        with open(thumb_path, 'wb') as f:
+            f.write(thumb_bytes)
+        return thumb_path
+    except Exception as e:
+        print(f"Warning: Could not save thumbnail for {path}: {e}")
+        return None
+
+
+def describe_file(file_bytes: bytes, path: str) -> Dict[str, Any]:
+    """Catalog facts for stored bytes: size_bytes, sha256, content_type, width, height.
+    
+    Keys match database.DOCUMENT_METADATA_COLUMNS; width/height are set for images only.
+    """
+    metadata = {
+        "size_bytes": len(file_bytes),
+        "sha256": hashlib.sha256(file_bytes).hexdigest(),
+        "content_type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+        "width": None,
+        "height": None,
+    }
+    try:
+        img = Image.open(io.BytesIO(file_bytes))
+        metadata["width"], metadata["height"] = img.size
+        metadata["content_type"] = Image.MIME.get(img.format, metadata["content_type"])
+    except Exception:
+        pass
+    return metadata
+
+
+def describe_stored_file(path: str) -> Optional[Dict[str, Any]]:
+    """describe_file for a stored path, or None when it cannot be read."""
+    try:
+        return describe_file(read_file(path), path)
+    except Exception as e:
+        print(f"Warning: Could not read {path} for metadata: {e}")
+        return None
+
+
+def _process_single_file(args: Tuple) -> Tuple[int, Dict[str, Any]]:
     """Process a single uploaded file - used for parallel processing."""
     idx, uploaded_file, folder_path, prefix, compress = args
     
@@ -174,7 +276,11 @@ def _process_single_file(args: Tuple) -> Tuple[int, str]:
             f.write(file_bytes)
         saved_path = local_path
     
-    return (idx, saved_path)
+    return (idx, {
+        "file_path": saved_path,
+        "thumbnail_path": save_thumbnail(saved_path, file_bytes),
+        **describe_file(file_bytes, saved_path),
+    })
 
 
 def save_uploaded_files(uploaded_files, folder_path: str, prefix: str, compress: bool = True) -> List[str]:
@@ -184,13 +290,24 @@ def save_uploaded_files(uploaded_files, folder_path: str, prefix: str, compress:
     Uses Object Storage if configured, otherwise local filesystem.
     For Object Storage, returns /objects/... paths.
     For local storage, returns file system paths.
+    Thumbnails are written as well; use save_uploaded_documents to get their paths.
+    """
+    return [doc["file_path"] for doc in save_uploaded_documents(uploaded_files, folder_path, prefix, compress)]
+
+
+def save_uploaded_documents(uploaded_files, folder_path: str, prefix: str,
+                            compress: bool = True) -> List[Dict[str, Any]]:
+    """Save uploaded files with thumbnails; return one document dict per file.
+    
+    Each dict has file_path, thumbnail_path (None for files that could not be
+    previewed) and the describe_file metadata of the bytes actually stored.
     """
     if not uploaded_files:
         return []
     
     if len(uploaded_files) == 1:
-        _, path = _process_single_file((1, uploaded_files[0], folder_path, prefix, compress))
-        return [path]
+        _, document = _process_single_file((1, uploaded_files[0], folder_path, prefix, compress))
+        return [document]
     
     args_list = [(idx, f, folder_path, prefix, compress) for idx, f in enumerate(uploaded_files, 1)]
     results = {}
@@ -200,8 +317,8 @@ def save_uploaded_files(uploaded_files, folder_path: str, prefix: str, compress:
         futures = {executor.submit(_process_single_file, args): args[0] for args in args_list}
         for future in as_completed(futures):
             try:
-                idx, path = future.result()
-                results[idx] = path
+                idx, document = future.result()
+                results[idx] = document
             except Exception as e:
                 print(f"Error processing file: {e}")
     
@@ -3,6 +3,8 @@ import mimetypes
 import json
 import requests
 import base64
+import logging
+import time
 from datetime import datetime
 
 import streamlit as st
@@ -10,6 +12,24 @@ import file_storage
 
 LOGO_PATH = os.path.join(os.path.dirname(__file__), "static", "sears_logo.png")
 
+logger = logging.getLogger("byov.notifications")
+
+def _record_email_attempt(enrollment_id, kind, started, error=None, payload=None, status_code=None):
+    """Log a SendGrid call in sync_attempts; a logging failure never fails the send."""
+    if not enrollment_id:
+        return
+    try:
+        import database
+        database.record_sync_attempt(
+            enrollment_id, "email", "failed" if error else "success",
+            latency_ms=(time.monotonic() - started) * 1000,
+            error=error, payload=payload,
+            details={"kind": kind, "status_code": status_code},
+        )
+    except Exception as e:
+        logger.warning("Could not record email attempt for enrollment %s: %s", enrollment_id, e)
+
+
 def get_logo_base64():
     """Get the Sears logo as a base64 data URI for embedding in emails."""
     try:
@@ -269,7 +289,7 @@ def send_email_notification(record, recipients=None, subject=None, attach_pdf_on
     files = []
     if attach_pdf_only:
         pdf_path = record.get('signature_pdf_path')
-        if pdf_path and file_storage.file_exists(pdf_path):
+        if pdf_path:
             files.append(pdf_path)
     else:
         file_keys = [
@@ -283,12 +303,9 @@ def send_email_notification(record, recipients=None, subject=None, attach_pdf_on
             if not v:
                 continue
             if isinstance(v, list):
-                for p in v:
-                    if p and file_storage.file_exists(p):
-                        files.append(p)
-            else:
-                if isinstance(v, str) and file_storage.file_exists(v):
-                    files.append(v)
+                files.extend(p for p in v if p)
+            elif isinstance(v, str):
+                files.append(v)
 
     try:
         sg_payload = {
@@ -489,7 +506,11 @@ def send_hr_policy_notification(record, pdf_path, hr_email="tyler.morgan@transfo
     if not hr_email:
         return {'error': 'No HR email address specified'}
     
-    if not pdf_path or not file_storage.file_exists(pdf_path):
+    if not pdf_path:
+        return {'error': 'Signed PDF not found'}
+    try:
+        pdf_bytes = file_storage.read_file(pdf_path)
+    except Exception:
         return {'error': 'Signed PDF not found'}
     
     email_config = st.secrets.get("email", {})
@@ -505,8 +526,9 @@ def send_hr_policy_notification(record, pdf_path, hr_email="tyler.morgan@transfo
     subject = f"BYOV Signed Policy Form - {record.get('full_name', 'Unknown')} (Tech ID: {record.get('tech_id', 'N/A')})"
     html_body = get_hr_notification_html(record, use_cid_logo=True)
     
+    started = time.monotonic()
+    payload = None
     try:
-        pdf_bytes = file_storage.read_file(pdf_path)
         pdf_filename = os.path.basename(pdf_path)
         
         attachments = [{
@@ -546,11 +568,17 @@ def send_hr_policy_notification(record, pdf_path, hr_email="tyler.morgan@transfo
         )
         
         if 200 <= resp.status_code < 300:
+            _record_email_attempt(record.get('id'), "hr_policy", started,
+                                  payload=payload, status_code=resp.status_code)
             return {'success': True}
         else:
-            return {'error': f'SendGrid error: {resp.status_code}'}
+            error = f'SendGrid error: {resp.status_code}'
+            _record_email_attempt(record.get('id'), "hr_policy", started, error=error,
+                                  payload=payload, status_code=resp.status_code)
+            return {'error': error}
             
     except Exception as e:
+        _record_email_attempt(record.get('id'), "hr_policy", started, error=str(e), payload=payload)
         return {'error': str(e)}
 
 
@@ -700,7 +728,7 @@ def send_docusign_request_hr(record, enrollment_id):
     
     Returns True on success, False otherwise.
     """
-    import database_pg as database
+    import database
     
     email_config = st.secrets.get("email", {})
     sg_key = email_config.get("sendgrid_api_key") or os.getenv("SENDGRID_API_KEY")
@@ -715,6 +743,8 @@ def send_docusign_request_hr(record, enrollment_id):
         st.warning("HR email not configured. Please set up HR email in Admin Settings.")
         return False
     
+    started = time.monotonic()
+    payload = None
     try:
         token = database.create_docusign_token(enrollment_id)
         
@@ -771,12 +801,18 @@ def send_docusign_request_hr(record, enrollment_id):
         )
         
         if 200 <= resp.status_code < 300:
+            _record_email_attempt(enrollment_id, "docusign_request", started,
+                                  payload=payload, status_code=resp.status_code)
             return True
         else:
+            _record_email_attempt(enrollment_id, "docusign_request", started,
+                                  error=f"SendGrid error: {resp.status_code}",
+                                  payload=payload, status_code=resp.status_code)
             st.error(f"Failed to send DocuSign request email: {resp.status_code}")
             return False
             
     except Exception as e:
+        _record_email_attempt(enrollment_id, "docusign_request", started, error=str(e), payload=payload)
         st.error(f"Error sending DocuSign request: {str(e)}")
         return False
 
@@ -938,7 +974,7 @@ def send_custom_notification(record, recipients, subject, selected_fields, selec
     
     Returns True on success, dict with 'error' key on failure.
     """
-    import database_pg as database
+    import database
     
     email_config = st.secrets.get("email", {})
     
@@ -969,9 +1005,9 @@ def send_custom_notification(record, recipients, subject, selected_fields, selec
         try:
             docs = database.get_documents_for_enrollment(enrollment_id)
             for doc in docs:
-                if doc['doc_type'] in selected_docs:
-                    if file_storage.file_exists(doc['file_path']):
-                        files.append(doc['file_path'])
+                # Unreadable files are skipped while attaching; drop only known-missing ones
+                if doc['doc_type'] in selected_docs and not database.document_missing(doc):
+                    files.append(doc['file_path'])
         except Exception:
             pass
     
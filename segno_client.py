@@ -10,6 +10,7 @@ ENHANCEMENTS:
 """
 import os
 import re
+import time
 import requests
 from typing import Dict, Any, Optional
 from datetime import datetime
@@ -538,29 +539,64 @@ def sync_enrollment_by_id(enrollment_id: int) -> Dict[str, Any]:
         dict with success, status_code, error, details, segno_record_id
     """
     try:
-        import database_pg as database
+        import database
 
-        enrollment = database.get_enrollment(enrollment_id)
-        if not enrollment:
+        try:
+            # Read, submit and record under the lock so a concurrent sync
+            # cannot submit the same enrollment twice
+            with database.enrollment_lock(enrollment_id, "segno"):
+                enrollment = database.get_enrollment(enrollment_id)
+                if not enrollment:
+                    return {
+                        "success": False,
+                        "status_code": 404,
+                        "error": f"Enrollment {enrollment_id} not found in database",
+                        "details": "Check enrollment ID",
+                        "segno_record_id": None
+                    }
+                if enrollment.get("segno_sync_status") == "synced":
+                    print(f"[Segno] Enrollment {enrollment_id} already synced, skipping")
+                    return {
+                        "success": True,
+                        "status_code": 200,
+                        "error": None,
+                        "details": "Already synced",
+                        "segno_record_id": enrollment.get("segno_record_id")
+                    }
+
+                print(f"[Segno] Starting sync for enrollment {enrollment_id}")
+                started = time.monotonic()
+                result = submit_enrollment_to_segno(enrollment)
+                latency_ms = (time.monotonic() - started) * 1000
+
+                if result["success"]:
+                    database.update_segno_status(enrollment_id, "synced",
+                                                 result.get("segno_record_id"))
+                    print(f"[Segno] Sync successful, updated database status")
+                else:
+                    database.update_segno_status(enrollment_id, "failed", None)
+                    print(f"[Segno] Sync failed: {result.get('error')}")
+
+                try:
+                    database.record_sync_attempt(
+                        enrollment_id, "segno",
+                        "success" if result["success"] else "failed",
+                        latency_ms=latency_ms,
+                        error=result.get("error"),
+                        details={"status_code": result.get("status_code"),
+                                 "segno_record_id": result.get("segno_record_id")})
+                except Exception as e:
+                    print(f"[Segno] Could not record sync attempt: {e}")
+        except database.EnrollmentLocked as e:
+            print(f"[Segno] {e}")
             return {
                 "success": False,
-                "status_code": 404,
-                "error": f"Enrollment {enrollment_id} not found in database",
-                "details": "Check enrollment ID",
+                "status_code": 409,
+                "error": "A Segno sync for this enrollment is already in progress",
+                "details": str(e),
                 "segno_record_id": None
             }
 
-        print(f"[Segno] Starting sync for enrollment {enrollment_id}")
-        result = submit_enrollment_to_segno(enrollment)
-
-        if result["success"]:
-            database.update_segno_status(enrollment_id, "synced",
-                                         result.get("segno_record_id"))
-            print(f"[Segno] Sync successful, updated database status")
-        else:
-            database.update_segno_status(enrollment_id, "failed", None)
-            print(f"[Segno] Sync failed: {result.get('error')}")
-
         return result
 
     except Exception as e:
@@ -0,0 +1,39 @@
+"""
+Shared pytest setup: run the database API on the embedded SQLite backend.
+
+The backend is chosen, and database_sqlite migrates its file, when the
+module is first imported, so the environment is set before any test module
+imports database. Each test then gets a fresh database file of its own.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["BYOV_DB_BACKEND"] = "sqlite"
+os.environ["BYOV_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="byov-test-"), "import.db")
+
+
+def _close_thread_connection(backend):
+    conn = getattr(backend._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        backend._local.conn = None
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """The database module on an empty, fully migrated SQLite file."""
+    import database
+
+    backend = database.backend
+    assert backend.__name__ == "database_sqlite"
+    _close_thread_connection(backend)
+    monkeypatch.setattr(backend, "DATABASE_PATH", str(tmp_path / "byov.db"))
+    database.init_db()
+    yield database
+    _close_thread_connection(backend)
@@ -0,0 +1,197 @@
+"""
+database API tests on the SQLite backend (see conftest.py).
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+
+def _record(**overrides):
+    record = {
+        "full_name": "Test Tech",
+        "tech_id": "T100",
+        "district": "D1",
+        "state": "TX",
+        "industry": ["Install"],
+        "year": "2020",
+        "make": "Ford",
+        "model": "Transit",
+        "vin": "1FTBW2CM0LKA00001",
+    }
+    record.update(overrides)
+    return record
+
+
+def _submit(db, **overrides):
+    return db.submit_enrollment_bundle(_record(**overrides), [])
+
+
+def _at(minutes):
+    return (datetime(2026, 1, 1) + timedelta(minutes=minutes)).isoformat()
+
+
+def test_bundle_repeated_key_returns_existing_enrollment(db):
+    documents = [("signature", "/uploads/sig.png"), ("insurance", "/uploads/ins.pdf")]
+    first = db.submit_enrollment_bundle(_record(), documents, idempotency_key="form-1")
+    again = db.submit_enrollment_bundle(_record(tech_id="T999"), documents, idempotency_key="form-1")
+
+    assert again == first
+    assert db.count_enrollments() == 1
+    assert db.get_enrollment_by_id(first)["tech_id"] == "T100"
+    assert len(db.get_documents_for_enrollment(first)) == 2
+    assert len(db.get_checklist_for_enrollment(first)) == len(db.CHECKLIST_TASKS)
+
+    other = db.submit_enrollment_bundle(_record(), documents, idempotency_key="form-2")
+    assert other != first
+    assert db.count_enrollments() == 2
+
+
+def test_stats_follow_insert_approve_and_delete(db):
+    first = _submit(db, state="TX", district="D1")
+    second = _submit(db, state="TX", district="D2")
+    third = _submit(db, state="CA", district="D1")
+
+    stats = db.get_enrollment_stats()
+    assert (stats["total"], stats["approved"], stats["pending"]) == (3, 0, 3)
+    assert stats["by_state"] == {"TX": 2, "CA": 1}
+    assert stats["by_district"] == {"D1": 2, "D2": 1}
+
+    db.approve_enrollment(first)
+    stats = db.get_enrollment_stats()
+    assert (stats["total"], stats["approved"], stats["pending"]) == (3, 1, 2)
+
+    db.delete_enrollment(second)
+    db.delete_enrollment(third)
+    stats = db.get_enrollment_stats()
+    assert (stats["total"], stats["approved"], stats["pending"]) == (1, 1, 0)
+    assert stats["by_state"] == {"TX": 1}
+    assert stats["by_district"] == {"D1": 1}
+
+
+def test_stats_count_checklist_ticks_once(db):
+    enrollment_id = _submit(db)
+    # A repeated tick is an upsert of the same row, which once tripped the triggers
+    assert db.mark_checklist_task_by_key(enrollment_id, "policy_hshr")
+    assert db.mark_checklist_task_by_key(enrollment_id, "policy_hshr")
+    assert db.mark_checklist_task_by_key(enrollment_id, "segno_synced")
+
+    stats = db.get_enrollment_stats()
+    assert stats["checklist_completed"]["policy_hshr"] == 1
+    assert stats["checklist_completed"]["segno_synced"] == 1
+    assert stats["checklist_completed"]["approved_synced"] == 0
+
+    db.mark_checklist_task_by_key(enrollment_id, "policy_hshr", completed=False)
+    assert db.get_enrollment_stats()["checklist_completed"]["policy_hshr"] == 0
+
+    before = db.get_enrollment_stats()
+    db.refresh_enrollment_stats()
+    assert db.get_enrollment_stats() == before
+
+
+def test_workflow_queue_by_stage_and_by_task_keys(db):
+    fresh = _submit(db, submission_date=_at(2))
+    older = _submit(db, submission_date=_at(1))
+    synced = _submit(db, submission_date=_at(3))
+    db.mark_checklist_task_by_key(synced, "approved_synced")
+    done = _submit(db, submission_date=_at(4))
+    for step in db.WORKFLOW_STEPS:
+        db.mark_checklist_task_by_key(done, step)
+
+    def ids(**kwargs):
+        return [row["id"] for row in db.get_workflow_queue(**kwargs)]
+
+    assert ids(stage="approved_synced") == [older, fresh]
+    assert ids(stage="policy_hshr") == [synced]
+    assert ids(stage="fleet_notified") == []
+    # Keys equivalent to a stage take the workflow_stage path
+    assert ids(pending=("approved_synced",)) == [older, fresh]
+    assert ids(completed=("approved_synced",), pending=("policy_hshr",)) == [synced]
+    # Other combinations filter checklist_mask directly
+    assert ids(completed=("approved_synced",), pending=("segno_synced",)) == [synced]
+    assert ids(completed=("segno_synced",)) == [done]
+    assert ids(pending=("approved_synced",), limit=1) == [older]
+
+    with pytest.raises(ValueError):
+        db.get_workflow_queue(pending=("no_such_task",))
+    with pytest.raises(ValueError):
+        db.get_workflow_queue(stage="no_such_stage")
+
+
+def test_keyset_pages_end_without_cursor(db):
+    ids = [_submit(db, submission_date=_at(minute)) for minute in range(5)]
+    newest_first = ids[::-1]
+
+    pages, cursor_key = [], None
+    while True:
+        page = db.get_enrollments_page(cursor_key=cursor_key, limit=2)
+        pages.append([row["id"] for row in page["records"]])
+        cursor_key = page["next_cursor"]
+        if cursor_key is None:
+            break
+    assert pages == [newest_first[0:2], newest_first[2:4], newest_first[4:]]
+
+    assert db.get_enrollment_page_cursor(None, 1, 2) is None
+    assert db.get_enrollment_page_cursor(None, 2, 2) == \
+        db.get_enrollments_page(limit=2)["next_cursor"]
+    third = db.get_enrollments_page(cursor_key=db.get_enrollment_page_cursor(None, 3, 2), limit=2)
+    assert [row["id"] for row in third["records"]] == newest_first[4:]
+
+
+def test_keyset_last_full_page_has_no_cursor(db):
+    ids = [_submit(db, submission_date=_at(minute)) for minute in range(4)]
+
+    first = db.get_enrollments_page(limit=2)
+    second = db.get_enrollments_page(cursor_key=first["next_cursor"], limit=2)
+    assert [row["id"] for row in second["records"]] == ids[1::-1]
+    assert second["next_cursor"] is None
+
+
+def test_keyset_pages_break_submission_date_ties_by_id(db):
+    ids = [_submit(db, submission_date=_at(0)) for _ in range(3)]
+
+    first = db.get_enrollments_page(limit=2)
+    second = db.get_enrollments_page(cursor_key=first["next_cursor"], limit=2)
+    assert [row["id"] for row in first["records"]] == ids[:0:-1]
+    assert [row["id"] for row in second["records"]] == ids[:1]
+
+
+def test_enrollment_changes_report_changed_ids(db):
+    version, changed = db.get_enrollment_changes(None)
+    assert changed == []
+
+    first = _submit(db)
+    second = _submit(db)
+    after_insert, changed = db.get_enrollment_changes(version)
+    assert after_insert > version
+    assert sorted(changed) == sorted([first, second])
+
+    assert db.get_enrollment_changes(after_insert) == (after_insert, [])
+
+    db.mark_checklist_task_by_key(first, "policy_hshr")
+    after_tick, changed = db.get_enrollment_changes(after_insert)
+    assert after_tick > after_insert
+    assert changed == [first]
+
+    db.delete_enrollment(second)
+    after_delete, changed = db.get_enrollment_changes(after_tick)
+    assert after_delete > after_tick
+    assert changed == [second]
+
+
+def test_expiring_enrollments_within_window(db):
+    today = date.today()
+    soon = _submit(db, insurance_exp=(today + timedelta(days=5)).isoformat(),
+                   registration_exp=(today + timedelta(days=60)).isoformat())
+    _submit(db, insurance_exp=(today + timedelta(days=40)).isoformat())
+    _submit(db, insurance_exp=(today - timedelta(days=1)).isoformat())
+    # US-style dates are normalised when stored
+    sooner = _submit(db, insurance_exp=(today + timedelta(days=2)).strftime("%m/%d/%Y"))
+
+    assert [row["id"] for row in db.get_expiring_enrollments("insurance")] == [sooner, soon]
+    assert [row["id"] for row in db.get_expiring_enrollments("insurance_exp", within_days=3)] == [sooner]
+    assert [row["id"] for row in db.get_expiring_enrollments("insurance", limit=1)] == [sooner]
+    assert db.get_expiring_enrollments("registration") == []
+    assert [row["id"] for row in db.get_expiring_enrollments("registration", within_days=90)] == [soon]
+
+    with pytest.raises(ValueError):
+        db.get_expiring_enrollments("vin")